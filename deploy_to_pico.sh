@@ -45,6 +45,57 @@ $MPREMOTE cp src/config.py :config.py
 echo "  → Copying animations.py..."
 $MPREMOTE cp src/animations.py :animations.py
 
+echo "  → Copying fixed_animations.py..."
+$MPREMOTE cp src/fixed_animations.py :fixed_animations.py
+
+echo "  → Copying color_correction.py..."
+$MPREMOTE cp src/color_correction.py :color_correction.py
+
+echo "  → Copying compositor.py..."
+$MPREMOTE cp src/compositor.py :compositor.py
+
+echo "  → Copying power.py..."
+$MPREMOTE cp src/power.py :power.py
+
+echo "  → Copying loop_profiler.py..."
+$MPREMOTE cp src/loop_profiler.py :loop_profiler.py
+
+echo "  → Copying heap_monitor.py..."
+$MPREMOTE cp src/heap_monitor.py :heap_monitor.py
+
+echo "  → Copying wire.py..."
+$MPREMOTE cp src/wire.py :wire.py
+
+echo "  → Copying latency.py..."
+$MPREMOTE cp src/latency.py :latency.py
+
+echo "  → Copying touch_queue.py..."
+$MPREMOTE cp src/touch_queue.py :touch_queue.py
+
+echo "  → Copying link_manager.py..."
+$MPREMOTE cp src/link_manager.py :link_manager.py
+
+echo "  → Copying status_led.py..."
+$MPREMOTE cp src/status_led.py :status_led.py
+
+echo "  → Copying sensor_events.py..."
+$MPREMOTE cp src/sensor_events.py :sensor_events.py
+
+echo "  → Copying async_runtime.py..."
+$MPREMOTE cp src/async_runtime.py :async_runtime.py
+
+echo "  → Copying clip_player.py..."
+$MPREMOTE cp src/clip_player.py :clip_player.py
+
+# Precompiled animation clips (built with tools/clip_builder.py)
+if ls clips/*.wclip > /dev/null 2>&1; then
+    echo "  → Copying animation clips..."
+    $MPREMOTE mkdir :clips 2>/dev/null || true
+    for clip in clips/*.wclip; do
+        $MPREMOTE cp "$clip" ":$clip"
+    done
+fi
+
 echo "✅ All files uploaded!"
 echo ""
 
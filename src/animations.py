@@ -6,6 +6,19 @@
 import time
 import math
 
+try:
+    from time import ticks_ms, ticks_add, ticks_diff
+except ImportError:
+    # CPython fallback (desktop tools) - monotonic milliseconds, no wrap
+    def ticks_ms():
+        return int(time.monotonic() * 1000)
+    
+    def ticks_add(ticks, delta):
+        return ticks + delta
+    
+    def ticks_diff(a, b):
+        return a - b
+
 try:
     import random
 except ImportError:
@@ -18,6 +31,7 @@ except ImportError:
         @staticmethod
         def randint(a, b):
             return a + (getrandbits(16) % (b - a + 1))
+        getrandbits = staticmethod(getrandbits)
     random = RandomFallback()
 
 
@@ -25,32 +39,88 @@ class AnimationLibrary:
     """
     LED animation patterns for NeoPixel rings/strips.
     
-    Usage:
-        from animations import AnimationLibrary
-        
-        anim = AnimationLibrary(led_count=12)
-        anim.set_color(255, 100, 200)  # Pink
+    Every pattern renders into ``self.buf``, a preallocated bytearray with
+    3 bytes per LED in G, R, B order - the same layout ``neopixel.NeoPixel``
+    keeps in its own ``buf``. Sharing that buffer means a frame costs no
+    allocations and no per-pixel copy:
+    
+        np = neopixel.NeoPixel(Pin(16), 12)
+        anim = AnimationLibrary(led_count=12, buf=np.buf)
         
         while True:
-            colors = anim.pulse()
-            for i, color in enumerate(colors):
-                np[i] = color
+            render_pattern(anim, "pulse")
             np.write()
             time.sleep(0.05)
+    
+    The pattern methods still return a list of (r, g, b) tuples for callers
+    that want one:
+    
+        colors = anim.pulse()
     """
     
-    def __init__(self, led_count: int = 12):
+    def __init__(self, led_count: int = 12, buf=None):
         """Initialize animation library.
         
         Args:
             led_count: Number of LEDs in the strip/ring
+            buf: Optional GRB bytearray to render into (e.g. ``NeoPixel.buf``).
+                 A private buffer is allocated if omitted.
         """
         self.led_count = led_count
         self.red = 255
         self.green = 100
         self.blue = 200
         self._tick = 0
-        self._offset = 0.0
+        self.buf = None
+        self.attach_buffer(buf if buf is not None else bytearray(led_count * 3))
+        # Bound renderers are looked up once so per-frame dispatch allocates nothing
+        self._renderers = {}
+        for name in get_pattern_names():
+            self._renderers[name] = getattr(self, "_render_" + name)
+        
+    def attach_buffer(self, buf):
+        """Render into an external GRB buffer.
+        
+        Args:
+            buf: bytearray with at least 3 bytes per LED, laid out G, R, B
+                 (RGBW strips are not supported)
+        """
+        if len(buf) < self.led_count * 3:
+            raise ValueError("buffer too small for led_count")
+        self.buf = buf
+    
+    def render(self, pattern_name: str) -> bytearray:
+        """Render one frame of a pattern into the buffer.
+        
+        Args:
+            pattern_name: Name of the pattern (unknown names render idle)
+            
+        Returns:
+            The GRB buffer the frame was written to
+        """
+        self._renderers.get(pattern_name, self._render_idle)()
+        return self.buf
+    
+    def add_pattern(self, name: str, source):
+        """Register an external frame source (e.g. a ClipPlayer) as a pattern.
+        
+        The source is called as ``source.show(buf, frame)`` and must write
+        the frame into buf. Frame 0 is the first call after reset().
+        
+        Args:
+            name: Pattern name to register
+            source: Object with a show(buf, frame) method
+        """
+        def render():
+            self._tick += 1
+            source.show(self.buf, self._tick - 1)
+        self._renderers[name] = render
+    
+    def frame(self) -> list:
+        """Return the last rendered frame as a list of (r, g, b) tuples."""
+        buf = self.buf
+        return [(buf[i + 1], buf[i], buf[i + 2])
+                for i in range(0, self.led_count * 3, 3)]
         
     def set_color(self, r: int, g: int, b: int):
         """Set the base color for animations.
@@ -68,13 +138,33 @@ class AnimationLibrary:
         """Clamp value to valid LED range."""
         return max(0, min(255, int(value)))
     
+    def _fill(self, r: int, g: int, b: int):
+        """Set every LED in the buffer to one color."""
+        buf = self.buf
+        for i in range(0, self.led_count * 3, 3):
+            buf[i] = g
+            buf[i + 1] = r
+            buf[i + 2] = b
+    
+    def _set(self, index: int, r: int, g: int, b: int):
+        """Set a single LED in the buffer."""
+        i = index * 3
+        buf = self.buf
+        buf[i] = g
+        buf[i + 1] = r
+        buf[i + 2] = b
+    
     # =========================================================================
     # Animation Patterns
     # =========================================================================
+    # Each public pattern renders into self.buf and returns the frame as a
+    # list. render_pattern() calls the _render_* methods directly and skips
+    # building the list.
     
     def off(self) -> list:
         """All LEDs off."""
-        return [(0, 0, 0)] * self.led_count
+        self._render_off()
+        return self.frame()
     
     def solid(self, brightness: float = 1.0) -> list:
         """Solid color at specified brightness.
@@ -82,14 +172,13 @@ class AnimationLibrary:
         Args:
             brightness: Brightness level (0.0 - 1.0)
         """
-        r = self._clamp(self.red * brightness)
-        g = self._clamp(self.green * brightness)
-        b = self._clamp(self.blue * brightness)
-        return [(r, g, b)] * self.led_count
+        self._render_solid(brightness)
+        return self.frame()
     
     def idle(self) -> list:
         """Dim blue idle state - indicates whale is connected but waiting."""
-        return [(10, 30, 60)] * self.led_count
+        self._render_idle()
+        return self.frame()
     
     def pulse(self, speed: float = 3.0) -> list:
         """Pulsing brightness animation.
@@ -97,10 +186,8 @@ class AnimationLibrary:
         Args:
             speed: Pulse speed multiplier
         """
-        self._tick += 1
-        t = self._tick * 0.05 * speed
-        brightness = 0.3 + 0.7 * abs(math.sin(t))
-        return self.solid(brightness)
+        self._render_pulse(speed)
+        return self.frame()
     
     def breathing(self, speed: float = 0.5) -> list:
         """Slow breathing glow effect - very smooth and calming.
@@ -108,11 +195,8 @@ class AnimationLibrary:
         Args:
             speed: Breathing speed multiplier
         """
-        self._tick += 1
-        t = self._tick * 0.05 * speed
-        # Natural breathing curve
-        brightness = (math.exp(math.sin(t)) - 0.36787944) / 2.35040238
-        return self.solid(brightness)
+        self._render_breathing(speed)
+        return self.frame()
     
     def rainbow(self, speed: float = 1.0) -> list:
         """Rainbow cycle around the LED ring.
@@ -120,16 +204,8 @@ class AnimationLibrary:
         Args:
             speed: Rotation speed multiplier
         """
-        colors = []
-        self._offset = (self._offset + 0.01 * speed) % 1.0
-        
-        for i in range(self.led_count):
-            hue = (i / self.led_count + self._offset) % 1.0
-            r, g, b = self._hsv_to_rgb(hue, 1.0, 1.0)
-            colors.append((self._clamp(r * 255), 
-                          self._clamp(g * 255), 
-                          self._clamp(b * 255)))
-        return colors
+        self._render_rainbow(speed)
+        return self.frame()
     
     def wave(self, speed: float = 3.0) -> list:
         """Wave pattern traveling around the ring.
@@ -137,18 +213,8 @@ class AnimationLibrary:
         Args:
             speed: Wave speed multiplier
         """
-        colors = []
-        self._tick += 1
-        t = self._tick * 0.05 * speed
-        
-        for i in range(self.led_count):
-            offset = (i / self.led_count * 2 * math.pi) + t
-            brightness = 0.2 + 0.8 * (math.sin(offset) + 1) / 2
-            r = self._clamp(self.red * brightness)
-            g = self._clamp(self.green * brightness)
-            b = self._clamp(self.blue * brightness)
-            colors.append((r, g, b))
-        return colors
+        self._render_wave(speed)
+        return self.frame()
     
     def sparkle(self, density: float = 0.15) -> list:
         """Random sparkle effect with white flashes.
@@ -156,16 +222,8 @@ class AnimationLibrary:
         Args:
             density: Probability of sparkle per LED (0.0 - 1.0)
         """
-        colors = []
-        for _ in range(self.led_count):
-            if random.random() < density:
-                colors.append((255, 255, 255))
-            else:
-                r = self._clamp(self.red * 0.3)
-                g = self._clamp(self.green * 0.3)
-                b = self._clamp(self.blue * 0.3)
-                colors.append((r, g, b))
-        return colors
+        self._render_sparkle(density)
+        return self.frame()
     
     def comet(self, tail_length: int = 4, speed: float = 1.0) -> list:
         """Comet/shooting star effect traveling around ring.
@@ -174,7 +232,111 @@ class AnimationLibrary:
             tail_length: Length of the comet tail
             speed: Movement speed
         """
-        colors = [(0, 0, 0)] * self.led_count
+        self._render_comet(tail_length, speed)
+        return self.frame()
+    
+    def alternate(self, speed: float = 2.0) -> list:
+        """Alternating LEDs blink pattern.
+        
+        Args:
+            speed: Blink speed
+        """
+        self._render_alternate(speed)
+        return self.frame()
+    
+    def fire(self) -> list:
+        """Flickering fire/candle effect."""
+        self._render_fire()
+        return self.frame()
+    
+    def ocean(self, speed: float = 1.0) -> list:
+        """Gentle ocean wave in blues and teals.
+        
+        Args:
+            speed: Wave speed
+        """
+        self._render_ocean(speed)
+        return self.frame()
+    
+    def flash(self, on_frames: int = 5, off_frames: int = 5) -> list:
+        """Simple on/off flash pattern.
+        
+        Args:
+            on_frames: Number of frames LED stays on
+            off_frames: Number of frames LED stays off
+        """
+        self._render_flash(on_frames, off_frames)
+        return self.frame()
+    
+    def celebration(self) -> list:
+        """Colorful celebration pattern - random colors and sparkles."""
+        self._render_celebration()
+        return self.frame()
+    
+    # =========================================================================
+    # Buffer Renderers
+    # =========================================================================
+    
+    def _render_off(self):
+        self._fill(0, 0, 0)
+    
+    def _render_solid(self, brightness: float = 1.0):
+        r = self._clamp(self.red * brightness)
+        g = self._clamp(self.green * brightness)
+        b = self._clamp(self.blue * brightness)
+        self._fill(r, g, b)
+    
+    def _render_idle(self):
+        self._fill(10, 30, 60)
+    
+    def _render_pulse(self, speed: float = 3.0):
+        self._tick += 1
+        t = self._tick * 0.05 * speed
+        brightness = 0.3 + 0.7 * abs(math.sin(t))
+        self._render_solid(brightness)
+    
+    def _render_breathing(self, speed: float = 0.5):
+        self._tick += 1
+        t = self._tick * 0.05 * speed
+        # Natural breathing curve
+        brightness = (math.exp(math.sin(t)) - 0.36787944) / 2.35040238
+        self._render_solid(brightness)
+    
+    def _render_rainbow(self, speed: float = 1.0):
+        self._tick += 1
+        offset = (self._tick * 0.01 * speed) % 1.0
+        
+        for i in range(self.led_count):
+            hue = (i / self.led_count + offset) % 1.0
+            r, g, b = self._hsv_to_rgb(hue, 1.0, 1.0)
+            self._set(i, self._clamp(r * 255),
+                      self._clamp(g * 255),
+                      self._clamp(b * 255))
+    
+    def _render_wave(self, speed: float = 3.0):
+        self._tick += 1
+        t = self._tick * 0.05 * speed
+        
+        for i in range(self.led_count):
+            offset = (i / self.led_count * 2 * math.pi) + t
+            brightness = 0.2 + 0.8 * (math.sin(offset) + 1) / 2
+            r = self._clamp(self.red * brightness)
+            g = self._clamp(self.green * brightness)
+            b = self._clamp(self.blue * brightness)
+            self._set(i, r, g, b)
+    
+    def _render_sparkle(self, density: float = 0.15):
+        r = self._clamp(self.red * 0.3)
+        g = self._clamp(self.green * 0.3)
+        b = self._clamp(self.blue * 0.3)
+        for i in range(self.led_count):
+            if random.random() < density:
+                self._set(i, 255, 255, 255)
+            else:
+                self._set(i, r, g, b)
+    
+    def _render_comet(self, tail_length: int = 4, speed: float = 1.0):
+        self._fill(0, 0, 0)
         self._tick += 1
         
         # Calculate comet head position
@@ -186,50 +348,31 @@ class AnimationLibrary:
             r = self._clamp(self.red * brightness)
             g = self._clamp(self.green * brightness)
             b = self._clamp(self.blue * brightness)
-            colors[led_pos] = (r, g, b)
-        
-        return colors
+            self._set(led_pos, r, g, b)
     
-    def alternate(self, speed: float = 2.0) -> list:
-        """Alternating LEDs blink pattern.
-        
-        Args:
-            speed: Blink speed
-        """
+    def _render_alternate(self, speed: float = 2.0):
         self._tick += 1
         phase = int(self._tick * 0.1 * speed) % 2
         
-        colors = []
+        r = self._clamp(self.red * 0.1)
+        g = self._clamp(self.green * 0.1)
+        b = self._clamp(self.blue * 0.1)
         for i in range(self.led_count):
             if (i % 2) == phase:
-                colors.append((self.red, self.green, self.blue))
+                self._set(i, self.red, self.green, self.blue)
             else:
-                r = self._clamp(self.red * 0.1)
-                g = self._clamp(self.green * 0.1)
-                b = self._clamp(self.blue * 0.1)
-                colors.append((r, g, b))
-        return colors
+                self._set(i, r, g, b)
     
-    def fire(self) -> list:
-        """Flickering fire/candle effect."""
-        colors = []
-        for _ in range(self.led_count):
+    def _render_fire(self):
+        for i in range(self.led_count):
             # Random flicker
             flicker = 0.7 + random.random() * 0.3
             # Fire colors (orange-yellow-red)
             r = self._clamp(255 * flicker)
             g = self._clamp((50 + random.randint(0, 100)) * flicker)
-            b = 0
-            colors.append((r, g, b))
-        return colors
+            self._set(i, r, g, 0)
     
-    def ocean(self, speed: float = 1.0) -> list:
-        """Gentle ocean wave in blues and teals.
-        
-        Args:
-            speed: Wave speed
-        """
-        colors = []
+    def _render_ocean(self, speed: float = 1.0):
         self._tick += 1
         t = self._tick * 0.03 * speed
         
@@ -243,38 +386,28 @@ class AnimationLibrary:
             r = self._clamp(20 * brightness)
             g = self._clamp((100 + 50 * wave2) * brightness)
             b = self._clamp((180 + 75 * wave1) * brightness)
-            colors.append((r, g, b))
-        return colors
+            self._set(i, r, g, b)
     
-    def flash(self, on_frames: int = 5, off_frames: int = 5) -> list:
-        """Simple on/off flash pattern.
-        
-        Args:
-            on_frames: Number of frames LED stays on
-            off_frames: Number of frames LED stays off
-        """
+    def _render_flash(self, on_frames: int = 5, off_frames: int = 5):
         self._tick += 1
         cycle_length = on_frames + off_frames
         
         if (self._tick % cycle_length) < on_frames:
-            return self.solid()
+            self._render_solid()
         else:
-            return self.off()
+            self._render_off()
     
-    def celebration(self) -> list:
-        """Colorful celebration pattern - random colors and sparkles."""
-        colors = []
-        for _ in range(self.led_count):
+    def _render_celebration(self):
+        for i in range(self.led_count):
             if random.random() < 0.3:
                 # Random bright color
                 hue = random.random()
                 r, g, b = self._hsv_to_rgb(hue, 1.0, 1.0)
-                colors.append((self._clamp(r * 255), 
-                              self._clamp(g * 255), 
-                              self._clamp(b * 255)))
+                self._set(i, self._clamp(r * 255),
+                          self._clamp(g * 255),
+                          self._clamp(b * 255))
             else:
-                colors.append((0, 0, 0))
-        return colors
+                self._set(i, 0, 0, 0)
     
     # =========================================================================
     # Helper Methods
@@ -315,10 +448,117 @@ class AnimationLibrary:
         else:
             return (v, p, q)
     
+    def seek(self, frame: int):
+        """Make the next pattern call render the given frame number.
+        
+        Used with AnimationClock so patterns are evaluated at wall-clock
+        time instead of advancing one step per call.
+        
+        Args:
+            frame: Frame number to render next
+        """
+        self._tick = frame - 1
+    
     def reset(self):
         """Reset animation state."""
         self._tick = 0
-        self._offset = 0.0
+
+
+# =============================================================================
+# Animation Clock
+# =============================================================================
+
+class AnimationClock:
+    """
+    Wall-clock frame counter for animations.
+    
+    Patterns advance one step per frame. Taking that frame number from
+    ticks_ms() rather than from how often the loop calls the pattern keeps
+    the visual speed constant under load: when the loop falls behind, the
+    late frames are skipped and counted instead of played back slowly.
+    
+    Usage:
+        clock = AnimationClock(fps=20)
+        
+        while True:
+            if clock.update():
+                anim.seek(clock.frame)
+                render_pattern(anim, "wave")
+                np.write()
+            # ... other work of any duration ...
+    """
+    
+    # Rebase the start time well before ticks_diff() stops being valid
+    # (MicroPython ticks wrap, differences are only safe up to ~6 days)
+    _REBASE_MS = 1 << 20
+    
+    def __init__(self, fps: int = 20):
+        """Initialize the clock.
+        
+        Args:
+            fps: Animation frame rate
+        """
+        self.frame_ms = max(1, 1000 // fps)
+        self.start()
+    
+    def start(self, now: int = None):
+        """Restart at frame 0 and clear the counters.
+        
+        Args:
+            now: Current ticks_ms() value (read if omitted)
+        """
+        self._start = ticks_ms() if now is None else now
+        self._base_frame = 0
+        self.frame = -1
+        self.rendered = 0
+        self.dropped = 0
+    
+    def update(self, now: int = None) -> bool:
+        """Advance to the frame due at the current time.
+        
+        Args:
+            now: Current ticks_ms() value (read if omitted)
+            
+        Returns:
+            True if a new frame is due (self.frame holds its number),
+            False if the current frame has already been rendered
+        """
+        if now is None:
+            now = ticks_ms()
+        elapsed = ticks_diff(now, self._start)
+        if elapsed >= self._REBASE_MS:
+            whole = elapsed // self.frame_ms
+            self._start = ticks_add(self._start, whole * self.frame_ms)
+            self._base_frame += whole
+            elapsed -= whole * self.frame_ms
+        frame = self._base_frame + elapsed // self.frame_ms
+        
+        if frame <= self.frame:
+            return False
+        if self.frame >= 0 and frame > self.frame + 1:
+            self.dropped += frame - self.frame - 1
+        self.frame = frame
+        self.rendered += 1
+        return True
+    
+    def ms_until_next(self, now: int = None) -> int:
+        """Milliseconds until the next frame is due (0 if it already is).
+        
+        Args:
+            now: Current ticks_ms() value (read if omitted)
+        """
+        if now is None:
+            now = ticks_ms()
+        due = (self.frame + 1 - self._base_frame) * self.frame_ms
+        return max(0, due - ticks_diff(now, self._start))
+    
+    def seconds(self) -> float:
+        """Animation time of the current frame in seconds."""
+        return max(0, self.frame) * self.frame_ms / 1000
+    
+    def stats(self) -> dict:
+        """Frame counters for reporting (e.g. in the heartbeat)."""
+        return {"rendered": self.rendered, "dropped": self.dropped}
 
 
 # =============================================================================
@@ -344,25 +584,24 @@ def run_pattern(anim: AnimationLibrary, pattern_name: str) -> list:
     Returns:
         List of RGB tuples for each LED
     """
-    patterns = {
-        "off": anim.off,
-        "solid": anim.solid,
-        "idle": anim.idle,
-        "pulse": anim.pulse,
-        "breathing": anim.breathing,
-        "rainbow": anim.rainbow,
-        "wave": anim.wave,
-        "sparkle": anim.sparkle,
-        "comet": anim.comet,
-        "alternate": anim.alternate,
-        "fire": anim.fire,
-        "ocean": anim.ocean,
-        "flash": anim.flash,
-        "celebration": anim.celebration,
-    }
-    
-    func = patterns.get(pattern_name, anim.idle)
-    return func()
+    anim.render(pattern_name)
+    return anim.frame()
+
+
+def render_pattern(anim: AnimationLibrary, pattern_name: str) -> bytearray:
+    """Render a pattern by name straight into the animation buffer.
+    
+    Unlike run_pattern() this builds no list, so it is the one to call
+    every frame on the device.
+    
+    Args:
+        anim: AnimationLibrary instance
+        pattern_name: Name of the pattern to run
+        
+    Returns:
+        The GRB buffer the frame was written to (``anim.buf``)
+    """
+    return anim.render(pattern_name)
 
 
 # =============================================================================
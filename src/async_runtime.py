@@ -0,0 +1,231 @@
+# Pico Whale Project - Asyncio Runtime
+# =====================================
+# Runs PicoWhale as a set of uasyncio tasks instead of one polling loop.
+# Sensor input, MQTT receive, animation rendering, heartbeat and connection
+# supervision each get their own task, so waiting on the network no longer
+# holds up touch detection or animation frames.
+#
+# The link manager connects a step at a time and status blinks run in
+# their own task. umqtt.simple itself is still blocking: an MQTT connect or
+# publish holds the scheduler for as long as the socket call takes.
+
+import time
+
+try:
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
+
+from config import HEARTBEAT_INTERVAL, SENSOR_POLL_MS, IDLE_TICK_MS
+from loop_profiler import STAGE_LOOP
+
+if hasattr(asyncio, "sleep_ms"):
+    sleep_ms = asyncio.sleep_ms
+else:
+    def sleep_ms(ms):
+        return asyncio.sleep(ms / 1000)
+
+if hasattr(asyncio, "wait_for_ms"):
+    wait_for_ms = asyncio.wait_for_ms
+else:
+    def wait_for_ms(awaitable, ms):
+        return asyncio.wait_for(awaitable, ms / 1000)
+
+if hasattr(asyncio, "core"):
+    def readable(sock):
+        """Wait until a socket has data (uasyncio's own idiom, as in its streams)."""
+        yield asyncio.core._io_queue.queue_read(sock)
+else:
+    async def readable(sock):
+        """Wait until a socket has data."""
+        loop = asyncio.get_running_loop()
+        ready = loop.create_future()
+        loop.add_reader(sock, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_reader(sock)
+
+
+class AsyncRunner:
+    """
+    Task-based runtime for a PicoWhale.
+
+    Usage:
+        whale = PicoWhale()
+        AsyncRunner(whale).run()
+
+    The per-step logic lives on PicoWhale (poll_sensors, poll_mqtt,
+    update_animation, ...) and is shared with the polling loop; this class
+    only decides when each step runs.
+    """
+
+    def __init__(self, whale):
+        """Initialize the runner.
+
+        Args:
+            whale: PicoWhale instance to drive
+        """
+        self.whale = whale
+
+    def run(self):
+        """Run until interrupted."""
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            self.whale.shutdown()
+        finally:
+            # Clear leftover tasks so a rerun starts clean
+            asyncio.new_event_loop()
+
+    async def main(self):
+        """Start every task; the link task connects in the background."""
+        whale = self.whale
+        whale.print_banner()
+        whale.link.start()
+        whale.print_ready()
+        whale.blink_status(5)  # 5 blinks = ready!
+        whale.show_idle()
+
+        await asyncio.gather(
+            self.status_task(),
+            self.sensor_task(),
+            self.mqtt_task(),
+            self.render_task(),
+            self.heartbeat_task(),
+            self.link_task(),
+        )
+
+    # =========================================================================
+    # Tasks
+    # =========================================================================
+
+    async def sensor_task(self):
+        """Handle touch and sound input.
+
+        With interrupt capture the task sleeps until an IRQ wakes it;
+        otherwise it polls every SENSOR_POLL_MS.
+        """
+        whale = self.whale
+        flag = None
+        if whale.sensor_events and hasattr(asyncio, "ThreadSafeFlag"):
+            flag = asyncio.ThreadSafeFlag()
+            whale.sensor_events.flag = flag
+        while True:
+            if flag and not whale.sensor_events.pending():
+                await self.until(flag.wait())
+            try:
+                whale.poll_sensors(time.time())
+            except Exception as e:
+                print(f"Sensor task error: {e}")
+            if not flag:
+                await self.pause(SENSOR_POLL_MS)
+
+    async def mqtt_task(self):
+        """Receive MQTT messages.
+
+        While connected the task sleeps until the socket has data, checking
+        at least every IDLE_TICK_MS; while disconnected it only looks every
+        IDLE_TICK_MS.
+        """
+        whale = self.whale
+        while True:
+            whale.poll_mqtt()
+            sock = whale.mqtt.sock if whale.connected and whale.mqtt else None
+            if sock is None:
+                await self.pause(IDLE_TICK_MS)
+            else:
+                await self.until(readable(sock), IDLE_TICK_MS)
+
+    async def render_task(self):
+        """Render animation frames as the animation clock makes them due.
+
+        While nothing is animating the task only wakes every IDLE_TICK_MS,
+        or as soon as start_response() calls whale.wake_animation().
+        """
+        whale = self.whale
+        wake = asyncio.Event()
+        whale.wake_animation = wake.set
+        while True:
+            # A render step longer than a frame is this runtime's loop overrun
+            t = whale.profiler.start(STAGE_LOOP)
+            try:
+                whale.update_animation(time.time())
+            except Exception as e:
+                print(f"Render task error: {e}")
+            whale.profiler.stop(STAGE_LOOP, t)
+            clock = whale.clock
+            if not whale.animating():
+                wake.clear()
+                await self.until(wake.wait(), IDLE_TICK_MS)
+            elif clock:
+                # Sleep until the next frame (a frame period if none is pending)
+                await self.pause(clock.ms_until_next() or clock.frame_ms)
+            else:
+                await self.pause(50)
+
+    async def heartbeat_task(self):
+        """Send a heartbeat every HEARTBEAT_INTERVAL seconds."""
+        whale = self.whale
+        while True:
+            wait = HEARTBEAT_INTERVAL - (time.time() - whale.last_heartbeat_time)
+            if wait <= 0:
+                whale.send_heartbeat()
+                wait = HEARTBEAT_INTERVAL
+            await self.pause(int(wait * 1000))
+
+    async def status_task(self):
+        """Play queued status LED blinks.
+
+        With nothing to play the task sleeps until blink() queues a sequence.
+        """
+        status = self.whale.status
+        queued = asyncio.Event()
+        status.wake = queued.set
+        while True:
+            wait = status.update()
+            if wait is None:
+                queued.clear()
+                await self.until(queued.wait())
+            else:
+                await self.pause(wait)
+
+    async def link_task(self):
+        """Advance WiFi/MQTT (re)connection whenever the link manager asks."""
+        link = self.whale.link
+        while True:
+            try:
+                wait = link.update()
+            except Exception as e:
+                print(f"Link task error: {e}")
+                wait = 1000
+            await self.pause(wait)
+
+    # =========================================================================
+    # Waiting (with duty cycle accounting)
+    # =========================================================================
+    # Only one task runs at a time, so "idle" is the time from a task
+    # yielding until the next one resumes. A yield is also the place for a
+    # proactive garbage collection.
+
+    async def pause(self, ms: int):
+        """Sleep for ms milliseconds."""
+        duty = self.whale.duty
+        self.whale.heap.idle()
+        duty.idle()
+        await sleep_ms(ms)
+        duty.busy()
+
+    async def until(self, awaitable, timeout_ms: int = None):
+        """Wait for an event or flag, optionally giving up after timeout_ms."""
+        duty = self.whale.duty
+        self.whale.heap.idle()
+        duty.idle()
+        try:
+            if timeout_ms is None:
+                await awaitable
+            else:
+                await wait_for_ms(awaitable, timeout_ms)
+        except asyncio.TimeoutError:
+            pass
+        duty.busy()
@@ -0,0 +1,180 @@
+# Pico Whale Project - Animation Clip Player
+# ===========================================
+# Streams precompiled animation clips from the filesystem one frame at a
+# time. A clip is one full period of a pattern rendered ahead of time by
+# tools/clip_builder.py, so playback costs a file read instead of per-LED
+# math, and new clips can be deployed without touching animations.py.
+#
+# File layout (little endian):
+#   header   "<4sBBHHBB": magic "WHCL", version, flags, led_count,
+#            frame_count, fps, reserved
+#   raw      frame_count frames of led_count * 3 bytes (G, R, B)
+#   delta    one raw keyframe (frame 0), then frame_count deltas taking
+#            frame k to frame k + 1 (the last one wraps back to frame 0).
+#            Each delta is a u16 change count followed by that many
+#            "<HBBB" records: LED index, G, R, B
+
+import os
+import struct
+
+CLIP_MAGIC = b"WHCL"
+CLIP_VERSION = 1
+CLIP_EXTENSION = ".wclip"
+FLAG_DELTA = 0x01
+
+HEADER_FORMAT = "<4sBBHHBB"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+DELTA_RECORD_SIZE = 5
+
+
+def read_header(f) -> tuple:
+    """Read and validate a clip header.
+
+    Returns:
+        (flags, led_count, frame_count, fps)
+
+    Raises:
+        ValueError: If the file is not a clip this player understands
+    """
+    data = f.read(HEADER_SIZE)
+    if len(data) != HEADER_SIZE:
+        raise ValueError("clip header truncated")
+    magic, version, flags, led_count, frame_count, fps, _ = struct.unpack(HEADER_FORMAT, data)
+    if magic != CLIP_MAGIC:
+        raise ValueError("not a whale clip")
+    if version != CLIP_VERSION:
+        raise ValueError("unsupported clip version %d" % version)
+    if not led_count or not frame_count:
+        raise ValueError("empty clip")
+    return flags, led_count, frame_count, fps
+
+
+class ClipPlayer:
+    """
+    Plays a clip into a GRB frame buffer.
+
+    Usage:
+        player = ClipPlayer("clips/rainbow.wclip", ANIMATION_FPS)
+        player.show(np.buf, frame)
+        np.write()
+
+    Frames passed to show() count at the caller's rate and are scaled to
+    the clip's own fps. Raw clips are read straight into the target buffer. Delta clips keep
+    their own copy of the current frame (the target may be modified after
+    rendering, e.g. by output correction) and apply deltas to it.
+    The file is opened on first use.
+    """
+
+    def __init__(self, path: str, render_fps: int = 0):
+        """Initialize the player.
+
+        Args:
+            path: Path of the .wclip file
+            render_fps: Rate show() is called at (0 = the clip's fps)
+        """
+        self.path = path
+        self.render_fps = render_fps
+        self._file = None
+        self.led_count = 0
+        self.frame_count = 0
+        self.fps = 0
+        self.delta = False
+        self._frame = -1
+
+    def _open(self):
+        f = open(self.path, "rb")
+        flags, self.led_count, self.frame_count, self.fps = read_header(f)
+        self.delta = bool(flags & FLAG_DELTA)
+        self.frame_bytes = self.led_count * 3
+        self._deltas_start = HEADER_SIZE + self.frame_bytes
+        if self.delta:
+            self._state = bytearray(self.frame_bytes)
+            self._count = bytearray(2)
+            self._records = bytearray(self.led_count * DELTA_RECORD_SIZE)
+            self._records_view = memoryview(self._records)
+        self._file = f
+
+    def close(self):
+        """Close the clip file (reopened automatically on next show())."""
+        if self._file:
+            self._file.close()
+            self._file = None
+        self._frame = -1
+
+    def show(self, buf, frame: int) -> bytearray:
+        """Write a frame of the clip into a buffer.
+
+        Args:
+            buf: GRB bytearray to write into
+            frame: Frame number (wraps around the clip length)
+
+        Returns:
+            buf
+        """
+        if self._file is None:
+            self._open()
+            if len(buf) != self.frame_bytes:
+                print("Clip %s is for %d LEDs, strip has %d"
+                      % (self.path, self.led_count, len(buf) // 3))
+        if self.fps and self.render_fps and self.fps != self.render_fps:
+            frame = frame * self.fps // self.render_fps
+        frame %= self.frame_count
+        if self.delta:
+            self._seek_delta(frame)
+            n = min(len(buf), self.frame_bytes)
+            buf[0:n] = self._state[0:n]
+        else:
+            self._file.seek(HEADER_SIZE + frame * self.frame_bytes)
+            if len(buf) == self.frame_bytes:
+                self._file.readinto(buf)
+            else:
+                n = min(len(buf), self.frame_bytes)
+                self._file.readinto(memoryview(buf)[0:n])
+        return buf
+
+    def _seek_delta(self, frame: int):
+        """Bring the internal frame state to the requested frame."""
+        f = self._file
+        # Deltas only go forward; restart from the keyframe when that is
+        # closer (first use, or the caller jumped backwards)
+        if self._frame < 0 or frame < (frame - self._frame) % self.frame_count:
+            f.seek(HEADER_SIZE)
+            f.readinto(self._state)
+            self._frame = 0
+        steps = (frame - self._frame) % self.frame_count
+        state = self._state
+        for _ in range(steps):
+            if self._frame == 0:
+                f.seek(self._deltas_start)
+            f.readinto(self._count)
+            count = self._count[0] | (self._count[1] << 8)
+            if count:
+                records = self._records_view[0:count * DELTA_RECORD_SIZE]
+                f.readinto(records)
+                for i in range(0, count * DELTA_RECORD_SIZE, DELTA_RECORD_SIZE):
+                    j = (records[i] | (records[i + 1] << 8)) * 3
+                    state[j] = records[i + 2]
+                    state[j + 1] = records[i + 3]
+                    state[j + 2] = records[i + 4]
+            self._frame = (self._frame + 1) % self.frame_count
+
+
+def find_clips(directory: str = "clips") -> dict:
+    """Find clip files in a directory.
+
+    Args:
+        directory: Directory to scan
+
+    Returns:
+        Dict of pattern name (file name without extension) to path;
+        empty if the directory does not exist
+    """
+    clips = {}
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return clips
+    for name in names:
+        if name.endswith(CLIP_EXTENSION):
+            clips[name[:-len(CLIP_EXTENSION)]] = directory + "/" + name
+    return clips
@@ -0,0 +1,113 @@
+# Pico Whale Project - LED Output Correction
+# ===========================================
+# Gamma, global brightness and white balance applied to the whole frame
+# just before it is written to the strip. Each channel goes through a
+# 256-entry lookup table that is rebuilt only when a setting changes, so
+# a frame costs three table lookups per LED whatever the settings are.
+
+import json
+
+
+class ColorCorrection:
+    """
+    Per-channel lookup tables applied in place to a GRB frame buffer.
+
+    Usage:
+        output = ColorCorrection(brightness=0.6, gamma=2.2)
+
+        render_pattern(anim, "wave")   # writes np.buf
+        output.apply(np.buf)
+        np.write()
+
+    apply() rewrites the buffer, so call it exactly once per rendered frame.
+    """
+
+    def __init__(self, brightness: float = 1.0, gamma: float = 1.0,
+                 white_balance: tuple = (255, 255, 255)):
+        """Initialize output correction.
+
+        Args:
+            brightness: Global brightness (0.0 - 1.0)
+            gamma: Gamma exponent (1.0 = linear, 2.2 - 2.8 suits most LEDs)
+            white_balance: Maximum (r, g, b) output for full white
+        """
+        self.brightness = 1.0
+        self.gamma = 1.0
+        self.white_balance = (255, 255, 255)
+        self.lut_r = bytearray(256)
+        self.lut_g = bytearray(256)
+        self.lut_b = bytearray(256)
+        self.identity = True
+        self.configure(brightness, gamma, white_balance)
+
+    def configure(self, brightness: float = None, gamma: float = None,
+                  white_balance: tuple = None):
+        """Change any of the settings and rebuild the lookup tables.
+
+        Args:
+            brightness: Global brightness (0.0 - 1.0), unchanged if None
+            gamma: Gamma exponent, unchanged if None
+            white_balance: (r, g, b) white point, unchanged if None
+        """
+        if brightness is not None:
+            self.brightness = max(0.0, min(1.0, float(brightness)))
+        if gamma is not None:
+            self.gamma = max(0.1, float(gamma))
+        if white_balance is not None:
+            if len(white_balance) != 3:
+                raise ValueError("white_balance needs (r, g, b)")
+            self.white_balance = tuple(max(0, min(255, int(c))) for c in white_balance)
+        self._build()
+
+    def _build(self):
+        """Rebuild the three channel tables from the current settings."""
+        curve = [((i / 255) ** self.gamma) * self.brightness for i in range(256)]
+        for lut, white in ((self.lut_r, self.white_balance[0]),
+                           (self.lut_g, self.white_balance[1]),
+                           (self.lut_b, self.white_balance[2])):
+            for i in range(256):
+                lut[i] = int(curve[i] * white + 0.5)
+        self.identity = (self.brightness == 1.0 and self.gamma == 1.0
+                         and self.white_balance == (255, 255, 255))
+
+    def apply(self, buf, led_count: int = None):
+        """Correct a GRB frame buffer in place.
+
+        Args:
+            buf: bytearray with 3 bytes per LED (G, R, B)
+            led_count: Number of LEDs to correct (default: whole buffer)
+        """
+        if self.identity:
+            return
+        end = len(buf) if led_count is None else led_count * 3
+        lut_r, lut_g, lut_b = self.lut_r, self.lut_g, self.lut_b
+        for i in range(0, end, 3):
+            buf[i] = lut_g[buf[i]]
+            buf[i + 1] = lut_r[buf[i + 1]]
+            buf[i + 2] = lut_b[buf[i + 2]]
+
+    def settings(self) -> dict:
+        """Current settings, in the same shape update_from_message() accepts."""
+        return {
+            "brightness": self.brightness,
+            "gamma": self.gamma,
+            "white_balance": list(self.white_balance),
+        }
+
+    def update_from_message(self, message: str):
+        """Apply settings received over MQTT.
+
+        Accepts either a bare brightness ("0.5") or a JSON object with any
+        of "brightness", "gamma" and "white_balance" ([r, g, b]).
+
+        Raises:
+            ValueError: If the message cannot be parsed
+        """
+        message = message.strip()
+        if message.startswith("{"):
+            settings = json.loads(message)
+            self.configure(settings.get("brightness"),
+                           settings.get("gamma"),
+                           settings.get("white_balance"))
+        else:
+            self.configure(brightness=float(message))
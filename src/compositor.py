@@ -0,0 +1,272 @@
+# Pico Whale Project - Layer Compositor
+# ======================================
+# Stacks several AnimationLibrary patterns and blends them into one frame,
+# with timed crossfades when a layer changes pattern.
+# All buffers are preallocated and all blending is integer math, so a
+# frame allocates nothing beyond what the patterns themselves do.
+
+from animations import AnimationLibrary, ticks_ms, ticks_diff
+
+# Blend modes
+BLEND_ALPHA = 0    # Mix over the layers below by opacity
+BLEND_ADD = 1      # Add to the layers below (saturating)
+BLEND_MAX = 2      # Keep the brighter of layer and layers below
+
+BLEND_MODES = {"alpha": BLEND_ALPHA, "add": BLEND_ADD, "max": BLEND_MAX}
+
+
+class Layer:
+    """One pattern slot in the compositor.
+
+    Each layer owns two animators with their own buffers: the current
+    pattern and, while a crossfade runs, the outgoing one.
+    """
+
+    def __init__(self, library, led_count: int):
+        self.anim = library(led_count)
+        self.fade_anim = library(led_count)
+        self.pattern = None            # None = layer disabled
+        self.mode = BLEND_ALPHA
+        self.opacity = 256             # 0 - 256
+
+        # Pattern crossfade
+        self.old_pattern = None
+        self.fade_start = 0
+        self.fade_ms = 0
+
+        # Opacity fade
+        self.opacity_from = 256
+        self.opacity_to = 256
+        self.opacity_start = 0
+        self.opacity_ms = 0
+
+
+class Compositor:
+    """
+    Blends N pattern layers into one GRB frame buffer.
+
+    Usage:
+        comp = Compositor(led_count=60, buf=np.buf, layers=2)
+        comp.set_layer(0, "ocean")
+        comp.set_layer(1, "sparkle", mode=BLEND_ADD, opacity=96)
+
+        # Later, e.g. when a touch arrives:
+        comp.crossfade(0, "pulse", 500)
+
+        while True:
+            if clock.update():
+                comp.render(clock.frame)
+                np.write()
+
+    Layer 0 is the bottom of the stack.
+    """
+
+    def __init__(self, led_count: int = 12, buf=None, layers: int = 2,
+                 library=AnimationLibrary):
+        """Initialize the compositor.
+
+        Args:
+            led_count: Number of LEDs
+            buf: GRB bytearray to compose into (e.g. ``NeoPixel.buf``)
+            layers: Number of layers to preallocate
+            library: AnimationLibrary class (or subclass) used per layer
+        """
+        self.led_count = led_count
+        self.buf = buf if buf is not None else bytearray(led_count * 3)
+        self.layers = [Layer(library, led_count) for _ in range(layers)]
+
+    # =========================================================================
+    # Layer Control
+    # =========================================================================
+
+    def set_color(self, r: int, g: int, b: int):
+        """Set the base color on every layer."""
+        for layer in self.layers:
+            layer.anim.set_color(r, g, b)
+            layer.fade_anim.set_color(r, g, b)
+
+    def add_pattern(self, name: str, make_source):
+        """Register an external frame source as a pattern on every layer.
+
+        Args:
+            name: Pattern name to register
+            make_source: Callable returning a new source object (each layer
+                         animator needs its own, see AnimationLibrary.add_pattern)
+        """
+        for layer in self.layers:
+            layer.anim.add_pattern(name, make_source())
+            layer.fade_anim.add_pattern(name, make_source())
+
+    def set_layer(self, index: int, pattern: str, mode: int = None,
+                  opacity: int = None):
+        """Switch a layer to a pattern immediately (hard cut).
+
+        Args:
+            index: Layer index (0 = bottom)
+            pattern: Pattern name, or None to disable the layer
+            mode: BLEND_ALPHA, BLEND_ADD or BLEND_MAX (unchanged if None)
+            opacity: 0 - 255 (unchanged if None)
+        """
+        layer = self.layers[index]
+        layer.pattern = pattern
+        layer.old_pattern = None
+        layer.fade_ms = 0
+        if mode is not None:
+            layer.mode = mode
+        if opacity is not None:
+            layer.opacity = layer.opacity_to = _scale(opacity)
+            layer.opacity_ms = 0
+
+    def crossfade(self, index: int, pattern: str, duration_ms: int,
+                  now: int = None):
+        """Fade a layer from its current pattern to a new one.
+
+        Args:
+            index: Layer index
+            pattern: Pattern to fade to (None fades to black)
+            duration_ms: Crossfade length in milliseconds
+            now: Current ticks_ms() value (read if omitted)
+        """
+        layer = self.layers[index]
+        if pattern == layer.pattern and not layer.fade_ms:
+            return
+        if duration_ms <= 0:
+            self.set_layer(index, pattern)
+            return
+        # Swap animators so the outgoing pattern keeps its own state
+        layer.anim, layer.fade_anim = layer.fade_anim, layer.anim
+        layer.old_pattern = layer.pattern
+        layer.pattern = pattern
+        layer.fade_start = ticks_ms() if now is None else now
+        layer.fade_ms = duration_ms
+
+    def fade_opacity(self, index: int, opacity: int, duration_ms: int,
+                     now: int = None):
+        """Fade a layer's opacity.
+
+        Args:
+            index: Layer index
+            opacity: Target opacity 0 - 255
+            duration_ms: Fade length in milliseconds
+            now: Current ticks_ms() value (read if omitted)
+        """
+        layer = self.layers[index]
+        layer.opacity_from = layer.opacity
+        layer.opacity_to = _scale(opacity)
+        layer.opacity_start = ticks_ms() if now is None else now
+        layer.opacity_ms = max(1, duration_ms)
+
+    def transitioning(self) -> bool:
+        """True while any crossfade or opacity fade is running."""
+        for layer in self.layers:
+            if layer.fade_ms or layer.opacity_ms:
+                return True
+        return False
+
+    # =========================================================================
+    # Rendering
+    # =========================================================================
+
+    def render(self, frame: int = None, now: int = None) -> bytearray:
+        """Render every layer and blend them into the output buffer.
+
+        Args:
+            frame: Animation frame to render (e.g. AnimationClock.frame);
+                   patterns just advance one step if omitted
+            now: Current ticks_ms() value for fades (read if omitted)
+
+        Returns:
+            The output buffer
+        """
+        if now is None:
+            now = ticks_ms()
+        out = self.buf
+        n = self.led_count * 3
+        for i in range(n):
+            out[i] = 0
+
+        for layer in self.layers:
+            if layer.pattern is None and not layer.fade_ms:
+                continue
+            src = self._render_layer(layer, frame, now)
+            alpha = self._layer_opacity(layer, now)
+            if alpha == 0:
+                continue
+            if layer.mode == BLEND_ADD:
+                _blend_add(out, src, alpha, n)
+            elif layer.mode == BLEND_MAX:
+                _blend_max(out, src, alpha, n)
+            else:
+                _blend_alpha(out, src, alpha, n)
+        return out
+
+    def _render_layer(self, layer: Layer, frame: int, now: int) -> bytearray:
+        """Render a layer's pattern, mixing in the outgoing one mid-crossfade."""
+        anim = layer.anim
+        if frame is not None:
+            anim.seek(frame)
+        anim.render("off" if layer.pattern is None else layer.pattern)
+
+        if not layer.fade_ms:
+            return anim.buf
+
+        elapsed = ticks_diff(now, layer.fade_start)
+        if elapsed >= layer.fade_ms:
+            layer.fade_ms = 0
+            layer.old_pattern = None
+            return anim.buf
+
+        old = layer.fade_anim
+        if frame is not None:
+            old.seek(frame)
+        old.render("off" if layer.old_pattern is None else layer.old_pattern)
+        # Blend the new pattern over the old one, result in the old buffer
+        _blend_alpha(old.buf, anim.buf, (elapsed << 8) // layer.fade_ms,
+                     self.led_count * 3)
+        return old.buf
+
+    def _layer_opacity(self, layer: Layer, now: int) -> int:
+        """Layer opacity (0 - 256) at the current time."""
+        if layer.opacity_ms:
+            elapsed = ticks_diff(now, layer.opacity_start)
+            if elapsed >= layer.opacity_ms:
+                layer.opacity = layer.opacity_to
+                layer.opacity_ms = 0
+            else:
+                span = layer.opacity_to - layer.opacity_from
+                layer.opacity = layer.opacity_from + span * elapsed // layer.opacity_ms
+        return layer.opacity
+
+
+# =============================================================================
+# Integer Blend Helpers
+# =============================================================================
+# alpha is 0 - 256 so that >> 8 is exact at both ends.
+
+def _scale(opacity: int) -> int:
+    """Map an opacity of 0 - 255 to 0 - 256."""
+    opacity = max(0, min(255, opacity))
+    return opacity + (opacity >> 7)
+
+
+def _blend_alpha(out, src, alpha: int, n: int):
+    if alpha >= 256:
+        for i in range(n):
+            out[i] = src[i]
+        return
+    for i in range(n):
+        o = out[i]
+        out[i] = o + (((src[i] - o) * alpha) >> 8)
+
+
+def _blend_add(out, src, alpha: int, n: int):
+    for i in range(n):
+        v = out[i] + ((src[i] * alpha) >> 8)
+        out[i] = v if v < 255 else 255
+
+
+def _blend_max(out, src, alpha: int, n: int):
+    for i in range(n):
+        v = (src[i] * alpha) >> 8
+        if v > out[i]:
+            out[i] = v
@@ -15,6 +15,7 @@ WIFI_PASSWORD = "Hunter777"
 # ===========================================
 # Using test.mosquitto.org - reliable public broker
 # Alternative: broker.hivemq.com or broker.emqx.io
+# For offline testing run tools/mqtt_broker.py on a PC and use its IP here
 MQTT_BROKER = "test.mosquitto.org"
 MQTT_PORT = 1883
 
@@ -27,6 +28,7 @@ TOPIC_TOUCH = f"pico_whale/{WHALE_PAIR_ID}/touch"
 TOPIC_HEARTBEAT = f"pico_whale/{WHALE_PAIR_ID}/heartbeat"
 TOPIC_COLOR = f"pico_whale/{WHALE_PAIR_ID}/color"
 TOPIC_PATTERN = f"pico_whale/{WHALE_PAIR_ID}/pattern"
+TOPIC_BRIGHTNESS = f"pico_whale/{WHALE_PAIR_ID}/brightness"
 TOPIC_STATUS = f"pico_whale/{WHALE_PAIR_ID}/status"
 
 # ===========================================
@@ -56,6 +58,35 @@ USE_NEOPIXEL = False
 NEOPIXEL_PIN = 16          # GPIO pin for NeoPixel data line
 NEOPIXEL_COUNT = 12        # Number of LEDs in your ring/strip
 
+# Animation math: "fixed" uses integer-only patterns (fast on the Pico,
+# which has no FPU), "float" uses the reference floating-point patterns
+ANIMATION_BACKEND = "fixed"
+
+# Animation frame rate. Patterns follow the wall clock at this rate; if the
+# main loop falls behind, frames are skipped (and counted) rather than slowed
+ANIMATION_FPS = 20
+
+# Pattern changes fade over this many milliseconds instead of hard-cutting
+CROSSFADE_MS = 500
+
+# Optional pattern layered on top of the main one, e.g. "sparkle" over
+# "ocean". Blend is "alpha", "add" or "max"; opacity is 0-255
+OVERLAY_PATTERN = None
+OVERLAY_BLEND = "add"
+OVERLAY_OPACITY = 96
+
+# Directory of precompiled animation clips (built with tools/clip_builder.py).
+# Each <name>.wclip in it becomes a pattern called <name>
+CLIP_DIR = "clips"
+
+# Output correction applied to every frame before it is sent to the strip.
+# Can also be changed at runtime on TOPIC_BRIGHTNESS, either a bare
+# brightness ("0.4") or JSON: {"brightness": 0.4, "gamma": 2.2,
+# "white_balance": [255, 220, 180]}
+LED_BRIGHTNESS = 1.0               # Global brightness (0.0 - 1.0)
+LED_GAMMA = 1.0                    # 1.0 = off, 2.2 - 2.8 for perceptual fades
+LED_WHITE_BALANCE = (255, 255, 255)  # Max R, G, B output for full white
+
 # ===========================================
 # Servo & Sound Configuration (New Hardware!)
 # ===========================================
@@ -67,6 +98,12 @@ SERVO_PIN = 17             # GPIO pin for Servo signal
 USE_SOUND_SENSOR = True
 SOUND_SENSOR_PIN = 14      # GPIO pin for Sound Sensor digital output
 
+# Capture touch/sound edges with pin interrupts into an event buffer, so
+# short taps and claps are never missed (False = poll the pins each loop)
+USE_SENSOR_IRQ = True
+SENSOR_EVENT_BUFFER = 16   # Events held between main loop drains
+SENSOR_DEBOUNCE_MS = 30    # Ignore edges this soon after the previous one
+
 # LED Colors (RGB format, 0-255) - default values
 COLOR_IDLE = (10, 30, 60)          # Dim blue when idle/waiting
 COLOR_TOUCHED = (255, 100, 200)    # Pink/purple when activated
@@ -83,6 +120,11 @@ RESPONSE_DURATION = 5
 # How often to send "I'm alive" signal (seconds)
 HEARTBEAT_INTERVAL = 30
 
+# Heartbeats only carry what changed since the last keyframe, a full
+# heartbeat sent every HEARTBEAT_KEYFRAME_EVERY heartbeats so new listeners
+# can catch up
+HEARTBEAT_KEYFRAME_EVERY = 10
+
 # Minimum seconds between touch detections (debounce)
 TOUCH_COOLDOWN = 2
 
@@ -98,9 +140,61 @@ WIFI_TIMEOUT = 30
 # MQTT keepalive interval (seconds)
 MQTT_KEEPALIVE = 60
 
+# Longest a single MQTT connect may block (seconds)
+MQTT_CONNECT_TIMEOUT = 10
+
+# How long a resolved broker address is reused before looking it up again
+MQTT_DNS_TTL = 3600               # Seconds
+
+# Keep a persistent session (stable client ID, clean_session off) so the
+# broker holds QoS 1 touches while we are offline. Touches are published
+# and subscribed at TOUCH_QOS
+MQTT_CLEAN_SESSION = False
+TOUCH_QOS = 1
+
+# Send touches and heartbeats in the compact binary encoding (see wire.py)
+# once every other whale heard from advertises support for it. Text is
+# always understood, and used with older whales and the desktop tools
+WIRE_BINARY = True
+
+# Reconnect retry delays double per failure (with jitter) between these
+RECONNECT_BACKOFF_MIN_MS = 1000
+RECONNECT_BACKOFF_MAX_MS = 60000
+
+# Touches are kept in flash (touch_queue.bin) until the broker acknowledges
+# them, and replayed in order after a reconnect or restart. The oldest are
+# dropped beyond TOUCH_QUEUE_SIZE or after TOUCH_QUEUE_MAX_AGE
+TOUCH_QUEUE_SIZE = 20
+TOUCH_QUEUE_MAX_AGE = 600         # Seconds
+
 # Enable debug messages
 DEBUG_MODE = True
 
+# Report per-stage heap allocations in the heartbeat timings (and print
+# micropython.mem_info() at each heartbeat), to find loop stages that
+# allocate. Costs a little time per stage; leave off normally
+HEAP_AUDIT = False
+
+# Collect garbage while the loop is idle once free heap drops below this,
+# so automatic collections do not land in the middle of a frame (0 = off)
+GC_IDLE_FREE_BELOW = 24 * 1024
+
+# Run sensors, MQTT receive, animation, heartbeat and connection checks as
+# separate uasyncio tasks. False (or no asyncio on the board) uses the
+# single polling loop instead
+USE_ASYNCIO = True
+SENSOR_POLL_MS = 20               # Touch/sound sensor poll interval
+CONNECTION_CHECK_INTERVAL = 10    # Seconds between WiFi/MQTT health checks
+
+# Loop rate when nothing is animating. The loop still wakes at once for
+# incoming MQTT data, and within IDLE_WAKE_SLICE_MS of a captured touch
+IDLE_TICK_MS = 1000
+IDLE_WAKE_SLICE_MS = 20
+
+# Sleep with machine.lightsleep() while idle and offline. Only for whales
+# without WiFi: the radio is not serviced during lightsleep
+USE_LIGHTSLEEP = False
+
 
 # ===========================================
 # Quick Reference: Wiring Guide
@@ -0,0 +1,249 @@
+# Pico Whale Project - Fixed-Point Animation Backend
+# ===================================================
+# Integer-only versions of the AnimationLibrary patterns.
+# The RP2040 has no FPU and MicroPython boxes every float on the heap, so
+# the per-LED loops here use only small-int math and lookup tables.
+# Same public API as AnimationLibrary; frames are within ±1 of it.
+
+import math
+from array import array
+
+from animations import AnimationLibrary, random
+
+# Fixed-point formats
+#   phase:      one full turn = 1 << 16 (16.16 angle, wraps with & 0xFFFF)
+#   amplitude:  1.0 = 1 << 15 (Q15) so every product stays a MicroPython
+#               small int (31 bits) and never allocates
+ONE = 1 << 15
+TURN = 1 << 16
+_TWO_PI = 2 * math.pi
+_RAD_TO_PHASE = TURN / _TWO_PI
+
+# Quarter-wave sine table: sin(0 .. pi/2) in 256 steps, Q15
+_SIN_QUARTER = tuple(int(math.sin(i * math.pi / 512) * ONE + 0.5)
+                     for i in range(257))
+
+# Breathing curve (exp(s) - 1/e) / (e - 1/e) for s in -1 .. 1, Q15
+_BREATH = tuple(int((math.exp(i / 128 - 1) - 0.36787944) / 2.35040238 * ONE + 0.5)
+                for i in range(257))
+
+# Brightness constants used by the float patterns, in Q15
+_Q_0_1 = 3277     # 0.1
+_Q_0_3 = 9831     # 0.3
+_Q_0_4 = 13107    # 0.4
+_Q_0_6 = 19661    # 0.6
+_Q_0_7 = 22938    # 0.7
+_PHASE_1_2 = int(1.2 * _RAD_TO_PHASE + 0.5)  # ocean's second wave offset
+
+
+def isin(phase: int) -> int:
+    """Sine of a 16-bit phase angle.
+
+    Args:
+        phase: Angle where 65536 is one full turn (any int, wraps)
+
+    Returns:
+        sin(angle) in Q15 (-32768 .. 32768)
+    """
+    phase &= 0xFFFF
+    quadrant = phase >> 14
+    x = phase & 0x3FFF
+    if quadrant & 1:
+        x = 0x4000 - x
+    i = x >> 6
+    value = _SIN_QUARTER[i]
+    frac = x & 0x3F
+    if frac:
+        value += ((_SIN_QUARTER[i + 1] - value) * frac) >> 6
+    return -value if quadrant & 2 else value
+
+
+def ibreath(s: int) -> int:
+    """Breathing curve for a Q15 sine value.
+
+    Args:
+        s: sin(t) in Q15 (-32768 .. 32768)
+
+    Returns:
+        Brightness in Q15 (0 .. 32768)
+    """
+    v = s + ONE
+    i = v >> 8
+    value = _BREATH[i]
+    frac = v & 0xFF
+    if frac:
+        value += ((_BREATH[i + 1] - value) * frac) >> 8
+    return value
+
+
+class FixedPointAnimationLibrary(AnimationLibrary):
+    """
+    AnimationLibrary with integer-only renderers.
+
+    Drop-in replacement - only the _render_* methods change:
+
+        from fixed_animations import FixedPointAnimationLibrary
+
+        anim = FixedPointAnimationLibrary(led_count=12, buf=np.buf)
+        render_pattern(anim, "wave")
+
+    Time-dependent patterns still take one float per frame to turn the tick
+    into a phase; everything per LED is integer.
+    """
+
+    def __init__(self, led_count: int = 12, buf=None):
+        super().__init__(led_count, buf)
+        # Phase of each LED around the ring (i / led_count of a turn)
+        self._led_phase = array("H", (i * TURN // led_count for i in range(led_count)))
+
+    def _phase(self, rate: float, turns: int = 1) -> int:
+        """Current tick as a phase, wrapped to a whole number of turns."""
+        t = (self._tick * rate) % (_TWO_PI * turns)
+        return int(t * _RAD_TO_PHASE)
+
+    def _fill_scaled(self, level: int):
+        """Fill with the base color scaled by a Q15 level."""
+        self._fill((self.red * level) >> 15,
+                   (self.green * level) >> 15,
+                   (self.blue * level) >> 15)
+
+    def _set_hue(self, index: int, hue: int):
+        """Set one LED to a fully saturated hue (16-bit, one turn = 65536)."""
+        h6 = (hue & 0xFFFF) * 6
+        sector = h6 >> 16
+        f = h6 & 0xFFFF
+        q = (255 * (TURN - f)) >> 16
+        t = (255 * f) >> 16
+        if sector == 0:
+            r, g, b = 255, t, 0
+        elif sector == 1:
+            r, g, b = q, 255, 0
+        elif sector == 2:
+            r, g, b = 0, 255, t
+        elif sector == 3:
+            r, g, b = 0, q, 255
+        elif sector == 4:
+            r, g, b = t, 0, 255
+        else:
+            r, g, b = 255, 0, q
+        j = index * 3
+        buf = self.buf
+        buf[j] = g
+        buf[j + 1] = r
+        buf[j + 2] = b
+
+    # =========================================================================
+    # Integer Renderers
+    # =========================================================================
+
+    def _render_solid(self, brightness: float = 1.0):
+        level = int(brightness * ONE)
+        self._fill_scaled(max(0, min(ONE, level)))
+
+    def _render_pulse(self, speed: float = 3.0):
+        self._tick += 1
+        s = isin(self._phase(0.05 * speed))
+        self._fill_scaled(_Q_0_3 + ((_Q_0_7 * abs(s)) >> 15))
+
+    def _render_breathing(self, speed: float = 0.5):
+        self._tick += 1
+        s = isin(self._phase(0.05 * speed))
+        self._fill_scaled(ibreath(s))
+
+    def _render_rainbow(self, speed: float = 1.0):
+        self._tick += 1
+        offset = int(((self._tick * 0.01 * speed) % 1.0) * TURN)
+        led_phase = self._led_phase
+        for i in range(self.led_count):
+            self._set_hue(i, led_phase[i] + offset)
+
+    def _render_wave(self, speed: float = 3.0):
+        self._tick += 1
+        t = self._phase(0.05 * speed)
+        red, green, blue = self.red, self.green, self.blue
+        led_phase = self._led_phase
+        buf = self.buf
+        j = 0
+        for i in range(self.led_count):
+            level = _Q_0_6 + ((_Q_0_4 * isin(led_phase[i] + t)) >> 15)
+            buf[j] = (green * level) >> 15
+            buf[j + 1] = (red * level) >> 15
+            buf[j + 2] = (blue * level) >> 15
+            j += 3
+
+    def _render_sparkle(self, density: float = 0.15):
+        threshold = int(density * 0x10000)
+        r = (self.red * _Q_0_3) >> 15
+        g = (self.green * _Q_0_3) >> 15
+        b = (self.blue * _Q_0_3) >> 15
+        buf = self.buf
+        j = 0
+        for _ in range(self.led_count):
+            if random.getrandbits(16) < threshold:
+                buf[j] = buf[j + 1] = buf[j + 2] = 255
+            else:
+                buf[j] = g
+                buf[j + 1] = r
+                buf[j + 2] = b
+            j += 3
+
+    def _render_comet(self, tail_length: int = 4, speed: float = 1.0):
+        self._fill(0, 0, 0)
+        self._tick += 1
+        position = int((self._tick * 0.2 * speed) % self.led_count)
+        for i in range(tail_length):
+            remaining = tail_length - i
+            self._set((position - i) % self.led_count,
+                      self.red * remaining // tail_length,
+                      self.green * remaining // tail_length,
+                      self.blue * remaining // tail_length)
+
+    def _render_alternate(self, speed: float = 2.0):
+        self._tick += 1
+        phase = int(self._tick * 0.1 * speed) & 1
+        r = (self.red * _Q_0_1) >> 15
+        g = (self.green * _Q_0_1) >> 15
+        b = (self.blue * _Q_0_1) >> 15
+        for i in range(self.led_count):
+            if (i & 1) == phase:
+                self._set(i, self.red, self.green, self.blue)
+            else:
+                self._set(i, r, g, b)
+
+    def _render_fire(self):
+        buf = self.buf
+        j = 0
+        for _ in range(self.led_count):
+            # Flicker between 0.7 and 1.0
+            flicker = _Q_0_7 + ((random.getrandbits(15) * _Q_0_3) >> 15)
+            buf[j] = ((50 + random.randint(0, 100)) * flicker) >> 15
+            buf[j + 1] = (255 * flicker) >> 15
+            buf[j + 2] = 0
+            j += 3
+
+    def _render_ocean(self, speed: float = 1.0):
+        self._tick += 1
+        # The second wave runs at 1.5x, so the phase repeats every 2 turns
+        t = self._phase(0.03 * speed, turns=2)
+        led_phase = self._led_phase
+        buf = self.buf
+        j = 0
+        for i in range(self.led_count):
+            phase = led_phase[i] + t
+            wave1 = (isin(phase) + ONE) >> 1
+            wave2 = (isin(((phase * 3) >> 1) + _PHASE_1_2) + ONE) >> 1
+            mix = ((_Q_0_6 * wave1) >> 15) + ((_Q_0_4 * wave2) >> 15)
+            level = _Q_0_3 + ((_Q_0_7 * mix) >> 15)
+            # Colors in 8.8 times level in Q14 keeps products under 2**30
+            level14 = level >> 1
+            buf[j] = ((25600 + ((50 * wave2) >> 7)) * level14) >> 22
+            buf[j + 1] = (20 * level) >> 15
+            buf[j + 2] = ((46080 + ((75 * wave1) >> 7)) * level14) >> 22
+            j += 3
+
+    def _render_celebration(self):
+        for i in range(self.led_count):
+            if random.getrandbits(16) < 19661:  # 30%
+                self._set_hue(i, random.getrandbits(16))
+            else:
+                self._set(i, 0, 0, 0)
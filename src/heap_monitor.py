@@ -0,0 +1,119 @@
+# Pico Whale Project - Heap Monitor
+# ==================================
+# Tracks free heap, its low-water mark and garbage collection pauses for
+# the heartbeat.
+#
+# MicroPython only frees memory in a collection, so free memory that grew
+# between two samples means an automatic collection ran in between (these
+# happen when an allocation finds the heap full, in the middle of whatever
+# was allocating). To keep those pauses out of the frame loop the monitor
+# also collects proactively, while the loop is idle anyway, once free
+# memory drops below a threshold. Those collections are timed.
+
+import gc
+from time import ticks_us, ticks_diff
+
+try:
+    import micropython
+except ImportError:
+    micropython = None
+
+_mem_free = getattr(gc, "mem_free", None)
+
+
+class HeapMonitor:
+    """
+    Heap and GC statistics.
+
+    Usage:
+        heap = HeapMonitor(collect_below=24 * 1024)
+
+        heap.idle()                   # Before every idle wait
+        heartbeat["heap"] = heap.report()
+    """
+
+    def __init__(self, collect_below: int = 0, mem_info: bool = False):
+        """Initialize the monitor.
+
+        Args:
+            collect_below: Collect during idle() when fewer bytes than this
+                           are free (0 = only automatic collections)
+            mem_info: Print micropython.mem_info() with every report
+        """
+        self.collect_below = collect_below
+        self.mem_info = mem_info and micropython is not None
+        self.free = _mem_free() if _mem_free else 0
+        self.min_free = self.free
+        self.auto_collections = 0
+        self.collections = 0
+        self.pause_us_total = 0
+        self.pause_us_max = 0
+
+    def sample(self) -> int:
+        """Read free memory, noting any automatic collection since the last read."""
+        if not _mem_free:
+            return 0
+        free = _mem_free()
+        if free > self.free:
+            self.auto_collections += 1
+        self.free = free
+        if free < self.min_free:
+            self.min_free = free
+        return free
+
+    def collect(self) -> int:
+        """Run a timed collection.
+
+        Returns:
+            Pause length in microseconds
+        """
+        self.sample()
+        start = ticks_us()
+        gc.collect()
+        us = ticks_diff(ticks_us(), start)
+        self.collections += 1
+        self.pause_us_total += us
+        if us > self.pause_us_max:
+            self.pause_us_max = us
+        if _mem_free:
+            self.free = _mem_free()
+        return us
+
+    def idle(self) -> bool:
+        """Sample the heap and collect if it is running low.
+
+        Returns:
+            True if a collection ran
+        """
+        free = self.sample()
+        if self.collect_below and _mem_free and free < self.collect_below:
+            self.collect()
+            return True
+        return False
+
+    def report(self) -> dict:
+        """Heap state and GC pauses since the last report.
+
+        Returns:
+            {"free", "min_free", "gc": {"n", "avg_us", "max_us"}, "auto_gc": n};
+            min_free is the lowest value seen since boot
+        """
+        self.sample()
+        n = self.collections
+        result = {
+            "free": self.free if _mem_free else None,
+            "min_free": self.min_free if _mem_free else None,
+            "gc": {
+                "n": n,
+                "avg_us": self.pause_us_total // n if n else 0,
+                "max_us": self.pause_us_max,
+            },
+            "auto_gc": self.auto_collections,
+        }
+        if self.mem_info:
+            micropython.mem_info()
+        self.collections = 0
+        self.pause_us_total = 0
+        self.pause_us_max = 0
+        self.auto_collections = 0
+        return result
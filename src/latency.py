@@ -0,0 +1,208 @@
+# Pico Whale Project - Touch Latency
+# ==================================
+# Measures touch-to-light latency between paired whales: the time from a
+# whale sending a touch to its peer showing the first response frame.
+#
+# Touches carry the sender's send time in ms and a sequence number. The
+# two whales' clocks are compared NTP-style over heartbeats: every
+# heartbeat carries its send time ("ts") and echoes, for each peer, the
+# send time of the last heartbeat heard from it and when that arrived
+# ("echo"). When a peer's heartbeat echoes one of ours we have all four
+# timestamps of a round trip:
+#
+#   t1  we sent our heartbeat        (our clock)
+#   t2  the peer received it         (peer clock)
+#   t3  the peer sent its heartbeat  (peer clock)
+#   t4  we received that one         (our clock)
+#
+#   offset = ((t2 - t1) + (t3 - t4)) / 2     peer clock minus ours
+#   delay  = (t4 - t1) - (t3 - t2)           network time, both ways
+#
+# The offset is wrong by at most half the difference between the two
+# directions' network times, so of the last few samples the one with the
+# smallest delay is used.
+#
+# Latencies go into a histogram with the loop profiler's log-linear
+# buckets (in ms rather than us), so recording allocates nothing.
+
+import time
+from array import array
+
+from loop_profiler import BUCKETS, bucket_of, bucket_limit
+
+_time_ns = getattr(time, "time_ns", None)
+
+SYNC_SAMPLES = 8       # Round trips kept per peer
+
+
+def now_ms() -> int:
+    """Wall-clock time in ms since the epoch."""
+    if _time_ns:
+        return _time_ns() // 1000000
+    return int(time.time() * 1000)
+
+
+class ClockSync:
+    """
+    Clock offsets to peer whales, estimated from heartbeat round trips.
+
+    Usage:
+        sync = ClockSync(DEVICE_ID)
+
+        heartbeat["ts"] = now_ms()       # Sending
+        heartbeat["echo"] = sync.echo()
+
+        sync.on_heartbeat(peer_heartbeat, now_ms())    # Receiving
+        offset = sync.offset(peer)       # None until a round trip completes
+    """
+
+    def __init__(self, device_id: str, samples: int = SYNC_SAMPLES):
+        """Initialize clock sync.
+
+        Args:
+            device_id: Our own device ID (echoes addressed to it are ours)
+            samples: Round trips kept per peer
+        """
+        self.device_id = device_id
+        self.samples = samples
+        self._heard = {}       # peer -> [its send time, our arrival time]
+        self._rounds = {}      # peer -> [(delay, offset), ...]
+
+    def on_heartbeat(self, heartbeat: dict, arrived_ms: int):
+        """Take the timestamps from a peer's heartbeat.
+
+        Timestamps that are missing or malformed are ignored.
+
+        Args:
+            heartbeat: Decoded heartbeat
+            arrived_ms: now_ms() when it arrived
+        """
+        device = heartbeat.get("device")
+        sent_ms = heartbeat.get("ts")
+        if not isinstance(device, str) or not device or device == self.device_id \
+                or not isinstance(sent_ms, int):
+            return
+        self._heard[device] = [sent_ms, arrived_ms]
+        echo = heartbeat.get("echo")
+        ours = echo.get(self.device_id) if isinstance(echo, dict) else None
+        if not isinstance(ours, list) or len(ours) != 2:
+            return
+        t1, t2 = ours
+        if not isinstance(t1, int) or not isinstance(t2, int):
+            return
+        delay = (arrived_ms - t1) - (sent_ms - t2)
+        if delay < 0:
+            return                # Not a round trip of ours (e.g. we rebooted)
+        rounds = self._rounds.setdefault(device, [])
+        rounds.append((delay, ((t2 - t1) + (sent_ms - arrived_ms)) // 2))
+        if len(rounds) > self.samples:
+            rounds.pop(0)
+
+    def echo(self) -> dict:
+        """Timestamps to echo in our next heartbeat (each is echoed once)."""
+        heard = self._heard
+        self._heard = {}
+        return heard
+
+    def offset(self, device: str):
+        """Peer clock minus ours in ms, or None if not measured yet."""
+        rounds = self._rounds.get(device)
+        return min(rounds)[1] if rounds else None
+
+    def report(self) -> dict:
+        """{peer: {"offset_ms", "rtt_ms"}} from each peer's best round trip."""
+        return {device: {"offset_ms": min(rounds)[1], "rtt_ms": min(rounds)[0]}
+                for device, rounds in self._rounds.items()}
+
+
+class LatencyTracker:
+    """
+    Touch-to-light latency histogram, plus lost and duplicate touches
+    (duplicates are counted by the caller, which drops them).
+
+    Usage:
+        sent = tracker.arrived(device, sent_ms, seq, sync.offset(device))
+        ...                              # Show the first response frame
+        if sent is not None:
+            tracker.record(now_ms() - sent)
+
+        heartbeat["latency"] = tracker.summary()
+    """
+
+    def __init__(self):
+        self._counts = array("I", bytes(4 * BUCKETS))
+        self._last_seq = {}
+        self.reset()
+
+    def arrived(self, device: str, sent_ms, seq, offset):
+        """Note a touch from a peer.
+
+        Args:
+            device: Sending whale
+            sent_ms: Send time on the sender's clock (None if not sent)
+            seq: Sequence number (None if not sent)
+            offset: Sender's clock minus ours (None if unknown)
+
+        Returns:
+            The send time on our clock, or None if it cannot be known
+        """
+        if seq is not None:
+            last = self._last_seq.get(device)
+            self._last_seq[device] = seq
+            if last is not None:
+                ahead = (seq - last) & 0xFFFF
+                if 0 < ahead < 0x8000:
+                    self.lost += ahead - 1
+                # Further "ahead" than that: late or the sender restarted
+        if sent_ms is None:
+            return None
+        if offset is None:
+            self.unsynced += 1
+            return None
+        return sent_ms - offset
+
+    def record(self, ms: int):
+        """Add one latency to the histogram."""
+        if ms < 0:
+            ms = 0                # Within the clock offset's error
+        self._counts[min(bucket_of(ms), BUCKETS - 1)] += 1
+        self.n += 1
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def summary(self, reset: bool = True) -> dict:
+        """Latency percentiles and touch counts since the last reset.
+
+        Returns:
+            {"n", "p50_ms", "p95_ms", "max_ms", "lost", "dup", "unsynced"},
+            the percentiles only if something was recorded
+        """
+        result = {"n": self.n, "lost": self.lost, "dup": self.duplicates,
+                  "unsynced": self.unsynced}
+        if self.n:
+            result["p50_ms"] = min(self._percentile(50), self.max_ms)
+            result["p95_ms"] = min(self._percentile(95), self.max_ms)
+            result["max_ms"] = self.max_ms
+        if reset:
+            self.reset()
+        return result
+
+    def reset(self):
+        """Clear the histogram and counters (sequence numbers are kept)."""
+        for i in range(BUCKETS):
+            self._counts[i] = 0
+        self.n = 0
+        self.max_ms = 0
+        self.lost = 0
+        self.duplicates = 0
+        self.unsynced = 0
+
+    def _percentile(self, pct: int) -> int:
+        """Upper bound of the bucket holding the pct-th percentile."""
+        target = (self.n * pct + 99) // 100
+        seen = 0
+        for i in range(BUCKETS):
+            seen += self._counts[i]
+            if seen >= target:
+                return bucket_limit(i)
+        return bucket_limit(BUCKETS - 1)
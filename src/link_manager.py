@@ -0,0 +1,172 @@
+# Pico Whale Project - Link Manager
+# ==================================
+# Brings WiFi and MQTT up (and back up) as a state machine that advances a
+# small step per main loop tick, instead of blocking for the whole
+# connection attempt. Failed attempts retry with exponential backoff and
+# jitter, so a whale whose network is down keeps handling touches and
+# animations and does not hammer the access point or broker.
+#
+# WiFi association is fully incremental. umqtt.simple's connect() is a
+# single blocking call, bounded by MQTT_CONNECT_TIMEOUT.
+
+import random
+from time import ticks_ms, ticks_add, ticks_diff
+
+# Link states
+LINK_BACKOFF = 0      # Waiting before the next attempt
+LINK_WIFI = 1         # WiFi association in progress
+LINK_MQTT = 2         # WiFi up, MQTT connect due
+LINK_UP = 3           # Connected; periodic health checks
+
+STATE_NAMES = ("backoff", "wifi", "mqtt", "up")
+
+
+class Backoff:
+    """Exponential backoff with jitter.
+
+    Each delay is picked uniformly from the upper half of the current
+    window, and the window doubles per failure up to max_ms.
+    """
+
+    def __init__(self, base_ms: int = 1000, max_ms: int = 60000):
+        self.base_ms = base_ms
+        self.max_ms = max_ms
+        self.failures = 0
+
+    def next_delay(self) -> int:
+        """Record a failure and return how long to wait before retrying."""
+        window = min(self.max_ms, self.base_ms << min(self.failures, 16))
+        self.failures += 1
+        half = window >> 1
+        return half + random.getrandbits(16) * (window - half) // 65536
+
+    def reset(self):
+        """Forget past failures after a success."""
+        self.failures = 0
+
+
+class LinkManager:
+    """
+    Incremental WiFi + MQTT connection supervisor for a PicoWhale.
+
+    Usage:
+        link = LinkManager(whale)
+        link.start()
+        while True:
+            link.update()      # returns quickly every time
+            ...
+
+    The whale provides the individual steps (begin_wifi, wifi_pending,
+    finish_wifi, wifi_dropped, connect_mqtt) and is told when the link is
+    back via on_link_up().
+    """
+
+    def __init__(self, whale, check_interval_ms: int = 10000,
+                 wifi_timeout_ms: int = 30000, backoff_base_ms: int = 1000,
+                 backoff_max_ms: int = 60000):
+        """Initialize the manager.
+
+        Args:
+            whale: PicoWhale providing the connection steps
+            check_interval_ms: How often to health-check a working link
+            wifi_timeout_ms: Give up on one WiFi association after this long
+            backoff_base_ms: First retry delay
+            backoff_max_ms: Longest retry delay
+        """
+        self.whale = whale
+        self.check_interval_ms = check_interval_ms
+        self.wifi_timeout_ms = wifi_timeout_ms
+        self.backoff = Backoff(backoff_base_ms, backoff_max_ms)
+        self.state = LINK_BACKOFF
+        self._next_state = LINK_WIFI
+        self._due = ticks_ms()
+        self._deadline = self._due
+        self.attempts = 0
+
+    def start(self, now: int = None):
+        """Begin connecting on the next update()."""
+        self.state = LINK_BACKOFF
+        self._next_state = LINK_WIFI
+        self._due = ticks_ms() if now is None else now
+
+    def state_name(self) -> str:
+        """Current state as a string, for logs and heartbeats."""
+        return STATE_NAMES[self.state]
+
+    def update(self, now: int = None) -> int:
+        """Advance the state machine by at most one step.
+
+        Args:
+            now: Current ticks_ms() value (read if omitted)
+
+        Returns:
+            Milliseconds until the next step is worth running
+        """
+        if now is None:
+            now = ticks_ms()
+        whale = self.whale
+
+        if self.state == LINK_UP:
+            # A failed publish/check_msg clears whale.connected between checks
+            if not whale.connected:
+                if whale.wifi_dropped():
+                    return self._fail(now, LINK_WIFI)
+                print("MQTT connection lost, reconnecting...")
+                whale.reconnect_count += 1
+                return self._fail(now, LINK_MQTT)
+            wait = ticks_diff(self._due, now)
+            if wait > 0:
+                return wait
+            self._due = ticks_add(now, self.check_interval_ms)
+            if whale.wifi_dropped():
+                return self._fail(now, LINK_WIFI)
+            try:
+                whale.mqtt.ping()
+            except Exception as e:
+                print(f"MQTT ping failed: {e}")
+                whale.connected = False
+                whale.reconnect_count += 1
+                return self._fail(now, LINK_MQTT)
+            return self.check_interval_ms
+
+        if self.state == LINK_BACKOFF:
+            wait = ticks_diff(self._due, now)
+            if wait > 0:
+                return wait
+            self.attempts += 1
+            if self._next_state == LINK_WIFI:
+                print(f"Link: connecting WiFi (attempt {self.attempts})")
+                if whale.begin_wifi():
+                    self.state = LINK_MQTT
+                else:
+                    self.state = LINK_WIFI
+                    self._deadline = ticks_add(now, self.wifi_timeout_ms)
+                    return 100
+            else:
+                self.state = LINK_MQTT
+
+        if self.state == LINK_WIFI:
+            if whale.wifi_pending() and ticks_diff(self._deadline, now) > 0:
+                return 100
+            if not whale.finish_wifi():
+                return self._fail(now, LINK_WIFI)
+            self.state = LINK_MQTT
+
+        # LINK_MQTT: the one blocking step
+        if whale.connect_mqtt():
+            self.state = LINK_UP
+            self.backoff.reset()
+            self.attempts = 0
+            self._due = ticks_add(now, self.check_interval_ms)
+            whale.on_link_up()
+            return self.check_interval_ms
+        return self._fail(now, LINK_WIFI if whale.wifi_dropped() else LINK_MQTT)
+
+    def _fail(self, now: int, retry_state: int) -> int:
+        """Schedule the next attempt after a backoff delay."""
+        delay = self.backoff.next_delay()
+        self.state = LINK_BACKOFF
+        self._next_state = retry_state
+        self._due = ticks_add(now, delay)
+        print(f"Link: retrying {STATE_NAMES[retry_state]} in {delay / 1000:.1f}s")
+        return delay
@@ -0,0 +1,164 @@
+# Pico Whale Project - Loop Profiler
+# ===================================
+# Times the stages of the main loop with ticks_us() into fixed-size
+# histograms. Recording only does integer math on preallocated arrays, so
+# it allocates nothing; the summary for the heartbeat is built only when
+# one is sent.
+#
+# Histogram buckets are log-linear: 4 buckets per power of two, so any
+# reported percentile is within 25% of the true value, from 1 us to ~1 min.
+#
+# In audit mode each stage also records how many bytes it allocated
+# (gc.mem_alloc() before and after), to show which stages allocate and to
+# check that the steady-state loop does not.
+
+import gc
+from array import array
+from time import ticks_us, ticks_diff
+
+_mem_alloc = getattr(gc, "mem_alloc", None)
+
+# Stages
+STAGE_MQTT = 0         # mqtt.check_msg()
+STAGE_SENSORS = 1      # Touch/sound sensor reads
+STAGE_ANIMATE = 2      # animate_response()
+STAGE_LED_WRITE = 3    # leds.write()
+STAGE_HEARTBEAT = 4    # send_heartbeat()
+STAGE_LOOP = 5         # Work done in one loop iteration (without the wait)
+
+STAGE_NAMES = ("check_msg", "sensors", "animate", "led_write", "heartbeat", "loop")
+
+BUCKETS = 4 * 24 + 4
+
+
+def bucket_of(us: int) -> int:
+    """Histogram bucket for a duration."""
+    if us < 4:
+        return us if us > 0 else 0
+    e = 0
+    while us >= 8:
+        us >>= 1
+        e += 1
+    return 4 + e * 4 + (us - 4)
+
+
+def bucket_limit(bucket: int) -> int:
+    """Largest duration that falls into a bucket."""
+    if bucket < 4:
+        return bucket
+    e, m = divmod(bucket - 4, 4)
+    return ((5 + m) << e) - 1
+
+
+class LoopProfiler:
+    """
+    Per-stage timing histograms.
+
+    Usage:
+        prof = LoopProfiler(enabled=DEBUG_MODE, budget_us=50000)
+
+        t = prof.start(STAGE_MQTT)
+        mqtt.check_msg()
+        prof.stop(STAGE_MQTT, t)
+
+        heartbeat["timing"] = prof.summary()
+
+    When disabled, start() returns 0 and stop() returns at once.
+
+    Allocation counts include a collection's worth of error: a stage during
+    which the heap was collected is not counted.
+    """
+
+    def __init__(self, enabled: bool = True, budget_us: int = 50000, audit: bool = False):
+        """Initialize the profiler.
+
+        Args:
+            enabled: Record timings (False makes every call a no-op)
+            budget_us: Loop iterations taking longer than this count as overruns
+            audit: Also record allocations per stage (needs gc.mem_alloc)
+        """
+        self.enabled = enabled
+        self.budget_us = budget_us
+        self.audit = enabled and audit and _mem_alloc is not None
+        stages = len(STAGE_NAMES)
+        self._counts = array("I", bytes(4 * BUCKETS * stages))
+        self._max = array("I", bytes(4 * stages))
+        self._alloc_mark = array("I", bytes(4 * stages))
+        self._alloc_bytes = array("I", bytes(4 * stages))
+        self._alloc_calls = array("I", bytes(4 * stages))
+        self.overruns = 0
+
+    def start(self, stage: int) -> int:
+        """Timestamp the start of a stage."""
+        if not self.enabled:
+            return 0
+        if self.audit:
+            self._alloc_mark[stage] = _mem_alloc()
+        return ticks_us()
+
+    def stop(self, stage: int, start: int):
+        """Record the time since start() for a stage."""
+        if not self.enabled:
+            return
+        us = ticks_diff(ticks_us(), start)
+        self._counts[stage * BUCKETS + min(bucket_of(us), BUCKETS - 1)] += 1
+        if us > self._max[stage]:
+            self._max[stage] = us
+        if stage == STAGE_LOOP and us > self.budget_us:
+            self.overruns += 1
+        if self.audit:
+            allocated = _mem_alloc() - self._alloc_mark[stage]
+            if allocated > 0:
+                self._alloc_bytes[stage] += allocated
+                self._alloc_calls[stage] += 1
+
+    def summary(self, reset: bool = True) -> dict:
+        """Percentiles per stage since the last reset.
+
+        Returns:
+            {"stage": {"n", "p50_us", "p95_us", "max_us"}, ..., "overruns": n}
+            with stages that recorded nothing left out. In audit mode each
+            stage also has "alloc_n" (runs that allocated) and "alloc_b"
+            (bytes allocated)
+        """
+        result = {}
+        for stage, name in enumerate(STAGE_NAMES):
+            base = stage * BUCKETS
+            n = 0
+            for i in range(BUCKETS):
+                n += self._counts[base + i]
+            if not n:
+                continue
+            result[name] = {
+                "n": n,
+                "p50_us": min(self._percentile(base, n, 50), self._max[stage]),
+                "p95_us": min(self._percentile(base, n, 95), self._max[stage]),
+                "max_us": self._max[stage],
+            }
+            if self.audit:
+                result[name]["alloc_n"] = self._alloc_calls[stage]
+                result[name]["alloc_b"] = self._alloc_bytes[stage]
+        result["overruns"] = self.overruns
+        if reset:
+            self.reset()
+        return result
+
+    def reset(self):
+        """Clear every histogram."""
+        for i in range(len(self._counts)):
+            self._counts[i] = 0
+        for i in range(len(self._max)):
+            self._max[i] = 0
+            self._alloc_bytes[i] = 0
+            self._alloc_calls[i] = 0
+        self.overruns = 0
+
+    def _percentile(self, base: int, n: int, pct: int) -> int:
+        """Upper bound of the bucket holding the pct-th percentile."""
+        target = (n * pct + 99) // 100
+        seen = 0
+        for i in range(BUCKETS):
+            seen += self._counts[base + i]
+            if seen >= target:
+                return bucket_limit(i)
+        return bucket_limit(BUCKETS - 1)
@@ -15,26 +15,57 @@ from machine import Pin, PWM, ADC
 from config import (
     WIFI_SSID, WIFI_PASSWORD,
     MQTT_BROKER, MQTT_PORT,
-    TOPIC_TOUCH, TOPIC_HEARTBEAT, TOPIC_COLOR, TOPIC_PATTERN,
+    TOPIC_TOUCH, TOPIC_HEARTBEAT, TOPIC_COLOR, TOPIC_PATTERN, TOPIC_BRIGHTNESS,
     WHALE_PAIR_ID, DEVICE_ID,
     TOUCH_SENSOR_PIN,
-    USE_NEOPIXEL, NEOPIXEL_PIN, NEOPIXEL_COUNT,
+    USE_NEOPIXEL, NEOPIXEL_PIN, NEOPIXEL_COUNT, ANIMATION_BACKEND, ANIMATION_FPS,
+    CROSSFADE_MS, OVERLAY_PATTERN, OVERLAY_BLEND, OVERLAY_OPACITY, CLIP_DIR,
+    LED_BRIGHTNESS, LED_GAMMA, LED_WHITE_BALANCE,
     COLOR_TOUCHED, COLOR_IDLE,
-    RESPONSE_DURATION, TOUCH_COOLDOWN, HEARTBEAT_INTERVAL,
-    USE_SERVO, SERVO_PIN, USE_SOUND_SENSOR, SOUND_SENSOR_PIN
+    RESPONSE_DURATION, TOUCH_COOLDOWN, HEARTBEAT_INTERVAL, HEARTBEAT_KEYFRAME_EVERY,
+    USE_SERVO, SERVO_PIN, USE_SOUND_SENSOR, SOUND_SENSOR_PIN,
+    USE_SENSOR_IRQ, SENSOR_EVENT_BUFFER, SENSOR_DEBOUNCE_MS,
+    USE_ASYNCIO, CONNECTION_CHECK_INTERVAL, WIFI_TIMEOUT, MQTT_CONNECT_TIMEOUT,
+    RECONNECT_BACKOFF_MIN_MS, RECONNECT_BACKOFF_MAX_MS,
+    TOUCH_QUEUE_SIZE, TOUCH_QUEUE_MAX_AGE,
+    MQTT_KEEPALIVE, MQTT_DNS_TTL, MQTT_CLEAN_SESSION, TOUCH_QOS, WIRE_BINARY,
+    IDLE_TICK_MS, IDLE_WAKE_SLICE_MS, USE_LIGHTSLEEP, DEBUG_MODE,
+    HEAP_AUDIT, GC_IDLE_FREE_BELOW
 )
 
 # Import animations
 try:
-    from animations import AnimationLibrary, run_pattern
+    from animations import AnimationLibrary, AnimationClock
+    from compositor import Compositor, BLEND_MODES
+    from clip_player import ClipPlayer, find_clips
     ANIMATIONS_AVAILABLE = True
 except ImportError:
     ANIMATIONS_AVAILABLE = False
     print("Note: animations.py not found - using basic animations")
 
+if ANIMATIONS_AVAILABLE and ANIMATION_BACKEND == "fixed":
+    try:
+        from fixed_animations import FixedPointAnimationLibrary as AnimationLibrary
+    except ImportError:
+        print("Note: fixed_animations.py not found - using float animations")
+
+if USE_SENSOR_IRQ:
+    from sensor_events import SensorEvents, SOURCE_TOUCH, SOURCE_SOUND, SOURCE_NAMES
+
+from status_led import StatusLED
+from link_manager import LinkManager
+from power import DutyCycle, IdleWaiter
+from heap_monitor import HeapMonitor
+from latency import ClockSync, LatencyTracker, now_ms
+from touch_queue import TouchQueue, DuplicateFilter, PUBACK, publish_nowait, read_puback
+import wire
+from loop_profiler import (LoopProfiler, STAGE_MQTT, STAGE_SENSORS, STAGE_ANIMATE,
+                           STAGE_LED_WRITE, STAGE_HEARTBEAT, STAGE_LOOP)
+
 # Only import neopixel if we're using it
 if USE_NEOPIXEL:
     import neopixel
+    from color_correction import ColorCorrection
 
 # Try to import umqtt
 try:
@@ -45,6 +76,13 @@ except ImportError:
     print("Install with: import mip; mip.install('umqtt.simple')")
     MQTT_AVAILABLE = False
 
+# Task-based runtime (falls back to the polling loop without asyncio)
+try:
+    from async_runtime import AsyncRunner
+    ASYNC_AVAILABLE = True
+except ImportError:
+    ASYNC_AVAILABLE = False
+
 
 class PicoWhale:
     """Main class for the connected whale device with enhanced features."""
@@ -54,6 +92,7 @@ class PicoWhale:
         
         # Onboard LED (always available)
         self.onboard_led = Pin("LED", Pin.OUT)
+        self.status = StatusLED(self.onboard_led)
         
         # Touch sensor
         self.touch_sensor = Pin(TOUCH_SENSOR_PIN, Pin.IN, Pin.PULL_DOWN)
@@ -61,9 +100,11 @@ class PicoWhale:
         # Optional NeoPixel LEDs
         if USE_NEOPIXEL:
             self.leds = neopixel.NeoPixel(Pin(NEOPIXEL_PIN), NEOPIXEL_COUNT)
+            self.output = ColorCorrection(LED_BRIGHTNESS, LED_GAMMA, LED_WHITE_BALANCE)
             print(f"  NeoPixel enabled: {NEOPIXEL_COUNT} LEDs on GPIO{NEOPIXEL_PIN}")
         else:
             self.leds = None
+            self.output = None
             print("  Using onboard LED only")
         
         # Optional Servo
@@ -81,17 +122,37 @@ class PicoWhale:
         else:
             self.sound_sensor = None
 
-        # Animation library
+        # Edge capture into an event buffer, drained by poll_sensors()
+        if USE_SENSOR_IRQ:
+            self.sensor_events = SensorEvents(SENSOR_EVENT_BUFFER, SENSOR_DEBOUNCE_MS)
+            self.sensor_events.attach(self.touch_sensor, SOURCE_TOUCH)
+            if self.sound_sensor:
+                self.sensor_events.attach(self.sound_sensor, SOURCE_SOUND)
+        else:
+            self.sensor_events = None
+
+        # Animation layers - composed straight into the NeoPixel buffer
         if ANIMATIONS_AVAILABLE and USE_NEOPIXEL:
-            self.animator = AnimationLibrary(NEOPIXEL_COUNT)
-            self.animator.set_color(COLOR_TOUCHED[0], COLOR_TOUCHED[1], COLOR_TOUCHED[2])
+            self.compositor = Compositor(NEOPIXEL_COUNT, buf=self.leds.buf,
+                                         layers=2, library=AnimationLibrary)
+            self.compositor.set_color(COLOR_TOUCHED[0], COLOR_TOUCHED[1], COLOR_TOUCHED[2])
+            for name, path in find_clips(CLIP_DIR).items():
+                self.compositor.add_pattern(name, lambda path=path: ClipPlayer(path, ANIMATION_FPS))
+                print(f"  Clip pattern: {name}")
+            self.compositor.set_layer(0, "idle")
+            if OVERLAY_PATTERN:
+                self.compositor.set_layer(1, OVERLAY_PATTERN,
+                                          BLEND_MODES[OVERLAY_BLEND], OVERLAY_OPACITY)
+            self.clock = AnimationClock(ANIMATION_FPS)
         else:
-            self.animator = None
+            self.compositor = None
+            self.clock = None
         
         # State tracking
         self.connected = False
         self.wifi_connected = False
         self.last_touch_time = 0
+        self.last_touch_ticks = None
         self.last_heartbeat_time = 0
         self.responding = False
         self.response_end_time = 0
@@ -100,9 +161,50 @@ class PicoWhale:
         
         # MQTT client
         self.mqtt = None
+        self.broker_ip = None
+        self.broker_ip_expires = 0
+        self.connect_ms = None
         
-        # Network
+        # Network - connected in the background by the link manager
         self.wlan = None
+        self.link = LinkManager(self, CONNECTION_CHECK_INTERVAL * 1000, WIFI_TIMEOUT * 1000,
+                                RECONNECT_BACKOFF_MIN_MS, RECONNECT_BACKOFF_MAX_MS)
+        
+        # Touches kept in flash until the broker acknowledges them, and
+        # the peers' recent touches, to drop replayed ones
+        self.outbox = TouchQueue(slots=TOUCH_QUEUE_SIZE)
+        self.touches_in_flight = {}   # MQTT packet ID -> queue record number
+        self.recent_touches = DuplicateFilter()
+        if self.outbox:
+            print(f"  {len(self.outbox)} touch(es) from before restart queued")
+        
+        # Wire protocol version advertised by each peer whale, from heartbeats
+        self.peer_protos = {}
+        
+        # Touch-to-light latency: peer clock offsets from heartbeat round
+        # trips, and the send time (our clock) of a touch not yet shown
+        self.clock_sync = ClockSync(DEVICE_ID)
+        self.latency = LatencyTracker()
+        self.touch_sent_ms = None
+        
+        # Adaptive loop rate: full frame rate only while animating
+        self.duty = DutyCycle()
+        self.idle_waiter = IdleWaiter(IDLE_WAKE_SLICE_MS, USE_LIGHTSLEEP)
+        self.wake_animation = None     # Set by the asyncio runtime
+        
+        # Per-stage loop timings for the heartbeat (DEBUG_MODE only);
+        # an iteration longer than one frame counts as an overrun
+        self.profiler = LoopProfiler(DEBUG_MODE or HEAP_AUDIT, 1000000 // ANIMATION_FPS,
+                                     HEAP_AUDIT)
+        
+        # Free heap and GC pauses; collects while idle when memory runs low
+        self.heap = HeapMonitor(GC_IDLE_FREE_BELOW, HEAP_AUDIT)
+        
+        # Heartbeats are sent as deltas against the last keyframe
+        self.heartbeat_seq = 0
+        self.heartbeat_base = None
+        self.heartbeat_binary = False
+        self.heartbeats_since_keyframe = 0
         
         # Statistics
         self.touch_count = 0
@@ -115,8 +217,12 @@ class PicoWhale:
     # Network & MQTT
     # =========================================================================
     
-    def connect_wifi(self) -> bool:
-        """Connect to WiFi network with retry logic."""
+    def begin_wifi(self) -> bool:
+        """Activate the WiFi interface and start connecting.
+        
+        Returns:
+            True if the interface was already connected
+        """
         print(f"\nConnecting to WiFi: {WIFI_SSID}")
         self.blink_status(2)  # 2 blinks = connecting
         
@@ -130,17 +236,15 @@ class PicoWhale:
             return True
         
         self.wlan.connect(WIFI_SSID, WIFI_PASSWORD)
-        
-        # Wait for connection with timeout
-        max_wait = 30
-        while max_wait > 0:
-            if self.wlan.status() < 0 or self.wlan.status() >= 3:
-                break
-            max_wait -= 1
-            print(f"  Waiting... ({max_wait}s remaining)")
-            self.onboard_led.toggle()
-            time.sleep(1)
-        
+        return False
+    
+    def wifi_pending(self) -> bool:
+        """True while a connection started by begin_wifi() is in progress."""
+        status = self.wlan.status()
+        return 0 <= status < 3
+    
+    def finish_wifi(self) -> bool:
+        """Record the outcome of a connection attempt."""
         if self.wlan.status() != 3:
             print("  ✗ Failed to connect to WiFi!")
             self.blink_error()
@@ -152,129 +256,204 @@ class PicoWhale:
         self.blink_status(3)
         return True
     
-    def check_wifi(self) -> bool:
-        """Check WiFi connection and reconnect if needed."""
-        if self.wlan is None:
-            return False
-        
-        if not self.wlan.isconnected():
-            self.wifi_connected = False
-            self.connected = False
-            print("WiFi disconnected, attempting reconnect...")
-            self.reconnect_count += 1
-            return self.connect_wifi()
+    def wifi_dropped(self) -> bool:
+        """Detect a lost WiFi link and mark everything disconnected.
         
+        Returns:
+            True if the link was lost and needs reconnecting
+        """
+        if self.wlan is None or self.wlan.isconnected():
+            return False
+        self.wifi_connected = False
+        self.connected = False
+        print("WiFi disconnected, attempting reconnect...")
+        self.reconnect_count += 1
         return True
     
+    def resolve_broker(self) -> str:
+        """Broker IP address, from the cache while it is fresh.
+        
+        Connecting by IP skips umqtt's own DNS lookup on every reconnect.
+        """
+        now = time.ticks_ms()
+        if self.broker_ip and time.ticks_diff(self.broker_ip_expires, now) > 0:
+            return self.broker_ip
+        import socket
+        self.broker_ip = socket.getaddrinfo(MQTT_BROKER, MQTT_PORT)[0][-1][0]
+        self.broker_ip_expires = time.ticks_add(now, MQTT_DNS_TTL * 1000)
+        print(f"  Resolved {MQTT_BROKER} -> {self.broker_ip}")
+        return self.broker_ip
+    
     def connect_mqtt(self) -> bool:
-        """Connect to MQTT broker with error handling."""
+        """Connect to MQTT broker with error handling.
+        
+        Uses a stable client ID and a persistent session, so on reconnect the
+        broker delivers QoS 1 touches that arrived while we were away. Topics
+        are subscribed every time: a session kept from older firmware may
+        lack some of them, and subscribing again is harmless.
+        """
         if not MQTT_AVAILABLE:
             print("MQTT not available - running in local demo mode")
             return False
         
         print(f"\nConnecting to MQTT: {MQTT_BROKER}")
+        start = time.ticks_ms()
         
         try:
-            # Pre-connection check to avoid hanging forever if port is blocked
-            import socket
-            print(f"  Checking broker {MQTT_BROKER}:{MQTT_PORT}...")
-            s = socket.socket()
-            s.settimeout(5)
-            try:
-                addr = socket.getaddrinfo(MQTT_BROKER, MQTT_PORT)[0][-1]
-                s.connect(addr)
-                s.close()
-                print("  ✓ Broker port is open")
-            except Exception as e:
-                print(f"  ✗ MQTT port {MQTT_PORT} blocked or unreachable: {e}")
-                return False
-
-            client_id = f"whale_{DEVICE_ID}_{int(time.time()) %10000}"
-                
-            self.mqtt = MQTTClient(
-                client_id=client_id,
-                server=MQTT_BROKER,
-                port=MQTT_PORT,
-                keepalive=60,
-                ssl=(MQTT_PORT == 8883)
-            )
-            self.mqtt.set_callback(self.on_message)
+            server = self.resolve_broker()
+            ssl = MQTT_PORT == 8883
             
-            # Increase socket timeout for slow SSL handshake
-            self.mqtt.connect(timeout=20)
+            if self.mqtt is None:
+                self.build_dispatch()
+                self.mqtt = MQTTClient(
+                    client_id=f"{WHALE_PAIR_ID}_{DEVICE_ID}",
+                    server=server,
+                    port=MQTT_PORT,
+                    keepalive=MQTT_KEEPALIVE,
+                    ssl=ssl,
+                    # Connecting by IP, so name the host for TLS explicitly
+                    ssl_params={"server_hostname": MQTT_BROKER} if ssl else {}
+                )
+                self.mqtt.set_callback(self.on_message)
+            else:
+                # Reuse the client; drop the dead socket first
+                self.mqtt.server = server
+                try:
+                    self.mqtt.sock.close()
+                except Exception:
+                    pass
+            
+            # Bounded so a slow TLS handshake cannot stall us indefinitely
+            session_present = self.mqtt.connect(clean_session=MQTT_CLEAN_SESSION,
+                                                timeout=MQTT_CONNECT_TIMEOUT)
             
             # Subscribe to topics
-            self.mqtt.subscribe(TOPIC_TOUCH)
-            self.mqtt.subscribe(TOPIC_COLOR)
-            self.mqtt.subscribe(TOPIC_PATTERN)
+            for topic, qos, _ in self.subscriptions:
+                self.mqtt.subscribe(topic, qos=qos)
             
             self.connected = True
-            print("  ✓ MQTT connected and subscribed!")
+            self.connect_ms = time.ticks_diff(time.ticks_ms(), start)
+            print(f"  ✓ MQTT connected in {self.connect_ms} ms"
+                  f" ({'session resumed' if session_present else 'new session'})")
             
-            # Send online status
+            # Send online status (a keyframe: listeners may have missed deltas)
+            self.heartbeat_base = None
             self.send_heartbeat()
             return True
             
         except Exception as e:
             print(f"  ✗ MQTT connection failed: {e}")
             self.connected = False
+            # The broker may have moved; look it up again next time
+            self.broker_ip = None
             return False
     
-    def check_mqtt(self) -> bool:
-        """Check MQTT connection and reconnect if needed."""
-        if not self.connected or self.mqtt is None:
-            return self.connect_mqtt()
-        
-        try:
-            # Try to ping or do a simple operation
-            self.mqtt.ping()
-            return True
-        except:
-            print("MQTT connection lost, reconnecting...")
-            self.connected = False
-            self.reconnect_count += 1
-            return self.connect_mqtt()
+    def on_link_up(self):
+        """Called by the link manager once WiFi and MQTT are both up."""
+        # Touches the old connection never got a PUBACK for go out again
+        # (receivers drop the ones that did arrive)
+        self.touches_in_flight = {}
+        self.flush_touches()
     
     # =========================================================================
     # Message Handling
     # =========================================================================
     
-    def on_message(self, topic, msg):
-        """Handle incoming MQTT messages."""
-        topic_str = topic.decode() if isinstance(topic, bytes) else topic
-        message = msg.decode() if isinstance(msg, bytes) else msg
+    def build_dispatch(self):
+        """Build the topic dispatch table.
         
-        print(f"\n>> Received on {topic_str.split('/')[-1]}: {message}")
-        
-        # Handle touch messages
-        if "touch" in topic_str:
-            # Ignore our own messages
-            if message.startswith(DEVICE_ID):
+        Topics are kept as bytes, as umqtt delivers them, so routing a
+        message is one exact dict lookup with no decoding.
+        """
+        self.subscriptions = (
+            (TOPIC_TOUCH.encode(), TOUCH_QOS, self.handle_touch),
+            (TOPIC_COLOR.encode(), 0, self.handle_color),
+            (TOPIC_PATTERN.encode(), 0, self.handle_pattern),
+            (TOPIC_BRIGHTNESS.encode(), 0, self.handle_brightness),
+            (TOPIC_HEARTBEAT.encode(), 0, self.handle_heartbeat),
+        )
+        self.dispatch = {topic: handler for topic, _, handler in self.subscriptions}
+    
+    def on_message(self, topic, msg):
+        """Route an incoming MQTT message to its handler."""
+        handler = self.dispatch.get(topic)
+        if handler is None:
+            return
+        if DEBUG_MODE and handler != self.handle_heartbeat:
+            print(f"\n>> Received on {topic.decode()}: {msg}")
+        try:
+            handler(msg)
+        except ValueError as e:
+            print(f"   Bad message on {topic.decode()}: {e}")
+    
+    def handle_touch(self, msg):
+        """Another whale (or we ourselves) was touched."""
+        # Ignore our own messages
+        device, sent_ms, seq = wire.decode_touch(msg)
+        if device == DEVICE_ID:
+            if DEBUG_MODE:
                 print("   (Ignoring own message)")
-                return
-            
-            # Another whale was touched!
-            self.received_count += 1
-            print(f"🐋 Your friend touched their whale! (#{self.received_count})")
-            self.start_response()
+            return
         
-        # Handle color messages
-        elif "color" in topic_str:
-            try:
-                parts = message.split(",")
-                if len(parts) == 3:
-                    r, g, b = int(parts[0]), int(parts[1]), int(parts[2])
-                    self.current_color = (r, g, b)
-                    if self.animator:
-                        self.animator.set_color(r, g, b)
-                    print(f"🎨 Color changed to RGB({r},{g},{b})")
-            except Exception as e:
-                print(f"   Color parse error: {e}")
+        # A touch replayed after a reconnect may have arrived already
+        if seq is not None and self.recent_touches.seen(device, seq):
+            self.latency.duplicates += 1
+            if DEBUG_MODE:
+                print("   (Ignoring duplicate touch)")
+            return
         
-        # Handle pattern messages
-        elif "pattern" in topic_str:
-            self.current_pattern = message
-            print(f"🌊 Pattern changed to: {message}")
+        # Another whale was touched!
+        self.received_count += 1
+        self.touch_sent_ms = self.latency.arrived(device, sent_ms, seq,
+                                                  self.clock_sync.offset(device))
+        print(f"🐋 Your friend touched their whale! (#{self.received_count})")
+        self.start_response()
+    
+    def handle_color(self, msg):
+        """Set the animation color."""
+        r, g, b = wire.decode_color(msg)
+        self.current_color = (r, g, b)
+        if self.compositor:
+            self.compositor.set_color(r, g, b)
+        print(f"🎨 Color changed to RGB({r},{g},{b})")
+    
+    def handle_pattern(self, msg):
+        """Switch the response pattern."""
+        message = wire.decode_pattern(msg)
+        self.current_pattern = message
+        if self.compositor and self.responding:
+            self.compositor.crossfade(0, message, CROSSFADE_MS)
+        print(f"🌊 Pattern changed to: {message}")
+    
+    def handle_brightness(self, msg):
+        """Update brightness / gamma / white balance."""
+        if not self.output:
+            return
+        try:
+            self.output.update_from_message(msg.decode())
+            print(f"💡 Output set to: {self.output.settings()}")
+        except Exception as e:
+            print(f"   Brightness parse error: {e}")
+    
+    def handle_heartbeat(self, msg):
+        """Note a peer whale's wire protocol version and clock timestamps."""
+        arrived_ms = now_ms()
+        heartbeat = wire.decode_heartbeat(msg)
+        device = heartbeat.get("device")
+        if isinstance(device, str) and device and device != DEVICE_ID:
+            proto = heartbeat["proto"]
+            if not isinstance(proto, int):
+                raise ValueError("bad proto")
+            if self.peer_protos.get(device) != proto:
+                print(f"   Peer {device} speaks wire protocol v{proto}")
+                self.peer_protos[device] = proto
+            self.clock_sync.on_heartbeat(heartbeat, arrived_ms)
+    
+    def wire_version(self) -> int:
+        """Binary wire version every peer heard from understands (0 = text)."""
+        if not WIRE_BINARY or not self.peer_protos:
+            return 0
+        return min(min(self.peer_protos.values()), wire.WIRE_VERSION)
     
     # =========================================================================
     # Touch & Response
@@ -284,57 +463,160 @@ class PicoWhale:
         """Start the response animation - whale was activated!"""
         self.responding = True
         self.response_end_time = time.time() + RESPONSE_DURATION
+        if self.compositor:
+            self.clock.start()
+            self.compositor.crossfade(0, self.current_pattern, CROSSFADE_MS)
+        if self.wake_animation:
+            self.wake_animation()
         print(f"   Responding for {RESPONSE_DURATION} seconds...")
     
-    def send_touch(self):
-        """Send a touch event to the other whale(s)."""
+    def send_touch(self) -> bool:
+        """Send a touch event to the other whale(s).
+        
+        The touch is queued in flash first and only leaves the queue once
+        the broker has acknowledged it, so it survives link drops and
+        restarts.
+        
+        Returns:
+            True if the touch was published (its PUBACK may still be due)
+        """
         self.touch_count += 1
+        message = wire.encode_touch(DEVICE_ID, now_ms(), self.outbox.next_seq,
+                                    self.wire_version())
+        self.outbox.push(message, time.time())
         
         if not self.connected:
-            print("Not connected - simulating local touch")
+            print("Not connected - touch queued, showing it locally")
             self.start_response()
-            return
+            return False
         
-        try:
-            message = f"{DEVICE_ID}:touch:{int(time.time())}"
-            self.mqtt.publish(TOPIC_TOUCH, message)
-            print(f"\n<< Sent touch signal! 🐋 (#{self.touch_count})")
-            
-            # Quick flash to confirm send
-            self.onboard_led.on()
-            time.sleep(0.1)
-            self.onboard_led.off()
-            
-        except Exception as e:
-            print(f"Error sending touch: {e}")
-            self.connected = False
+        self.flush_touches()
+        if not self.connected:
+            return False
+        print(f"\n<< Sent touch signal! 🐋 (#{self.touch_count})")
+        
+        # Quick flash to confirm send
+        self.status.flash(100)
+        return True
+    
+    def flush_touches(self):
+        """Send queued touches in order, dropping ones too old to matter.
+        
+        At TOUCH_QOS 1 a touch stays queued until poll_mqtt() sees its
+        PUBACK; publishing does not wait for it. Stops at the first
+        failure, leaving the rest queued for the next reconnect.
+        """
+        now = time.time()
+        in_flight = self.touches_in_flight.values()
+        for number, queued_at, message in self.outbox.pending():
+            if not self.connected:
+                return
+            if number in in_flight:
+                continue
+            late = now - queued_at
+            if late > TOUCH_QUEUE_MAX_AGE:
+                self.outbox.ack(number)
+                continue
+            try:
+                pid = publish_nowait(self.mqtt, TOPIC_TOUCH, message, TOUCH_QOS)
+            except Exception as e:
+                print(f"Error sending touch: {e}")
+                self.connected = False
+                return
+            if late >= 1:
+                print(f"<< Sent queued touch ({int(late)}s late)")
+            if pid:
+                self.touches_in_flight[pid] = number
+            else:
+                self.outbox.ack(number)
     
     def send_heartbeat(self):
         """Send heartbeat to indicate online status."""
         if not self.connected or self.mqtt is None:
             return
         
+        t = self.profiler.start(STAGE_HEARTBEAT)
         try:
-            heartbeat = json.dumps({
+            duty = self.duty.report()
+            status = {
                 "device": DEVICE_ID,
-                "status": "online",
                 "uptime": time.time(),
                 "touch_count": self.touch_count,
                 "received_count": self.received_count,
-                "pattern": self.current_pattern
-            })
+                "pattern": self.current_pattern,
+                "reconnects": self.reconnect_count,
+                "connect_ms": self.connect_ms,
+                "queued_touches": len(self.outbox)
+            }
+            diagnostics = {
+                "frames": self.clock.stats() if self.clock else None,
+                "duty": duty,
+                "timing": self.profiler.summary() if self.profiler.enabled else None,
+                "heap": self.heap.report()
+            }
+            # Always sent: latency and the timestamps for peer clock sync
+            sync = {
+                "latency": self.latency.summary(),
+                "clock": self.clock_sync.report(),
+                "echo": self.clock_sync.echo()
+            }
             
-            topic = f"pico_whale/{WHALE_PAIR_ID}/heartbeat"
-            self.mqtt.publish(topic, heartbeat)
+            binary = self.wire_version() > 0
+            if binary:
+                # Diagnostics ride along (as JSON) only when debugging;
+                # the fixed binary fields are always sent whole
+                status["busy_pct"] = duty["busy_pct"]
+                status["proto"] = wire.WIRE_VERSION
+                if DEBUG_MODE:
+                    sync.update(diagnostics)
+                document = sync
+            else:
+                status["status"] = "online"
+                status["proto"] = wire.WIRE_VERSION if WIRE_BINARY else 0
+                status.update(diagnostics)
+                status.update(sync)
+                document = status
+            self.heartbeat_seq = (self.heartbeat_seq + 1) & 0xFFFF
+            document["hb"] = self.heartbeat_seq
+            document["ts"] = now_ms()
+            
+            # Only what changed since the last keyframe, with a full
+            # keyframe every HEARTBEAT_KEYFRAME_EVERY. Published at QoS 0
+            # (umqtt blocks on a PUBACK), so a lost delta costs nothing
+            # and a lost keyframe only until the next one
+            keyframe = self.heartbeat_base is None or binary != self.heartbeat_binary \
+                or self.heartbeats_since_keyframe + 1 >= HEARTBEAT_KEYFRAME_EVERY
+            if not keyframe:
+                document = wire.heartbeat_delta(self.heartbeat_base, document)
+            if binary:
+                heartbeat = wire.encode_heartbeat(status, document)
+            else:
+                heartbeat = json.dumps(document)
+            
+            self.mqtt.publish(TOPIC_HEARTBEAT, heartbeat)
             self.last_heartbeat_time = time.time()
+            if keyframe:
+                self.heartbeat_base = document
+                self.heartbeat_binary = binary
+                self.heartbeats_since_keyframe = 0
+            else:
+                self.heartbeats_since_keyframe += 1
             
         except Exception as e:
             print(f"Heartbeat error: {e}")
+        self.profiler.stop(STAGE_HEARTBEAT, t)
     
     # =========================================================================
     # LED Control
     # =========================================================================
     
+    def show(self):
+        """Apply output correction to the frame buffer and send it to the strip."""
+        self.output.apply(self.leds.buf)
+        t = self.profiler.start(STAGE_LED_WRITE)
+        self.leds.write()
+        self.profiler.stop(STAGE_LED_WRITE, t)
+    
     def set_leds(self, on=True):
         """Control the LED(s) - works with onboard LED or NeoPixels."""
         if on:
@@ -342,31 +624,35 @@ class PicoWhale:
             if self.leds:
                 for i in range(NEOPIXEL_COUNT):
                     self.leds[i] = self.current_color
-                self.leds.write()
+                self.show()
         else:
             self.onboard_led.off()
             if self.leds:
                 for i in range(NEOPIXEL_COUNT):
                     self.leds[i] = (0, 0, 0)
-                self.leds.write()
+                self.show()
+    
+    def render_frame(self):
+        """Compose and show the animation frame due now, if there is one."""
+        # Skips ahead if the loop fell behind the animation clock
+        if self.clock.update():
+            self.compositor.render(self.clock.frame)
+            self.show()
     
     def animate_response(self):
         """Animate the LED(s) during response."""
         # Use animation library if available
-        if self.animator and self.leds:
-            colors = run_pattern(self.animator, self.current_pattern)
-            for i, color in enumerate(colors):
-                if i < NEOPIXEL_COUNT:
-                    self.leds[i] = color
-            self.leds.write()
+        if self.compositor:
+            self.render_frame()
             
-            # Also blink onboard LED
-            self.onboard_led.value((int(time.time() * 3) % 2))
+            # Also blink onboard LED (unless it is showing a status)
+            if not self.status.busy():
+                self.onboard_led.value((int(time.time() * 3) % 2))
         else:
             # Simple on/off blink for onboard LED
             t = time.ticks_ms()
-            on = (t // 300) % 2 == 0
-            self.onboard_led.value(on)
+            if not self.status.busy():
+                self.onboard_led.value((t // 300) % 2 == 0)
             
             if self.leds:
                 brightness = 0.5 + 0.5 * ((t % 1000) / 1000)
@@ -375,7 +661,7 @@ class PicoWhale:
                 b = int(self.current_color[2] * brightness)
                 for i in range(NEOPIXEL_COUNT):
                     self.leds[i] = (r, g, b)
-                self.leds.write()
+                self.show()
 
         # Servo "Tail Flapp" movement during response
         if self.servo:
@@ -393,10 +679,14 @@ class PicoWhale:
     
     def show_idle(self):
         """Show idle state on LEDs."""
-        if self.leds:
+        if self.compositor:
+            # Fade back to idle; the main loop renders until the fade ends
+            self.compositor.crossfade(0, "idle", CROSSFADE_MS)
+            self.render_frame()
+        elif self.leds:
             for i in range(NEOPIXEL_COUNT):
                 self.leds[i] = COLOR_IDLE
-            self.leds.write()
+            self.show()
         self.onboard_led.off()
     
     # =========================================================================
@@ -404,27 +694,158 @@ class PicoWhale:
     # =========================================================================
     
     def blink_status(self, count):
-        """Blink the onboard LED to indicate status."""
-        for _ in range(count):
-            self.onboard_led.on()
-            time.sleep(0.15)
-            self.onboard_led.off()
-            time.sleep(0.15)
+        """Queue status blinks on the onboard LED (played by the main loop)."""
+        self.status.blink(count)
     
     def blink_error(self):
-        """Rapid blink to indicate error."""
-        for _ in range(10):
-            self.onboard_led.on()
-            time.sleep(0.1)
-            self.onboard_led.off()
-            time.sleep(0.1)
+        """Queue a rapid error blink, unless one is already showing."""
+        if not self.status.busy():
+            self.status.blink(10, 100)
+    
+    def pause(self, seconds):
+        """Sleep while keeping status effects running (blocking paths only)."""
+        end = time.ticks_add(time.ticks_ms(), int(seconds * 1000))
+        while True:
+            left = time.ticks_diff(end, time.ticks_ms())
+            if left <= 0:
+                break
+            wait = self.status.update()
+            time.sleep_ms(left if wait is None else min(left, wait))
     
     # =========================================================================
-    # Main Loop
+    # Loop Steps (shared by the polling loop and the asyncio tasks)
     # =========================================================================
     
-    def run(self):
-        """Main application loop."""
+    def poll_mqtt(self):
+        """Process incoming MQTT messages, if any."""
+        if self.connected and self.mqtt:
+            t = self.profiler.start(STAGE_MQTT)
+            try:
+                if self.mqtt.check_msg() == PUBACK:
+                    number = self.touches_in_flight.pop(read_puback(self.mqtt), None)
+                    if number is not None:
+                        self.outbox.ack(number)
+            except Exception as e:
+                print(f"MQTT check error: {e}")
+                self.connected = False
+            self.profiler.stop(STAGE_MQTT, t)
+    
+    def poll_sensors(self, current_time) -> bool:
+        """Check the touch and sound sensors and send a touch if triggered.
+        
+        Args:
+            current_time: time.time() value for the cooldown
+            
+        Returns:
+            True if a touch was published
+        """
+        t = self.profiler.start(STAGE_SENSORS)
+        if self.sensor_events:
+            sent = self.drain_sensor_events(current_time)
+        else:
+            sent = self.read_sensors(current_time)
+        self.profiler.stop(STAGE_SENSORS, t)
+        return sent
+    
+    def read_sensors(self, current_time) -> bool:
+        """Level-poll the touch and sound sensors.
+        
+        Returns:
+            True if a touch was published
+        """
+        sent = False
+        
+        # Check touch sensor
+        if self.touch_sensor.value() == 1:
+            if current_time - self.last_touch_time > TOUCH_COOLDOWN:
+                self.last_touch_time = current_time
+                print("Touch detected!")
+                sent = self.send_touch()
+
+        # Check Sound sensor (treat as touch)
+        if self.sound_sensor and self.sound_sensor.value() == 1:
+            if current_time - self.last_touch_time > TOUCH_COOLDOWN:
+                self.last_touch_time = current_time
+                print("Sound detected!")
+                sent = self.send_touch()
+        
+        return sent
+    
+    def drain_sensor_events(self, current_time) -> bool:
+        """Handle captured sensor events, applying TOUCH_COOLDOWN.
+        
+        The cooldown is measured between capture timestamps, so it does not
+        depend on how late the loop got round to draining.
+        
+        Returns:
+            True if a touch was published
+        """
+        sent = False
+        while True:
+            event = self.sensor_events.pop()
+            if event is None:
+                break
+            source, when = event
+            if self.last_touch_ticks is not None and \
+                    time.ticks_diff(when, self.last_touch_ticks) <= TOUCH_COOLDOWN * 1000:
+                continue
+            self.last_touch_ticks = when
+            self.last_touch_time = current_time
+            latency = time.ticks_diff(time.ticks_ms(), when)
+            print(f"{SOURCE_NAMES[source].capitalize()} detected! ({latency} ms ago)")
+            if self.send_touch():
+                sent = True
+        return sent
+    
+    def animating(self) -> bool:
+        """True while frames need rendering at the full frame rate."""
+        if self.responding:
+            return True
+        return bool(self.compositor and (OVERLAY_PATTERN or self.compositor.transitioning()))
+    
+    def next_wait_ms(self, current_time, link_wait: int, status_wait) -> int:
+        """How long the polling loop may sleep before its next job.
+        
+        Args:
+            current_time: time.time() value of this iteration
+            link_wait: Value returned by link.update()
+            status_wait: Value returned by status.update() (None if idle)
+        """
+        if self.animating():
+            if self.clock:
+                return self.clock.ms_until_next()
+            return 50
+        wait = min(IDLE_TICK_MS, link_wait)
+        if status_wait is not None:
+            wait = min(wait, status_wait)
+        if not self.sensor_events:
+            wait = min(wait, 50)  # Level-polled sensors need regular looks
+        heartbeat = HEARTBEAT_INTERVAL - (current_time - self.last_heartbeat_time)
+        return max(0, min(wait, int(heartbeat * 1000) + 1))
+    
+    def update_animation(self, current_time):
+        """Advance the response animation, or end it when time is up."""
+        if self.responding:
+            if current_time > self.response_end_time:
+                # Response finished
+                self.responding = False
+                self.show_idle()
+                print("Response complete.\n")
+            else:
+                # Continue animation
+                t = self.profiler.start(STAGE_ANIMATE)
+                self.animate_response()
+                self.profiler.stop(STAGE_ANIMATE, t)
+                if self.touch_sent_ms is not None:
+                    # First frame of a peer's touch is on the LEDs
+                    self.latency.record(now_ms() - self.touch_sent_ms)
+                    self.touch_sent_ms = None
+        elif self.compositor and (OVERLAY_PATTERN or self.compositor.transitioning()):
+            # Finish a fade back to idle / keep the overlay moving
+            self.render_frame()
+    
+    def print_banner(self):
+        """Print the startup banner."""
         print()
         print("=" * 50)
         print("  🐋 PICO WHALE STARTING UP! 🐋")
@@ -433,98 +854,101 @@ class PicoWhale:
         print(f"  Touch Pin: GPIO{TOUCH_SENSOR_PIN}")
         print(f"  NeoPixels: {'Yes' if USE_NEOPIXEL else 'No (using onboard LED)'}")
         print(f"  Animations: {'Yes' if ANIMATIONS_AVAILABLE else 'Basic mode'}")
+        print(f"  Runtime: {'asyncio' if USE_ASYNCIO and ASYNC_AVAILABLE else 'polling'}")
         print("=" * 50)
-        
-        # Connect to WiFi
-        if not self.connect_wifi():
-            print("\n⚠ WiFi failed - running in offline demo mode")
-            print("  Touch the sensor to test LED response")
-        else:
-            # Connect to MQTT
-            if not self.connect_mqtt():
-                print("\n⚠ MQTT failed - running in offline demo mode")
-        
-        # Ready indicator
+    
+    def print_ready(self):
+        """Print the ready message."""
         print("\n" + "=" * 50)
         print("  ✓ READY! Touch the whale to send a signal")
         print("=" * 50 + "\n")
+    
+    def shutdown(self):
+        """Turn the LEDs off and leave the broker cleanly."""
+        print("\nShutting down...")
+        self.set_leds(False)
+        if self.mqtt:
+            try:
+                # Send offline status
+                offline = json.dumps({
+                    "device": DEVICE_ID,
+                    "status": "offline",
+                    "timestamp": int(time.time())
+                })
+                self.mqtt.publish(f"pico_whale/{WHALE_PAIR_ID}/heartbeat", offline)
+                self.mqtt.disconnect()
+            except:
+                pass
+    
+    # =========================================================================
+    # Main Loop
+    # =========================================================================
+    
+    def run(self):
+        """Run the whale: as asyncio tasks if enabled, else the polling loop."""
+        if USE_ASYNCIO and ASYNC_AVAILABLE:
+            AsyncRunner(self).run()
+        else:
+            self.run_polling()
+    
+    def run_polling(self):
+        """Main application loop (single polling loop)."""
+        self.print_banner()
+        
+        # Connect WiFi/MQTT in the background; touches work meanwhile
+        self.link.start()
+        
+        # Ready indicator
+        self.print_ready()
         self.blink_status(5)  # 5 blinks = ready!
         
         # Show idle pattern
         self.show_idle()
         
         # Main loop
-        loop_count = 0
         while True:
             try:
-                loop_count += 1
                 current_time = time.time()
+                t = self.profiler.start(STAGE_LOOP)
                 
-                # Check connections periodically (every ~10 seconds)
-                if loop_count % 200 == 0:
-                    self.check_wifi()
-                    self.check_mqtt()
+                # Advance (re)connection by one step, if one is due
+                link_wait = self.link.update()
                 
                 # Check for incoming MQTT messages
-                if self.connected and self.mqtt:
-                    try:
-                        self.mqtt.check_msg()
-                    except Exception as e:
-                        print(f"MQTT check error: {e}")
-                        self.connected = False
+                self.poll_mqtt()
                 
-                # Check touch sensor
-                if self.touch_sensor.value() == 1:
-                    if current_time - self.last_touch_time > TOUCH_COOLDOWN:
-                        self.last_touch_time = current_time
-                        print("Touch detected!")
-                        self.send_touch()
-
-                # Check Sound sensor (treat as touch)
-                if self.sound_sensor and self.sound_sensor.value() == 1:
-                    if current_time - self.last_touch_time > TOUCH_COOLDOWN:
-                        self.last_touch_time = current_time
-                        print("Sound detected!")
-                        self.send_touch()
+                # Advance status LED blinks
+                status_wait = self.status.update()
+                
+                # Check touch and sound sensors
+                self.poll_sensors(current_time)
                 
                 # Handle response animation
-                if self.responding:
-                    if current_time > self.response_end_time:
-                        # Response finished
-                        self.responding = False
-                        self.show_idle()
-                        print("Response complete.\n")
-                    else:
-                        # Continue animation
-                        self.animate_response()
+                self.update_animation(current_time)
                 
                 # Send heartbeat periodically
                 if current_time - self.last_heartbeat_time > HEARTBEAT_INTERVAL:
                     self.send_heartbeat()
                 
-                time.sleep(0.05)  # 20 FPS
+                self.profiler.stop(STAGE_LOOP, t)
+                
+                # Sleep until the next frame or job; MQTT data or a touch
+                # ends the wait early
+                wait = self.next_wait_ms(current_time, link_wait, status_wait)
+                self.heap.idle()
+                self.duty.idle()
+                self.idle_waiter.wait(wait, self.mqtt.sock if self.connected else None,
+                                      self.sensor_events)
+                self.duty.busy()
                 
             except KeyboardInterrupt:
-                print("\nShutting down...")
-                self.set_leds(False)
-                if self.mqtt:
-                    try:
-                        # Send offline status
-                        offline = json.dumps({
-                            "device": DEVICE_ID,
-                            "status": "offline",
-                            "timestamp": int(time.time())
-                        })
-                        self.mqtt.publish(f"pico_whale/{WHALE_PAIR_ID}/heartbeat", offline)
-                        self.mqtt.disconnect()
-                    except:
-                        pass
+                self.shutdown()
                 break
                 
             except Exception as e:
                 print(f"Error in main loop: {e}")
                 self.blink_error()
-                time.sleep(1)
+                time.sleep(0.05)
 
 
 # Need to define WHALE_PAIR_ID from config
@@ -0,0 +1,141 @@
+# Pico Whale Project - Power Helpers
+# ===================================
+# Lets the main loop sleep for as long as nothing needs doing, and measures
+# how much of the time it actually spends working.
+#
+# An idle whale only wakes for the next scheduled job (link check, status
+# blink, heartbeat), for incoming MQTT data, or for a captured touch/sound
+# event. While waiting the CPU sits in WFE inside poll()/sleep_ms(), or in
+# machine.lightsleep() when that is enabled and there is no socket to watch.
+
+import time
+from time import ticks_ms, ticks_us, ticks_add, ticks_diff
+
+try:
+    import select
+except ImportError:
+    select = None
+
+try:
+    from machine import lightsleep
+except ImportError:
+    lightsleep = None
+
+
+class DutyCycle:
+    """
+    Busy/idle time accounting.
+
+    Call busy() when work starts and idle() when the loop goes to sleep;
+    report() returns the busy percentage since the last report.
+    """
+
+    def __init__(self):
+        self.busy_us = 0
+        self.idle_us = 0
+        self._mark = ticks_us()
+        self._busy = True
+
+    def busy(self):
+        """Start of a stretch of work."""
+        now = ticks_us()
+        if not self._busy:
+            self.idle_us += ticks_diff(now, self._mark)
+            self._mark = now
+            self._busy = True
+
+    def idle(self):
+        """Start of a wait."""
+        now = ticks_us()
+        if self._busy:
+            self.busy_us += ticks_diff(now, self._mark)
+            self._mark = now
+            self._busy = False
+
+    def report(self) -> dict:
+        """Busy share since the last report, then start a new period.
+
+        Returns:
+            {"busy_pct": percent of time spent working, "busy_ms": ..., "period_ms": ...}
+        """
+        # Close the open stretch so it lands in this period
+        now = ticks_us()
+        if self._busy:
+            self.busy_us += ticks_diff(now, self._mark)
+        else:
+            self.idle_us += ticks_diff(now, self._mark)
+        self._mark = now
+        total = self.busy_us + self.idle_us
+        result = {
+            "busy_pct": round(100 * self.busy_us / total, 1) if total else 0,
+            "busy_ms": self.busy_us // 1000,
+            "period_ms": total // 1000,
+        }
+        self.busy_us = 0
+        self.idle_us = 0
+        return result
+
+
+class IdleWaiter:
+    """
+    Waits up to a deadline, returning early when there is work.
+
+    Usage:
+        waiter = IdleWaiter(slice_ms=20)
+        waiter.wait(500, sock=mqtt.sock, events=sensor_events)
+    """
+
+    def __init__(self, slice_ms: int = 20, use_lightsleep: bool = False):
+        """Initialize the waiter.
+
+        Args:
+            slice_ms: Longest uninterrupted sleep; bounds how late a
+                      captured sensor event is noticed
+            use_lightsleep: Use machine.lightsleep() when no socket is being
+                            watched (the WiFi chip is not serviced meanwhile)
+        """
+        self.slice_ms = slice_ms
+        self.use_lightsleep = use_lightsleep and lightsleep is not None
+        self._poller = select.poll() if select else None
+        self._sock = None
+
+    def _watch(self, sock):
+        """Point the poller at the current socket."""
+        if sock is self._sock or self._poller is None:
+            return
+        if self._sock is not None:
+            try:
+                self._poller.unregister(self._sock)
+            except Exception:
+                pass
+        self._sock = sock
+        if sock is not None:
+            self._poller.register(sock, select.POLLIN)
+
+    def wait(self, ms: int, sock=None, events=None) -> bool:
+        """Sleep for up to ms milliseconds.
+
+        Args:
+            ms: Longest time to wait
+            sock: Socket whose incoming data ends the wait early
+            events: SensorEvents whose pending events end the wait early
+
+        Returns:
+            True if the wait ended early because of socket data or an event
+        """
+        self._watch(sock)
+        end = ticks_add(ticks_ms(), ms)
+        while True:
+            if events is not None and events.pending():
+                return True
+            left = ticks_diff(end, ticks_ms())
+            if left <= 0:
+                return False
+            step = min(left, self.slice_ms)
+            if self._sock is not None:
+                if self._poller.poll(step):
+                    return True
+            elif self.use_lightsleep:
+                lightsleep(step)
+            else:
+                time.sleep_ms(step)
@@ -0,0 +1,138 @@
+# Pico Whale Project - Interrupt-Driven Sensor Events
+# ====================================================
+# Captures touch/sound edges with Pin.irq and queues them, timestamped, in
+# a preallocated ring buffer. The main loop drains the buffer and applies
+# debouncing there, so a tap or clap shorter than a loop iteration (or one
+# that arrives during a blocking network call) is never missed.
+#
+# The IRQ handlers run as hard interrupts: they only store small ints into
+# preallocated arrays and never allocate.
+
+from array import array
+
+from animations import ticks_ms, ticks_diff
+
+try:
+    import micropython
+    micropython.alloc_emergency_exception_buf(100)
+except (ImportError, AttributeError):
+    pass
+
+# Event sources
+SOURCE_TOUCH = 0
+SOURCE_SOUND = 1
+SOURCE_NAMES = ("touch", "sound")
+
+
+class SensorEvents:
+    """
+    Ring buffer of (source, ticks_ms) edge events fed by pin interrupts.
+
+    Usage:
+        events = SensorEvents(size=16, debounce_ms=30)
+        events.attach(touch_pin, SOURCE_TOUCH)
+
+        # In the main loop:
+        while True:
+            event = events.pop()
+            if event is None:
+                break
+            source, when = event
+
+    One writer (the IRQ handlers, which the RP2040 runs one at a time) and
+    one reader (the main loop) each own one index, so no locking is needed.
+    When the buffer is full new events are dropped and counted.
+    """
+
+    def __init__(self, size: int = 16, debounce_ms: int = 30):
+        """Initialize the ring buffer.
+
+        Args:
+            size: Buffer slots (holds size - 1 events)
+            debounce_ms: Edges from the same source that follow another
+                         one within this time are contact bounce and ignored
+        """
+        self.size = size
+        self.debounce_ms = debounce_ms
+        self._sources = bytearray(size)
+        self._times = array("i", (0 for _ in range(size)))
+        self._head = 0              # Next slot to write (IRQ side)
+        self._tail = 0              # Next slot to read (main loop side)
+        self.overflows = 0
+        self.flag = None            # Optional asyncio ThreadSafeFlag to wake a task
+
+        # Last edge seen per source, for debouncing
+        self._last = array("i", (0 for _ in SOURCE_NAMES))
+        self._seen = bytearray(len(SOURCE_NAMES))
+
+        # Bound methods allocate when created, so make them once up front
+        self._handlers = (self._on_touch, self._on_sound)
+
+    def attach(self, pin, source: int, trigger=None):
+        """Capture edges on a pin as events from a source.
+
+        Args:
+            pin: machine.Pin configured as an input
+            source: SOURCE_TOUCH or SOURCE_SOUND
+            trigger: Pin.IRQ_* edge (rising edge by default)
+        """
+        if trigger is None:
+            trigger = pin.IRQ_RISING
+        try:
+            pin.irq(handler=self._handlers[source], trigger=trigger, hard=True)
+        except TypeError:
+            # Ports without hard IRQs
+            pin.irq(handler=self._handlers[source], trigger=trigger)
+
+    # =========================================================================
+    # IRQ Side
+    # =========================================================================
+
+    def _on_touch(self, pin):
+        self._push(SOURCE_TOUCH)
+
+    def _on_sound(self, pin):
+        self._push(SOURCE_SOUND)
+
+    def _push(self, source: int):
+        head = self._head
+        following = head + 1
+        if following == self.size:
+            following = 0
+        if following == self._tail:
+            self.overflows += 1
+            return
+        self._sources[head] = source
+        self._times[head] = ticks_ms()
+        self._head = following
+        if self.flag is not None:
+            self.flag.set()
+
+    # =========================================================================
+    # Main Loop Side
+    # =========================================================================
+
+    def pending(self) -> bool:
+        """True if there are undrained events."""
+        return self._head != self._tail
+
+    def pop(self):
+        """Take the next debounced event off the buffer.
+
+        Returns:
+            (source, ticks_ms) or None when the buffer is empty
+        """
+        while self._tail != self._head:
+            tail = self._tail
+            source = self._sources[tail]
+            when = self._times[tail]
+            self._tail = tail + 1 if tail + 1 < self.size else 0
+
+            # Accept an edge only after a quiet gap since the source's last one
+            quiet = not self._seen[source] or \
+                ticks_diff(when, self._last[source]) >= self.debounce_ms
+            self._seen[source] = 1
+            self._last[source] = when
+            if quiet:
+                return source, when
+        return None
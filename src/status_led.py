@@ -0,0 +1,113 @@
+# Pico Whale Project - Status LED Effects
+# ========================================
+# Non-blocking blink sequences for the onboard status LED.
+# Sequences are queued and played back as timed on/off transitions by
+# update(), which the main loop (or an asyncio task) calls as often as it
+# likes. Nothing here sleeps, so status feedback never holds up MQTT or
+# touch handling.
+
+from time import ticks_ms, ticks_add, ticks_diff
+
+
+class StatusLED:
+    """
+    Queue of blink sequences played on one LED.
+
+    Usage:
+        status = StatusLED(Pin("LED", Pin.OUT))
+        status.blink(3)            # 3 blinks, 150 ms on / 150 ms off
+        status.blink(10, 100)      # Error: rapid blinks
+        status.flash(100)          # One short flash
+
+        while True:
+            status.update()
+            ...
+
+    When the queue is full new sequences are dropped, so a repeating error
+    cannot build up an ever-growing backlog of blinks.
+    """
+
+    def __init__(self, led, queue_size: int = 4):
+        """Initialize the scheduler.
+
+        Args:
+            led: Object with on() and off() (e.g. machine.Pin)
+            queue_size: Maximum number of waiting sequences
+        """
+        self.led = led
+        self.queue_size = queue_size
+        self._queue = []
+        self._phase = 0          # Next on/off phase of the current sequence
+        self._phases = 0         # 2 * blink count, 0 when idle
+        self._on_ms = 0
+        self._off_ms = 0
+        self._due = ticks_ms()   # When the current phase ends
+        self.wake = None         # Called when a sequence is queued (asyncio runtime)
+
+    def blink(self, count: int, on_ms: int = 150, off_ms: int = None) -> bool:
+        """Queue a blink sequence.
+
+        Args:
+            count: Number of blinks
+            on_ms: LED on time per blink
+            off_ms: LED off time after each blink (same as on_ms if None)
+
+        Returns:
+            False if the queue was full and the sequence was dropped
+        """
+        if len(self._queue) >= self.queue_size:
+            return False
+        self._queue.append((count, on_ms, on_ms if off_ms is None else off_ms))
+        if self.wake:
+            self.wake()
+        return True
+
+    def flash(self, ms: int = 100) -> bool:
+        """Queue a single flash."""
+        return self.blink(1, ms, 0)
+
+    def busy(self) -> bool:
+        """True while a sequence is playing or waiting."""
+        return bool(self._phases or self._queue)
+
+    def clear(self):
+        """Drop all sequences and turn the LED off."""
+        self._queue = []
+        self._phases = 0
+        self.led.off()
+
+    def update(self, now: int = None):
+        """Apply any transitions that are due.
+
+        Args:
+            now: Current ticks_ms() value (read if omitted)
+
+        Returns:
+            Milliseconds until the next transition, or None when idle
+        """
+        if now is None:
+            now = ticks_ms()
+        while True:
+            if self._phases:
+                wait = ticks_diff(self._due, now)
+                if wait > 0:
+                    return wait
+                if self._phase < self._phases:
+                    # Even phases light the LED, odd phases are the gap after
+                    if self._phase & 1:
+                        self.led.off()
+                        length = self._off_ms
+                    else:
+                        self.led.on()
+                        length = self._on_ms
+                    self._phase += 1
+                    self._due = ticks_add(now, length)
+                    continue
+                self._phases = 0
+
+            if not self._queue:
+                return None
+            count, self._on_ms, self._off_ms = self._queue.pop(0)
+            self._phase = 0
+            self._phases = count * 2
+            self._due = now
@@ -0,0 +1,282 @@
+# Pico Whale Project - Touch Queue
+# ================================
+# Outgoing touches, kept in flash until the broker has acknowledged them,
+# so touches made while the link is down (or just before a reboot) still
+# reach the other whale.
+#
+# The queue is a file of fixed-size records used as a ring: record number
+# n always lives in slot n % slots, so the file never grows and every
+# slot is rewritten at the same rate. Queuing a touch writes its record;
+# once it is acknowledged one state byte in the record is rewritten.
+#
+# Record layout (little endian, RECORD_SIZE bytes):
+#   "<IIBB"  record number (0 = never used), queued at (unix time),
+#            state, message length; then the message
+#
+# Record numbers keep counting across reboots (the highest one in the
+# file is where counting resumes), and their low 16 bits are the touch
+# sequence numbers, so a receiver can tell a replayed touch from a new
+# one. DuplicateFilter is that receiving side. A new (or unused) file
+# starts counting at a random number, so receivers that remember the old count take it
+# as a restart rather than as replays.
+#
+# Queue times are only comparable within one boot unless the clock has
+# been set: the RTC restarts at 2021-01-01 on every boot. Records from an
+# earlier boot are therefore dropped on loading unless both their queue
+# time and the current time are past CLOCK_SET_AFTER.
+#
+# umqtt.simple's publish() at QoS 1 blocks until the PUBACK arrives, so
+# touches are published with publish_nowait() instead and acknowledged
+# when check_msg() reports the PUBACK (see read_puback()).
+
+import random
+import struct
+import time
+
+QUEUE_FILE = "touch_queue.bin"
+
+RECORD_FORMAT = "<IIBB"
+RECORD_HEADER = struct.calcsize(RECORD_FORMAT)
+RECORD_SIZE = 128
+MAX_MESSAGE = RECORD_SIZE - RECORD_HEADER
+
+STATE_PENDING = 1
+STATE_SENT = 2
+
+CLOCK_SET_AFTER = 1704067200  # 2024-01-01; earlier times mean an unset RTC
+
+DUPLICATE_WINDOW = 24  # Sequence numbers remembered per sender
+DUPLICATE_SENDERS = 8  # Senders remembered
+
+
+class TouchQueue:
+    """
+    Flash-backed FIFO of touch messages waiting to be acknowledged.
+
+    Usage:
+        queue = TouchQueue(slots=TOUCH_QUEUE_SIZE)
+
+        message = wire.encode_touch(DEVICE_ID, now_ms(), queue.next_seq)
+        queue.push(message, time.time())
+
+        for number, queued_at, message in queue.pending():   # Once connected
+            inflight[publish_nowait(mqtt, topic, message)] = number
+        ...
+        if mqtt.check_msg() == PUBACK:
+            queue.ack(inflight.pop(read_puback(mqtt)))
+
+    When a push needs the slot of a touch that is still unsent, that touch
+    is overwritten (and counted in dropped, as are touches from before a restart whose age
+    cannot be told).
+    """
+
+    def __init__(self, path: str = QUEUE_FILE, slots: int = 20):
+        """Open the queue, creating its file or reloading unsent touches.
+
+        Args:
+            path: Queue file in flash
+            slots: Records in the ring (touches that can wait at once)
+        """
+        self.path = path
+        self.slots = slots
+        self.dropped = 0
+        self._pending = []     # [(number, queued_at, message)], oldest first
+        self._number = 0       # Last record number used
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    @property
+    def next_seq(self) -> int:
+        """Sequence number the next pushed touch gets."""
+        return (self._number + 1) & 0xFFFF
+
+    def push(self, message, queued_at: int):
+        """Queue a message (written to flash before this returns).
+
+        Raises:
+            ValueError: If the message does not fit in a record
+        """
+        data = message.encode() if isinstance(message, str) else message
+        if len(data) > MAX_MESSAGE:
+            raise ValueError("touch message too long")
+        self._number += 1
+        if self._number == 0x100000000:
+            self._number = 1
+        slot = self._number % self.slots
+        for i, entry in enumerate(self._pending):
+            if entry[0] % self.slots == slot:
+                del self._pending[i]    # Unsent touch whose slot is reused
+                self.dropped += 1
+                break
+        record = bytearray(RECORD_SIZE)
+        struct.pack_into(RECORD_FORMAT, record, 0, self._number, int(queued_at),
+                         STATE_PENDING, len(data))
+        record[RECORD_HEADER:RECORD_HEADER + len(data)] = data
+        self._write(self._number, record)
+        self._pending.append((self._number, int(queued_at), data))
+
+    def pending(self) -> list:
+        """Unsent touches as [(number, queued_at, message)], oldest first."""
+        return list(self._pending)
+
+    def ack(self, number: int) -> bool:
+        """Mark a touch as sent (acknowledged or given up on).
+
+        Returns:
+            False if it was no longer queued
+        """
+        for i, entry in enumerate(self._pending):
+            if entry[0] == number:
+                del self._pending[i]
+                if self._read_number(number) == number:
+                    self._write(number, bytes((STATE_SENT,)), 8)
+                return True
+        return False
+
+    def _read_number(self, number: int) -> int:
+        """Record number currently stored in number's slot."""
+        with open(self.path, "rb") as f:
+            f.seek((number % self.slots) * RECORD_SIZE)
+            return struct.unpack("<I", f.read(4))[0]
+
+    def _write(self, number: int, data, offset: int = 0):
+        with open(self.path, "r+b") as f:
+            f.seek((number % self.slots) * RECORD_SIZE + offset)
+            f.write(data)
+
+    def _load(self):
+        """Read unsent records back, or start a fresh file.
+
+        Records are all from an earlier boot, so ones whose age cannot be
+        told are marked sent instead.
+        """
+        size = self.slots * RECORD_SIZE
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except OSError:
+            data = b""
+        if len(data) != size:
+            if data:
+                print("Touch queue file has the wrong size; starting a new one")
+            with open(self.path, "wb") as f:
+                for _ in range(self.slots):
+                    f.write(bytes(RECORD_SIZE))
+            data = b""
+        for slot in range(len(data) // RECORD_SIZE):
+            offset = slot * RECORD_SIZE
+            number, queued_at, state, length = struct.unpack_from(RECORD_FORMAT, data, offset)
+            if not number or number % self.slots != slot:
+                continue
+            if number > self._number:
+                self._number = number
+            if state == STATE_PENDING and length <= MAX_MESSAGE:
+                start = offset + RECORD_HEADER
+                self._pending.append((number, queued_at, data[start:start + length]))
+        self._pending.sort()
+        if not self._number:
+            self._number = random.getrandbits(16)
+        clock_set = time.time() >= CLOCK_SET_AFTER
+        stale = [entry for entry in self._pending
+                 if not clock_set or entry[1] < CLOCK_SET_AFTER]
+        for entry in stale:
+            self.ack(entry[0])
+            self.dropped += 1
+        if stale:
+            print(f"Dropped {len(stale)} queued touch(es) of unknown age (clock not set)")
+
+
+# =============================================================================
+# QoS 1 without blocking
+# =============================================================================
+
+PUBACK = 0x40
+
+
+def publish_nowait(client, topic, msg, qos: int = 1) -> int:
+    """Publish with a umqtt.simple client without waiting for the PUBACK.
+
+    Returns:
+        The packet ID to match against read_puback() (0 at QoS 0)
+    """
+    if not qos:
+        client.publish(topic, msg)
+        return 0
+    topic = topic.encode() if isinstance(topic, str) else topic
+    msg = msg.encode() if isinstance(msg, str) else msg
+    client.pid = client.pid % 0xFFFF + 1
+    remaining = 2 + len(topic) + 2 + len(msg)
+    packet = bytearray(b"\x32")    # PUBLISH, QoS 1
+    while remaining > 0x7F:
+        packet.append((remaining & 0x7F) | 0x80)
+        remaining >>= 7
+    packet.append(remaining)
+    packet += struct.pack("!H", len(topic)) + topic + struct.pack("!H", client.pid) + msg
+    client.sock.write(packet)
+    return client.pid
+
+
+def read_puback(client) -> int:
+    """Finish reading a PUBACK after check_msg() returned PUBACK.
+
+    umqtt.simple only reads the packet type byte of packets it does not
+    handle itself; this reads the rest.
+
+    Returns:
+        The acknowledged packet ID
+
+    Raises:
+        OSError: If the rest of the packet is malformed
+    """
+    data = client.sock.read(3)
+    if not data or len(data) != 3 or data[0] != 2:
+        raise OSError("bad PUBACK")
+    return data[1] << 8 | data[2]
+
+
+class DuplicateFilter:
+    """
+    Recognizes touches seen before, by (sender, sequence number).
+
+    Each sender gets a sliding window like IPsec's replay check: the
+    highest sequence number seen and a bitmask of the DUPLICATE_WINDOW
+    numbers below it. A number far enough ahead or behind is taken as the
+    sender having restarted its count. Memory stays bounded: at most
+    DUPLICATE_SENDERS senders are kept.
+    """
+
+    def __init__(self, window: int = DUPLICATE_WINDOW):
+        self.window = window
+        self._senders = {}     # device -> [highest seq, bitmask]
+
+    def seen(self, device: str, seq: int) -> bool:
+        """True if this touch was seen before (otherwise it is recorded)."""
+        entry = self._senders.get(device)
+        if entry is None:
+            if len(self._senders) >= DUPLICATE_SENDERS:
+                self._senders.pop(next(iter(self._senders)))
+            self._senders[device] = [seq, 1]
+            return False
+        highest, mask = entry
+        ahead = (seq - highest) & 0xFFFF
+        if ahead == 0:
+            return True
+        if ahead < 0x8000:
+            if ahead <= self.window:
+                entry[1] = ((mask << ahead) | 1) & ((1 << (self.window + 1)) - 1)
+            else:
+                entry[1] = 1
+            entry[0] = seq
+            return False
+        behind = 0x10000 - ahead
+        if behind > self.window:
+            entry[0] = seq    # Sender restarted its count
+            entry[1] = 1
+            return False
+        bit = 1 << behind
+        if mask & bit:
+            return True
+        entry[1] = mask | bit
+        return False
@@ -0,0 +1,357 @@
+# Pico Whale Project - Wire Protocol
+# ===================================
+# Encodes and decodes the MQTT payloads exchanged between whales, in either
+# the original text formats or a compact struct-packed binary form.
+#
+# Text (always understood, and what older whales and the tools send):
+#   touch      "whale_1:touch:1700000000:42:1700000000123" (unix time,
+#              then sequence number and send time in ms, which older
+#              whales ignore)
+#   color      "255,100,200"
+#   pattern    "rainbow"
+#   heartbeat  JSON object
+#
+# Binary messages start with a version byte, which is below 0x20 and so
+# can never start a text payload, followed by a message type byte (all
+# little endian). The version byte is the protocol version that introduced
+# the message's format, so messages whose format did not change stay
+# readable by older whales:
+#   touch v1   "<BBI"   version, type, unix time; then device id
+#   touch v2   "<BBQH"  version, type, send time in ms, sequence number;
+#              then device id
+#   color      "<BBBBB" version, type, r, g, b
+#   pattern    "<BB"    version, type; then pattern name
+#   heartbeat  "<BBIIIHHHB" version, type, uptime, touch count, received
+#              count, reconnects, connect ms, busy per mille, queued
+#              touches; then device id and pattern, then optional JSON
+#              with extra diagnostics
+# Strings inside a message are a length byte followed by UTF-8 bytes; a
+# string at the end of a message runs to the end instead.
+#
+# Heartbeats in either encoding are keyframes (every field) or deltas,
+# which carry only the fields that changed since the last keyframe: every
+# heartbeat has a sequence number "hb", and a delta names its keyframe's
+# in "base". Each delta stands on its own, so listeners only need to keep
+# the last keyframe; apply_heartbeat() rebuilds the full state.
+#
+# A whale advertises the highest version it understands in its heartbeat
+# ("proto" in JSON, or in the binary heartbeat's JSON tail when above 1)
+# and only sends a format once every peer it has heard from understands it.
+
+import json
+import struct
+
+WIRE_VERSION = 2
+
+MSG_TOUCH = 1
+MSG_COLOR = 2
+MSG_PATTERN = 3
+MSG_HEARTBEAT = 4
+
+MESSAGE_NAMES = {MSG_TOUCH: "touch", MSG_COLOR: "color",
+                 MSG_PATTERN: "pattern", MSG_HEARTBEAT: "heartbeat"}
+
+TOUCH_FORMAT = "<BBI"
+TOUCH_V2_FORMAT = "<BBQH"
+COLOR_FORMAT = "<BBBBB"
+HEARTBEAT_FORMAT = "<BBIIIHHHB"
+TOUCH_SIZE = struct.calcsize(TOUCH_FORMAT)
+TOUCH_V2_SIZE = struct.calcsize(TOUCH_V2_FORMAT)
+HEARTBEAT_SIZE = struct.calcsize(HEARTBEAT_FORMAT)
+
+
+def is_binary(msg) -> bool:
+    """True if a payload uses the binary encoding."""
+    return len(msg) > 0 and msg[0] < 0x20
+
+
+def message_type(msg) -> int:
+    """Type byte of a binary payload (after checking its version).
+
+    Raises:
+        ValueError: If the payload is not binary or from a newer protocol
+    """
+    if not is_binary(msg) or len(msg) < 2:
+        raise ValueError("not a binary message")
+    if msg[0] > WIRE_VERSION:
+        raise ValueError("unsupported wire version %d" % msg[0])
+    return msg[1]
+
+
+def _expect(msg, msg_type: int):
+    if message_type(msg) != msg_type:
+        raise ValueError("expected %s message" % MESSAGE_NAMES[msg_type])
+
+
+def _pack_str(s) -> bytes:
+    data = s.encode() if isinstance(s, str) else s
+    return bytes((len(data),)) + data
+
+
+def _unpack_str(msg, offset: int) -> tuple:
+    """Read a length-prefixed string; returns (string, next offset)."""
+    if offset >= len(msg):
+        raise ValueError("truncated string")
+    end = offset + 1 + msg[offset]
+    if end > len(msg):
+        raise ValueError("truncated string")
+    return bytes(msg[offset + 1:end]).decode(), end
+
+
+# =============================================================================
+# Touch
+# =============================================================================
+
+def encode_touch(device: str, sent_ms: int, seq: int = 0, version: int = 0):
+    """Touch payload.
+
+    Args:
+        device: Sending whale's ID
+        sent_ms: Send time in ms since the unix epoch (sender's clock)
+        seq: Sequence number (wraps at 16 bits)
+        version: 0 for text, 1 or 2 for binary (v1 carries whole seconds
+                 and no sequence number)
+    """
+    if version >= 2:
+        return struct.pack(TOUCH_V2_FORMAT, 2, MSG_TOUCH, sent_ms, seq & 0xFFFF) + device.encode()
+    if version == 1:
+        return struct.pack(TOUCH_FORMAT, 1, MSG_TOUCH, sent_ms // 1000) + device.encode()
+    return f"{device}:touch:{sent_ms // 1000}:{seq & 0xFFFF}:{sent_ms}"
+
+
+def decode_touch(msg) -> tuple:
+    """Sender, send time and sequence number of a touch payload.
+
+    Returns:
+        (device, sent_ms, seq); sent_ms and seq are None for touches from
+        whales that only send whole seconds
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if is_binary(msg):
+        _expect(msg, MSG_TOUCH)
+        if msg[0] == 1:
+            if len(msg) < TOUCH_SIZE:
+                raise ValueError("truncated touch")
+            return bytes(msg[TOUCH_SIZE:]).decode(), None, None
+        if len(msg) < TOUCH_V2_SIZE:
+            raise ValueError("truncated touch")
+        _, _, sent_ms, seq = struct.unpack_from(TOUCH_V2_FORMAT, msg)
+        return bytes(msg[TOUCH_V2_SIZE:]).decode(), sent_ms, seq
+    parts = bytes(msg).decode().split(":")
+    if len(parts) > 4 and parts[3].isdigit() and parts[4].isdigit():
+        return parts[0], int(parts[4]), int(parts[3])
+    return parts[0], None, None
+
+
+# =============================================================================
+# Color & Pattern
+# =============================================================================
+
+def encode_color(r: int, g: int, b: int, binary: bool = False):
+    """Color command payload."""
+    if binary:
+        return struct.pack(COLOR_FORMAT, 1, MSG_COLOR, r, g, b)
+    return f"{r},{g},{b}"
+
+
+def decode_color(msg) -> tuple:
+    """(r, g, b) from a color payload (either encoding).
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if is_binary(msg):
+        _expect(msg, MSG_COLOR)
+        if len(msg) != struct.calcsize(COLOR_FORMAT):
+            raise ValueError("bad color length")
+        return struct.unpack(COLOR_FORMAT, msg)[2:]
+    parts = bytes(msg).split(b",")
+    if len(parts) != 3:
+        raise ValueError("expected r,g,b")
+    return int(parts[0]), int(parts[1]), int(parts[2])
+
+
+def encode_pattern(name: str, binary: bool = False):
+    """Pattern command payload."""
+    if binary:
+        return bytes((1, MSG_PATTERN)) + name.encode()
+    return name
+
+
+def decode_pattern(msg) -> str:
+    """Pattern name from a pattern payload (either encoding)."""
+    if is_binary(msg):
+        _expect(msg, MSG_PATTERN)
+        return bytes(msg[2:]).decode()
+    return bytes(msg).decode()
+
+
+# =============================================================================
+# Heartbeat
+# =============================================================================
+
+def encode_heartbeat(status: dict, extras: dict = None):
+    """Binary heartbeat payload.
+
+    Args:
+        status: Heartbeat fields: device, uptime, touch_count,
+                received_count, reconnects, connect_ms, busy_pct,
+                queued_touches, pattern and optionally proto (the
+                version the sender understands, default 1)
+        extras: Further fields, appended as JSON if given
+    """
+    proto = status.get("proto", 1)
+    if proto > 1:
+        extras = dict(extras) if extras else {}
+        extras["proto"] = proto
+    data = struct.pack(
+        HEARTBEAT_FORMAT, 1, MSG_HEARTBEAT,
+        int(status["uptime"]), status["touch_count"], status["received_count"],
+        min(status["reconnects"], 0xFFFF), min(status["connect_ms"] or 0, 0xFFFF),
+        int(status["busy_pct"] * 10), min(status["queued_touches"], 0xFF),
+    ) + _pack_str(status["device"]) + _pack_str(status["pattern"])
+    if extras:
+        data += json.dumps(extras).encode()
+    return data
+
+
+def decode_heartbeat(msg) -> dict:
+    """Heartbeat fields from either encoding.
+
+    Binary heartbeats are returned with the same keys as the JSON ones
+    (extras merged in) plus "proto". JSON heartbeats without "proto" come
+    from whales that only speak text and get "proto": 0.
+
+    Raises:
+        ValueError: If the payload is malformed
+    """
+    if not is_binary(msg):
+        heartbeat = json.loads(msg)
+        if not isinstance(heartbeat, dict):
+            raise ValueError("heartbeat is not a JSON object")
+        heartbeat.setdefault("proto", 0)
+        return heartbeat
+    _expect(msg, MSG_HEARTBEAT)
+    if len(msg) < HEARTBEAT_SIZE:
+        raise ValueError("truncated heartbeat")
+    fields = struct.unpack_from(HEARTBEAT_FORMAT, msg)
+    device, offset = _unpack_str(msg, HEARTBEAT_SIZE)
+    pattern, offset = _unpack_str(msg, offset)
+    heartbeat = {
+        "device": device,
+        "status": "online",
+        "proto": fields[0],
+        "uptime": fields[2],
+        "touch_count": fields[3],
+        "received_count": fields[4],
+        "reconnects": fields[5],
+        "connect_ms": fields[6],
+        "busy_pct": fields[7] / 10,
+        "queued_touches": fields[8],
+        "pattern": pattern,
+    }
+    if offset < len(msg):
+        extras = json.loads(bytes(msg[offset:]))
+        if not isinstance(extras, dict):
+            raise ValueError("heartbeat extras are not a JSON object")
+        heartbeat.update(extras)
+    return heartbeat
+
+
+# Keys sent in every heartbeat, changed or not ("echo" only means
+# something in the heartbeat that carries it)
+HEARTBEAT_ALWAYS = ("device", "proto", "hb", "ts", "echo")
+
+
+def _diff(old: dict, new: dict) -> dict:
+    delta = {}
+    for key, value in new.items():
+        if key not in old:
+            delta[key] = value
+        elif value != old[key]:
+            before = old[key]
+            if isinstance(value, dict) and isinstance(before, dict):
+                delta[key] = _diff(before, value)
+            else:
+                delta[key] = value
+    for key in old:
+        if key not in new:
+            delta[key] = None
+    return delta
+
+
+def _merge(state: dict, delta: dict) -> dict:
+    merged = dict(state)
+    for key, value in delta.items():
+        before = merged.get(key)
+        if value is None:
+            merged.pop(key, None)
+        elif isinstance(value, dict) and isinstance(before, dict):
+            merged[key] = _merge(before, value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def heartbeat_delta(base: dict, heartbeat: dict) -> dict:
+    """Delta heartbeat: what changed since base, the last keyframe sent.
+
+    Nested objects are compared field by field, and fields that are gone
+    are sent as null (so null fields read back as absent). HEARTBEAT_ALWAYS fields are always included.
+
+    Args:
+        base: Last keyframe (with its "hb")
+        heartbeat: Full current heartbeat (with its "hb")
+    """
+    delta = _diff(base, heartbeat)
+    for key in HEARTBEAT_ALWAYS:
+        if key in heartbeat:
+            delta[key] = heartbeat[key]
+    delta["base"] = base["hb"]
+    return delta
+
+
+def apply_heartbeat(keyframe, heartbeat: dict):
+    """Rebuild a whale's full heartbeat from a keyframe or a delta.
+
+    Keep heartbeats without "base" as the whale's keyframe.
+
+    Args:
+        keyframe: The whale's last keyframe (None if none yet)
+        heartbeat: Decoded heartbeat
+
+    Returns:
+        The full heartbeat, or None if heartbeat is a delta on a keyframe
+        other than this one (it was missed; wait for the next one)
+    """
+    base = heartbeat.get("base")
+    if base is None:
+        return heartbeat
+    if keyframe is None or keyframe.get("hb") != base:
+        return None
+    merged = _merge(keyframe, heartbeat)
+    for key in HEARTBEAT_ALWAYS:     # Sent whole, so replaced rather than merged
+        if key in heartbeat:
+            merged[key] = heartbeat[key]
+    del merged["base"]
+    return merged
+
+
+def decode(msg) -> tuple:
+    """Decode any binary payload, for tools that watch every topic.
+
+    Returns:
+        (message name, decoded value)
+    """
+    msg_type = message_type(msg)
+    if msg_type == MSG_TOUCH:
+        return "touch", decode_touch(msg)
+    if msg_type == MSG_COLOR:
+        return "color", decode_color(msg)
+    if msg_type == MSG_PATTERN:
+        return "pattern", decode_pattern(msg)
+    if msg_type == MSG_HEARTBEAT:
+        return "heartbeat", decode_heartbeat(msg)
+    raise ValueError("unknown message type %d" % msg_type)
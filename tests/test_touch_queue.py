@@ -0,0 +1,67 @@
+# Touch Queue Test for Pico Whale
+# ===============================
+# Host-side checks of the flash touch queue (src/touch_queue.py).
+# Run on a computer with: python tests/test_touch_queue.py  (or pytest)
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from touch_queue import TouchQueue
+
+NOW = 1800000000   # A queue time with the clock set
+
+
+def _queue_path():
+    fd, path = tempfile.mkstemp(suffix=".bin")
+    os.close(fd)
+    os.remove(path)
+    return path
+
+
+def test_reused_slot_survives_ack_of_old_touch():
+    """A touch still unsent when its slot is reused must not clobber the new one."""
+    path = _queue_path()
+    try:
+        queue = TouchQueue(path, slots=4)
+        numbers = []
+        for i in range(4):
+            queue.push(b"t%d" % i, NOW)
+            numbers.append(queue.pending()[-1][0])
+        for number in numbers[1:]:
+            queue.ack(number)
+
+        queue.push(b"n0", NOW)              # Takes t0's slot
+        new = queue.pending()[-1][0]
+        assert [entry[0] for entry in queue.pending()] == [new]
+        assert queue.dropped == 1
+        assert not queue.ack(numbers[0])    # t0 is gone, n0 untouched
+
+        reloaded = TouchQueue(path, slots=4)
+        assert [entry[2] for entry in reloaded.pending()] == [b"n0"]
+    finally:
+        os.remove(path)
+
+
+def test_pending_touches_survive_reload():
+    """Unacknowledged touches come back, in order, after a restart."""
+    path = _queue_path()
+    try:
+        queue = TouchQueue(path, slots=4)
+        for message in (b"a", b"b", b"c"):
+            queue.push(message, NOW)
+        queue.ack(queue.pending()[1][0])
+
+        reloaded = TouchQueue(path, slots=4)
+        assert [entry[2] for entry in reloaded.pending()] == [b"a", b"c"]
+        assert reloaded.next_seq == queue.next_seq
+    finally:
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    test_reused_slot_survives_ack_of_old_touch()
+    test_pending_touches_survive_reload()
+    print("✓ Touch queue tests passed")
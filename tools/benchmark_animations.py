@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+🐋 Animation Benchmark Suite
+=============================
+Measures how expensive each animation pattern is across LED counts and
+backends, and saves the results as JSON so they can be diffed between
+commits.
+
+For every pattern in get_pattern_names() it reports:
+    fps                     frames rendered per second
+    us_per_frame            microseconds per frame
+    alloc_bytes_per_frame   heap bytes allocated per frame
+    peak_bytes              peak heap use while running the case
+
+Runs under CPython (allocations via tracemalloc) and the MicroPython unix
+port (allocations via gc.mem_alloc with the collector paused).
+
+Usage:
+    python benchmark_animations.py                         # all defaults
+    python benchmark_animations.py --leds 12,144 --backend fixed
+    python benchmark_animations.py --output after.json --compare before.json
+    micropython benchmark_animations.py --output mpy.json
+"""
+
+import sys
+import json
+import time
+import gc
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+# Import the firmware animation code from ../src
+_here = __file__.rsplit("/", 1)[0] if "/" in __file__ else "."
+sys.path.insert(0, _here + "/../src")
+
+import random
+from animations import AnimationLibrary, get_pattern_names, run_pattern, render_pattern
+from fixed_animations import FixedPointAnimationLibrary
+
+if not MICROPYTHON:
+    import tracemalloc
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+DEFAULT_LEDS = [12, 60, 144, 512, 1024, 4096]
+DEFAULT_BACKENDS = ["float", "fixed"]
+DEFAULT_APIS = ["list", "buffer"]
+MIN_FRAMES = 20
+MIN_SECONDS = 0.25
+REGRESSION_THRESHOLD = 0.10   # Flag cases more than 10% slower
+
+BACKENDS = {
+    "float": AnimationLibrary,
+    "fixed": FixedPointAnimationLibrary,
+}
+
+
+# =============================================================================
+# Timing & Memory Helpers
+# =============================================================================
+if MICROPYTHON:
+    def _now_us():
+        return time.ticks_us()
+
+    def _elapsed_us(start):
+        return time.ticks_diff(time.ticks_us(), start)
+else:
+    def _now_us():
+        return time.perf_counter()
+
+    def _elapsed_us(start):
+        return (time.perf_counter() - start) * 1e6
+
+
+def _make_step(anim, pattern: str, api: str):
+    """Return a zero-argument callable that renders one frame."""
+    if api == "list":
+        return lambda: run_pattern(anim, pattern)
+    return lambda: render_pattern(anim, pattern)
+
+
+def _time_frames(step) -> tuple:
+    """Run frames until both minimums are met. Returns (frames, total_us)."""
+    frames = 0
+    start = _now_us()
+    while True:
+        step()
+        frames += 1
+        if frames >= MIN_FRAMES and _elapsed_us(start) >= MIN_SECONDS * 1e6:
+            break
+    return frames, _elapsed_us(start)
+
+
+def _measure_memory(make_anim, step_factory, frames: int) -> tuple:
+    """Measure (alloc_bytes_per_frame, peak_bytes) over a number of frames."""
+    if MICROPYTHON:
+        gc.collect()
+        gc.disable()
+        base = gc.mem_alloc()
+        anim = make_anim()
+        step = step_factory(anim)
+        step()  # Warm up bound-method caches etc.
+        total = 0
+        for _ in range(frames):
+            before = gc.mem_alloc()
+            step()
+            total += gc.mem_alloc() - before
+        peak = gc.mem_alloc() - base
+        gc.enable()
+        gc.collect()
+        return total / frames, peak
+
+    gc.collect()
+    tracemalloc.start()
+    anim = make_anim()
+    step = step_factory(anim)
+    step()
+    total = 0
+    for _ in range(frames):
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        step()
+        _, frame_peak = tracemalloc.get_traced_memory()
+        total += frame_peak - current
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return total / frames, peak
+
+
+# =============================================================================
+# Benchmark Runner
+# =============================================================================
+def run_case(pattern: str, backend: str, api: str, leds: int) -> dict:
+    """Benchmark one pattern/backend/api/LED-count combination."""
+    library = BACKENDS[backend]
+
+    def make_anim():
+        anim = library(leds)
+        anim.set_color(255, 100, 200)
+        return anim
+
+    random.seed(1234)
+    step = _make_step(make_anim(), pattern, api)
+    step()
+    frames, total_us = _time_frames(step)
+
+    random.seed(1234)
+    alloc, peak = _measure_memory(
+        make_anim, lambda anim: _make_step(anim, pattern, api), min(frames, 50))
+
+    us_per_frame = total_us / frames
+    return {
+        "pattern": pattern,
+        "backend": backend,
+        "api": api,
+        "leds": leds,
+        "frames": frames,
+        "fps": round(1e6 / us_per_frame, 1),
+        "us_per_frame": round(us_per_frame, 1),
+        "alloc_bytes_per_frame": round(alloc, 1),
+        "peak_bytes": peak,
+    }
+
+
+def run_suite(leds_list, backends, apis, patterns, quiet=False) -> list:
+    """Run every combination and return the result rows."""
+    results = []
+    for leds in leds_list:
+        for backend in backends:
+            for api in apis:
+                for pattern in patterns:
+                    row = run_case(pattern, backend, api, leds)
+                    results.append(row)
+                    if not quiet:
+                        print("{:>5} LEDs  {:<5} {:<6} {:<12} {:>10.1f} fps {:>10.1f} B/frame".format(
+                            leds, backend, api, pattern, row["fps"],
+                            row["alloc_bytes_per_frame"]))
+    return results
+
+
+def _metadata() -> dict:
+    """Describe the interpreter and source revision the run used."""
+    meta = {
+        "implementation": sys.implementation.name,
+        "version": sys.version.split()[0],
+        "platform": sys.platform,
+        "timestamp": int(time.time()),
+    }
+    if not MICROPYTHON:
+        try:
+            import subprocess
+            meta["commit"] = subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"], cwd=_here,
+                stderr=subprocess.DEVNULL).decode().strip()
+        except Exception:
+            pass
+    return meta
+
+
+def _case_key(row: dict) -> tuple:
+    return (row["pattern"], row["backend"], row["api"], row["leds"])
+
+
+def compare(results: list, baseline_path: str) -> int:
+    """Print a diff against a previous run. Returns the number of regressions."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {_case_key(row): row for row in baseline["results"]}
+
+    print("\nComparison with " + baseline_path)
+    print("-" * 72)
+    regressions = 0
+    for row in results:
+        old = previous.get(_case_key(row))
+        if not old or not old["fps"]:
+            continue
+        ratio = row["fps"] / old["fps"]
+        marker = ""
+        if ratio < 1 - REGRESSION_THRESHOLD:
+            marker = "  ❌ slower"
+            regressions += 1
+        elif ratio > 1 + REGRESSION_THRESHOLD:
+            marker = "  ✅ faster"
+        alloc_delta = row["alloc_bytes_per_frame"] - old["alloc_bytes_per_frame"]
+        print("{:>5} {:<5} {:<6} {:<12} {:>6.2f}x fps {:>+10.1f} B/frame{}".format(
+            row["leds"], row["backend"], row["api"], row["pattern"],
+            ratio, alloc_delta, marker))
+    print("-" * 72)
+    print("{} regression(s)".format(regressions))
+    return regressions
+
+
+# =============================================================================
+# Command Line
+# =============================================================================
+def _parse_args():
+    """Parse options with argparse, or a minimal parser on MicroPython."""
+    defaults = {
+        "leds": ",".join(str(n) for n in DEFAULT_LEDS),
+        "backend": ",".join(DEFAULT_BACKENDS),
+        "api": ",".join(DEFAULT_APIS),
+        "pattern": ",".join(get_pattern_names()),
+        "output": None,
+        "compare": None,
+        "quiet": False,
+    }
+    try:
+        import argparse
+    except ImportError:
+        args = dict(defaults)
+        argv = sys.argv[1:]
+        i = 0
+        while i < len(argv):
+            name = argv[i].lstrip("-")
+            if name == "quiet":
+                args["quiet"] = True
+                i += 1
+            else:
+                args[name] = argv[i + 1]
+                i += 2
+        return args
+
+    parser = argparse.ArgumentParser(description="Pico Whale animation benchmarks")
+    parser.add_argument("--leds", default=defaults["leds"],
+                        help="Comma-separated LED counts (default: %(default)s)")
+    parser.add_argument("--backend", default=defaults["backend"],
+                        help="Comma-separated backends: float, fixed")
+    parser.add_argument("--api", default=defaults["api"],
+                        help="list (run_pattern) and/or buffer (render_pattern)")
+    parser.add_argument("--pattern", default=defaults["pattern"],
+                        help="Comma-separated pattern names (default: all)")
+    parser.add_argument("--output", "-o", help="Write results to this JSON file")
+    parser.add_argument("--compare", "-c", help="Baseline JSON file to diff against")
+    parser.add_argument("--quiet", "-q", action="store_true", help="Only print the summary")
+    return vars(parser.parse_args())
+
+
+def main():
+    args = _parse_args()
+    leds_list = [int(n) for n in args["leds"].split(",")]
+    backends = args["backend"].split(",")
+    apis = args["api"].split(",")
+    patterns = args["pattern"].split(",")
+
+    print("=" * 72)
+    print("  🐋 PICO WHALE ANIMATION BENCHMARK ({} {})".format(
+        sys.implementation.name, sys.version.split()[0]))
+    print("=" * 72)
+
+    results = run_suite(leds_list, backends, apis, patterns, args["quiet"])
+    report = {"meta": _metadata(), "results": results}
+
+    if args["output"]:
+        with open(args["output"], "w") as f:
+            json.dump(report, f)
+        print("\nResults written to " + args["output"])
+
+    if args["compare"]:
+        if compare(results, args["compare"]):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""
+🐋 Animation Clip Builder
+==========================
+Renders one full period of a pattern into a .wclip file that the firmware
+streams from flash with ClipPlayer (src/clip_player.py) instead of
+computing it every frame.
+
+The period is found automatically by rendering frames until the sequence
+repeats (to within --tolerance per channel, since float patterns drift by
+a step or so between cycles). Patterns whose period is very long or not
+close to a whole number of frames need an explicit --frames count; the
+clip then loops with a small jump at the seam.
+
+Random patterns (sparkle, fire, celebration) never repeat, so --frames is
+required for them and the clip replays the same random sequence.
+
+Usage:
+    python clip_builder.py rainbow --leds 12 --color 255,100,200
+    python clip_builder.py comet --param tail_length=6 --param speed=0.5
+    python clip_builder.py sparkle --frames 100 --encoding delta --verify
+
+    # Then copy to the Pico; it shows up as a pattern named after the file
+    mpremote mkdir :clips
+    mpremote cp clips/rainbow.wclip :clips/rainbow.wclip
+"""
+
+import argparse
+import os
+import random
+import struct
+import sys
+import tempfile
+
+# Share the firmware's animation and clip code from ../src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from animations import AnimationLibrary, get_pattern_names
+from clip_player import (CLIP_MAGIC, CLIP_VERSION, CLIP_EXTENSION, FLAG_DELTA,
+                         HEADER_FORMAT, ClipPlayer)
+
+
+# =============================================================================
+# Configuration
+# =============================================================================
+DEFAULT_FPS = 20
+MAX_PERIOD = 2000          # Longest period searched for automatically
+MAX_FRAMES = 0xFFFF        # frame_count is a u16 in the header
+
+
+# =============================================================================
+# Rendering
+# =============================================================================
+def render_frames(pattern: str, leds: int, color: tuple, params: dict,
+                  frames: int, seed: int = 1) -> list:
+    """Render frames with the reference AnimationLibrary.
+
+    Args:
+        pattern: Pattern name
+        leds: LED count
+        color: (r, g, b) base color
+        params: Keyword arguments for the pattern method
+        frames: Number of frames to render
+        seed: Random seed for the random patterns
+
+    Returns:
+        List of GRB frames (bytes), frame 0 first
+    """
+    random.seed(seed)
+    anim = AnimationLibrary(leds)
+    anim.set_color(*color)
+    render = getattr(anim, "_render_" + pattern)
+    result = []
+    for _ in range(frames):
+        render(**params)
+        result.append(bytes(anim.buf))
+    return result
+
+
+def _close(a: bytes, b: bytes, tolerance: int) -> bool:
+    if a == b:
+        return True
+    return tolerance > 0 and max(abs(x - y) for x, y in zip(a, b)) <= tolerance
+
+
+def find_period(frames: list, tolerance: int = 0) -> int:
+    """Smallest period P such that the frames repeat every P frames.
+
+    Args:
+        frames: Rendered frames
+        tolerance: Largest per-channel difference still counted as a repeat
+                   (float patterns such as rainbow drift by one step)
+
+    Returns:
+        The period, or 0 if the frames do not repeat within half their length
+    """
+    total = len(frames)
+    for period in range(1, total // 2 + 1):
+        if all(_close(frames[i], frames[i - period], tolerance)
+               for i in range(period, total)):
+            return period
+    return 0
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+def encode_delta(frames: list) -> bytes:
+    """Keyframe plus one delta per frame (the last delta wraps to frame 0)."""
+    leds = len(frames[0]) // 3
+    out = bytearray(frames[0])
+    for k in range(len(frames)):
+        current = frames[k]
+        following = frames[(k + 1) % len(frames)]
+        records = bytearray()
+        count = 0
+        for i in range(leds):
+            j = i * 3
+            if current[j:j + 3] != following[j:j + 3]:
+                records += struct.pack("<HBBB", i, *following[j:j + 3])
+                count += 1
+        out += struct.pack("<H", count)
+        out += records
+    return bytes(out)
+
+
+def build_clip(frames: list, fps: int, encoding: str = "auto") -> bytes:
+    """Build a complete clip file.
+
+    Args:
+        frames: GRB frames of equal length
+        fps: Playback rate stored in the header
+        encoding: "raw", "delta" or "auto" (whichever is smaller)
+
+    Returns:
+        The clip file contents
+    """
+    leds = len(frames[0]) // 3
+    raw = b"".join(frames)
+    body, flags = raw, 0
+    if encoding != "raw":
+        delta = encode_delta(frames)
+        if encoding == "delta" or len(delta) < len(raw):
+            body, flags = delta, FLAG_DELTA
+    header = struct.pack(HEADER_FORMAT, CLIP_MAGIC, CLIP_VERSION, flags,
+                         leds, len(frames), fps, 0)
+    return header + body
+
+
+def verify_clip(path: str, frames: list) -> bool:
+    """Play a clip back with the firmware player and compare every frame.
+
+    Runs through the clip twice to cover the wrap-around delta.
+    """
+    player = ClipPlayer(path)
+    buf = bytearray(len(frames[0]))
+    try:
+        for n in range(len(frames) * 2):
+            if player.show(buf, n) != frames[n % len(frames)]:
+                print(f"❌ Frame {n % len(frames)} differs")
+                return False
+    finally:
+        player.close()
+    return True
+
+
+# =============================================================================
+# Command Line
+# =============================================================================
+def _parse_color(text: str) -> tuple:
+    parts = [int(p) for p in text.split(",")]
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("color must be R,G,B")
+    return tuple(max(0, min(255, p)) for p in parts)
+
+
+def _parse_params(items: list) -> dict:
+    params = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        params[key] = float(value) if "." in value else int(value)
+    return params
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build Pico Whale animation clips")
+    parser.add_argument("pattern", choices=get_pattern_names(), help="Pattern to render")
+    parser.add_argument("--leds", type=int, default=12, help="LED count (default: %(default)s)")
+    parser.add_argument("--color", type=_parse_color, default=(255, 100, 200),
+                        help="Base color as R,G,B (default: 255,100,200)")
+    parser.add_argument("--param", action="append", default=[], metavar="NAME=VALUE",
+                        help="Pattern parameter, e.g. speed=2.0 (repeatable)")
+    parser.add_argument("--frames", type=int,
+                        help="Clip length in frames (default: one detected period)")
+    parser.add_argument("--fps", type=int, default=DEFAULT_FPS,
+                        help="Playback rate stored in the clip (default: %(default)s)")
+    parser.add_argument("--encoding", choices=["auto", "raw", "delta"], default="auto",
+                        help="Frame encoding (default: smaller of raw and delta)")
+    parser.add_argument("--tolerance", type=int, default=1,
+                        help="Per-channel difference allowed when detecting the period")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for random patterns")
+    parser.add_argument("--output", "-o",
+                        help="Output file (default: clips/<pattern>.wclip)")
+    parser.add_argument("--verify", action="store_true",
+                        help="Play the clip back and compare with the renderer")
+    args = parser.parse_args()
+
+    params = _parse_params(args.param)
+    if args.frames:
+        count = args.frames
+    else:
+        probe = render_frames(args.pattern, args.leds, args.color, params,
+                              MAX_PERIOD * 2, args.seed)
+        count = find_period(probe, args.tolerance)
+        if not count:
+            sys.exit(f"❌ No period within {MAX_PERIOD} frames for '{args.pattern}'; "
+                     "pass --frames to set the clip length")
+    if not 0 < count <= MAX_FRAMES:
+        sys.exit(f"❌ Frame count must be 1 - {MAX_FRAMES}")
+
+    frames = render_frames(args.pattern, args.leds, args.color, params, count, args.seed)
+    clip = build_clip(frames, args.fps, args.encoding)
+
+    output = args.output or os.path.join("clips", args.pattern + CLIP_EXTENSION)
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    # Write atomically so a failed verify never leaves a half-written clip
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(output) or ".")
+    with os.fdopen(fd, "wb") as f:
+        f.write(clip)
+    if args.verify and not verify_clip(tmp, frames):
+        os.remove(tmp)
+        sys.exit(1)
+    os.replace(tmp, output)
+
+    raw_size = count * args.leds * 3
+    encoding = "delta" if clip[5] & FLAG_DELTA else "raw"
+    print(f"✅ {output}: {count} frames ({count / args.fps:.1f}s at {args.fps} fps), "
+          f"{encoding}, {len(clip)} bytes ({len(clip) * 100 // raw_size}% of raw)")
+
+
+if __name__ == "__main__":
+    main()
@@ -10,8 +10,11 @@ Requirements:
 
 Usage:
     python desktop_simulator.py
+    python desktop_simulator.py --broker localhost   # Local broker (tools/mqtt_broker.py)
 """
 
+import os
+import sys
 import tkinter as tk
 from tkinter import ttk, colorchooser
 import threading
@@ -29,6 +32,10 @@ except ImportError:
     print("⚠️  paho-mqtt not installed. Run: pip install paho-mqtt")
     print("   Running in offline demo mode...")
 
+# Share the firmware's animation timing code from ../src
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from animations import AnimationClock
+
 
 # =============================================================================
 # Configuration
@@ -55,17 +62,22 @@ COLOR_ACCENT = "#00D4FF"
 # Animation Engine
 # =============================================================================
 class AnimationEngine:
-    """Handles LED ring animations."""
+    """Handles LED ring animations.
+    
+    Patterns are evaluated at the time of the current AnimationClock frame,
+    so animation speed does not depend on how often the UI loop runs.
+    """
     
-    def __init__(self, num_leds=12):
+    def __init__(self, num_leds=12, clock=None):
         self.num_leds = num_leds
         self.current_pattern = "idle"
         self.base_color = (255, 100, 200)  # Pink/purple
         self.brightness = 1.0
-        self.animation_offset = 0
+        self.clock = clock or AnimationClock(fps=20)
         
     def get_led_colors(self) -> list:
         """Get current color for each LED based on pattern."""
+        self.clock.update()
         if self.current_pattern == "idle":
             return self._pattern_idle()
         elif self.current_pattern == "pulse":
@@ -96,7 +108,7 @@ class AnimationEngine:
     
     def _pattern_pulse(self) -> list:
         """Pulsing brightness."""
-        t = time.time() * 3
+        t = self.clock.seconds() * 3
         brightness = 0.3 + 0.7 * abs(math.sin(t))
         r = int(self.base_color[0] * brightness)
         g = int(self.base_color[1] * brightness)
@@ -106,18 +118,18 @@ class AnimationEngine:
     def _pattern_rainbow(self) -> list:
         """Rainbow cycle around ring."""
         colors = []
+        offset = (self.clock.frame * 0.01) % 1.0
         for i in range(self.num_leds):
-            hue = (i / self.num_leds + self.animation_offset) % 1.0
+            hue = (i / self.num_leds + offset) % 1.0
             r, g, b = self._hsv_to_rgb(hue, 1.0, 1.0)
             colors.append((int(r * 255), int(g * 255), int(b * 255)))
-        self.animation_offset = (self.animation_offset + 0.01) % 1.0
         return colors
     
     def _pattern_wave(self) -> list:
         """Wave pattern around ring."""
         colors = []
         for i in range(self.num_leds):
-            offset = (i / self.num_leds * 2 * math.pi) + (time.time() * 3)
+            offset = (i / self.num_leds * 2 * math.pi) + (self.clock.seconds() * 3)
             brightness = 0.3 + 0.7 * (math.sin(offset) + 1) / 2
             r = int(self.base_color[0] * brightness)
             g = int(self.base_color[1] * brightness)
@@ -140,7 +152,7 @@ class AnimationEngine:
     
     def _pattern_breathing(self) -> list:
         """Slow breathing glow."""
-        t = time.time() * 0.5
+        t = self.clock.seconds() * 0.5
         # Smooth breathing curve
         brightness = (math.exp(math.sin(t)) - 0.36787944) / 2.35040238
         r = int(self.base_color[0] * brightness)
@@ -559,6 +571,15 @@ class PicoWhaleSimulator:
 # Entry Point
 # =============================================================================
 if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Pico Whale desktop simulator")
+    parser.add_argument("--broker", "-b", default=MQTT_BROKER,
+                        help=f"MQTT broker address (default: {MQTT_BROKER})")
+    parser.add_argument("--port", type=int, default=MQTT_PORT,
+                        help=f"MQTT broker port (default: {MQTT_PORT})")
+    args = parser.parse_args()
+    MQTT_BROKER, MQTT_PORT = args.broker, args.port
+    
     print("=" * 50)
     print("  🐋 PICO WHALE DESKTOP SIMULATOR")
     print("=" * 50)
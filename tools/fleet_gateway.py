@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+🐋 Whale Fleet Gateway
+=======================
+An asyncio service that listens to the heartbeats of every whale pair on
+the broker, tracks which whales are online, and publishes each pair's
+status (retained) on its status topic, pico_whale/<pair>/status.
+
+A whale counts as offline once no heartbeat has arrived for
+--offline-after seconds (default three 30-second heartbeat intervals).
+Expiry deadlines live in a hierarchical timing wheel, so a heartbeat
+(re)schedules its whale's deadline in O(1) and each tick only looks at
+the whales that actually expire then, however large the fleet is.
+
+Whales send most heartbeats as deltas (only what changed since their last
+keyframe) with a full keyframe every few intervals; the gateway keeps
+each whale's keyframe and rebuilds its full heartbeat (see snapshot()).
+A delta on a keyframe the gateway missed is counted in missed_deltas and
+only refreshes liveness until the next keyframe.
+
+Status messages look like:
+    {"online": 2, "offline": 0, "devices": {"whale_1": {"online": true,
+     "last_seen": 1700000000, "uptime": 1234, ...}, ...}}
+
+Usage:
+    python fleet_gateway.py                            # Run against the default broker
+    python fleet_gateway.py --broker localhost --offline-after 60
+    python fleet_gateway.py --benchmark 50000          # Simulated fleet, no broker
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import wire
+from mqtt_protocol import AsyncMQTTClient, MQTTError
+from topic_router import PairRouter, TOPIC_PREFIX
+
+MQTT_BROKER = "broker.hivemq.com"
+MQTT_PORT = 1883
+HEARTBEAT_INTERVAL = 30              # Seconds, as in src/config.py
+OFFLINE_AFTER = 3 * HEARTBEAT_INTERVAL
+STATUS_INTERVAL = 5                  # Seconds between status flushes
+
+
+# =============================================================================
+# Hierarchical Timing Wheel
+# =============================================================================
+
+class TimingWheel:
+    """
+    Timer wheel with `levels` wheels of 2**bits slots each.
+
+    Level 0 slots are one tick wide, level 1 slots 2**bits ticks, and so
+    on. A key is filed under the level whose span covers its deadline;
+    whenever a lower wheel wraps, the next slot of the wheel above is
+    cascaded down. schedule(), cancel() and the per-key part of advance()
+    are O(1). Deadlines beyond the top wheel's span are parked in its last
+    slot and re-filed when they cascade.
+
+    Usage:
+        wheel = TimingWheel(tick=1.0, now=time.monotonic())
+        wheel.schedule("whale_1", time.monotonic() + 90)
+        for key in wheel.advance(time.monotonic()):
+            ...                                  # key expired
+    """
+
+    def __init__(self, tick: float = 1.0, bits: int = 6, levels: int = 4, now: float = 0.0):
+        """Initialize the wheel.
+
+        Args:
+            tick: Resolution in seconds
+            bits: log2 of the slots per wheel
+            levels: Number of wheels (at least 2)
+            now: Current time
+
+        Raises:
+            ValueError: If levels is below 2 (a single wheel cannot park
+                deadlines beyond its span)
+        """
+        if levels < 2:
+            raise ValueError("TimingWheel needs at least 2 levels")
+        self.tick = tick
+        self.bits = bits
+        self.levels = levels
+        self.mask = (1 << bits) - 1
+        self.current = int(now / tick)
+        self._wheels = [[set() for _ in range(1 << bits)] for _ in range(levels)]
+        self._where = {}        # key -> (slot set, expiry tick)
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def __contains__(self, key) -> bool:
+        return key in self._where
+
+    def schedule(self, key, when: float):
+        """(Re)schedule key to expire at time `when`."""
+        expires = max(int(when / self.tick + 0.999999), self.current + 1)
+        entry = self._where.get(key)
+        if entry is not None:
+            entry[0].discard(key)
+        self._file(key, expires)
+
+    def cancel(self, key) -> bool:
+        """Forget a key; returns False if it was not scheduled."""
+        entry = self._where.pop(key, None)
+        if entry is None:
+            return False
+        entry[0].discard(key)
+        return True
+
+    def _file(self, key, expires: int):
+        delta = expires - self.current
+        bits = self.bits
+        level = 0
+        while level < self.levels - 1 and delta >= 1 << (bits * (level + 1)):
+            level += 1
+        if delta >= 1 << (bits * (level + 1)):
+            # Beyond the top wheel: park in the slot just before this one
+            slot = ((self.current >> (bits * level)) - 1) & self.mask
+        else:
+            slot = (expires >> (bits * level)) & self.mask
+        bucket = self._wheels[level][slot]
+        bucket.add(key)
+        self._where[key] = (bucket, expires)
+
+    def advance(self, now: float) -> list:
+        """Move the wheel to `now`; returns the keys that expired."""
+        target = int(now / self.tick)
+        expired = []
+        bits, mask = self.bits, self.mask
+        while self.current < target:
+            self.current += 1
+            # Cascade every wheel whose lower neighbour just wrapped
+            level = 1
+            while level < self.levels and not (self.current >> (bits * (level - 1))) & mask:
+                self._cascade(level)
+                level += 1
+            bucket = self._wheels[0][self.current & mask]
+            if bucket:
+                where = self._where
+                for key in bucket:
+                    del where[key]
+                expired.extend(bucket)
+                bucket.clear()
+        return expired
+
+    def _cascade(self, level: int):
+        bucket = self._wheels[level][(self.current >> (self.bits * level)) & self.mask]
+        if not bucket:
+            return
+        keys = list(bucket)
+        bucket.clear()
+        for key in keys:
+            self._file(key, self._where[key][1])
+
+
+# =============================================================================
+# Gateway
+# =============================================================================
+
+class FleetGateway:
+    """
+    Liveness tracking for every whale that sends heartbeats.
+
+    Feed heartbeats to on_heartbeat() (it has the PairRouter handler
+    signature) and call tick() about once a second. Pairs whose status
+    changed are published by flush() through the publish(topic, payload)
+    callable. The latest full heartbeat of each whale, rebuilt from
+    keyframes and deltas, is available from snapshot().
+    """
+
+    def __init__(self, publish, offline_after: float = OFFLINE_AFTER, clock=time.time):
+        """Initialize the gateway.
+
+        Args:
+            publish: publish(topic, payload) for status messages (retained)
+            offline_after: Seconds without a heartbeat before a whale is offline
+            clock: Time source (replaced by the benchmark)
+        """
+        self.publish = publish
+        self.offline_after = offline_after
+        self.clock = clock
+        self.wheel = TimingWheel(1.0, now=clock())
+        self.pairs = {}            # pair -> {device: state dict}
+        self.online = 0
+        self.dirty = set()
+        self.keyframes = {}        # (pair, device) -> last keyframe
+        self.snapshots = {}        # (pair, device) -> full heartbeat
+        self.heartbeats = 0
+        self.bad_messages = 0
+        self.missed_deltas = 0
+
+    def on_heartbeat(self, pair_id: str, kind: str, payload: bytes):
+        """Record a heartbeat from a whale of a pair.
+
+        A heartbeat with "status": "offline" (sent by a whale shutting
+        down) marks the whale offline at once.
+        """
+        try:
+            heartbeat = wire.decode_heartbeat(payload)
+            device = heartbeat["device"]
+        except (ValueError, KeyError, TypeError):
+            self.bad_messages += 1
+            return
+        if not isinstance(device, str):
+            self.bad_messages += 1
+            return
+        now = self.clock()
+        self.heartbeats += 1
+        devices = self.pairs.get(pair_id)
+        if devices is None:
+            devices = self.pairs[pair_id] = {}
+        state = devices.get(device)
+        if state is None:
+            state = devices[device] = {"online": False}
+        if heartbeat.get("status") == "offline":
+            if state["online"]:
+                state["online"] = False
+                self.online -= 1
+                self.dirty.add(pair_id)
+            state["last_seen"] = int(now)
+            self.wheel.cancel((pair_id, device))
+            return
+        if not state["online"]:
+            state["online"] = True
+            self.online += 1
+            self.dirty.add(pair_id)
+        state["last_seen"] = int(now)
+        key = (pair_id, device)
+        full = wire.apply_heartbeat(self.keyframes.get(key), heartbeat)
+        if full is None:
+            self.missed_deltas += 1
+            full = heartbeat
+        else:
+            if "base" not in heartbeat:
+                self.keyframes[key] = heartbeat
+            self.snapshots[key] = full
+        state["uptime"] = full.get("uptime")
+        state["proto"] = full.get("proto", 0)
+        self.wheel.schedule((pair_id, device), now + self.offline_after)
+
+    def tick(self) -> int:
+        """Mark whales whose deadline passed as offline; returns how many."""
+        expired = self.wheel.advance(self.clock())
+        for pair_id, device in expired:
+            state = self.pairs[pair_id][device]
+            if state["online"]:
+                state["online"] = False
+                self.online -= 1
+                self.dirty.add(pair_id)
+        return len(expired)
+
+    def status(self, pair_id: str) -> dict:
+        """Aggregated status of one pair."""
+        devices = self.pairs.get(pair_id, {})
+        online = sum(1 for state in devices.values() if state["online"])
+        return {"online": online, "offline": len(devices) - online, "devices": devices}
+
+    def flush(self) -> int:
+        """Publish the status of every pair that changed; returns how many."""
+        dirty, self.dirty = self.dirty, set()
+        for pair_id in dirty:
+            self.publish(f"{TOPIC_PREFIX}/{pair_id}/status",
+                         json.dumps(self.status(pair_id)).encode())
+        return len(dirty)
+
+    def snapshot(self, pair_id: str, device: str):
+        """Latest full heartbeat of a whale, or None if none rebuilt yet."""
+        return self.snapshots.get((pair_id, device))
+
+    def devices(self) -> int:
+        """Number of whales ever seen."""
+        return sum(len(devices) for devices in self.pairs.values())
+
+
+async def run_gateway(broker: str, port: int, offline_after: float):
+    """Run the gateway, reconnecting with backoff, until Ctrl+C."""
+    client = None
+
+    def publish(topic, payload):
+        if client and client.writer and not client.writer.is_closing():
+            client.publish(topic, payload, retain=True)
+
+    gateway = FleetGateway(publish, offline_after)
+    router = PairRouter(kinds=("heartbeat",))
+    router.default = gateway.on_heartbeat
+
+    async def housekeeping():
+        last_flush = 0
+        while True:
+            await asyncio.sleep(1)
+            gone = gateway.tick()
+            if gone:
+                print(f"⚠️  {gone} whale(s) went quiet")
+            if time.time() - last_flush >= STATUS_INTERVAL:
+                last_flush = time.time()
+                if gateway.flush():
+                    print(f"📡 {gateway.online}/{gateway.devices()} whales online "
+                          f"in {len(gateway.pairs)} pair(s)")
+
+    keeper = asyncio.ensure_future(housekeeping())
+    delay = 1
+    try:
+        while True:
+            client = AsyncMQTTClient(f"fleet_gateway_{int(time.time())}",
+                                     on_message=router.route)
+            try:
+                await client.connect(broker, port)
+                await client.subscribe(router.subscriptions())
+                print(f"✅ Connected to {broker}:{port}; tracking heartbeats")
+                delay = 1
+                # Whales stay tracked across reconnects; republish everything
+                gateway.dirty.update(gateway.pairs)
+                await client.run()
+                print("❌ Connection lost")
+            except (OSError, MQTTError, asyncio.TimeoutError) as e:
+                print(f"❌ {e}")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+    finally:
+        keeper.cancel()
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def run_benchmark(devices: int, minutes: int = 10):
+    """Simulate a fleet on a fake clock and measure the gateway's CPU cost.
+
+    Every whale heartbeats every HEARTBEAT_INTERVAL seconds (half of them
+    in the binary encoding), 1% stop halfway through, and the gateway
+    ticks once per simulated second. Reports the CPU time against the
+    simulated time.
+    """
+    now = [0.0]
+    published = [0]
+
+    def publish(topic, payload):
+        published[0] += 1
+
+    gateway = FleetGateway(publish, OFFLINE_AFTER, clock=lambda: now[0])
+    router = PairRouter(kinds=("heartbeat",))
+    router.default = gateway.on_heartbeat
+
+    # Two whales per pair; payloads are prebuilt, the gateway still decodes each one
+    random.seed(1)
+    whales = []
+    for i in range(devices):
+        pair, device = f"pair_{i // 2}", f"whale_{i % 2 + 1}"
+        status = {"device": device, "uptime": 0, "touch_count": 0, "received_count": 0,
+                  "reconnects": 0, "connect_ms": 0, "busy_pct": 1.5,
+                  "queued_touches": 0, "pattern": "pulse"}
+        if i % 2:
+            payload = wire.encode_heartbeat(status)
+        else:
+            payload = json.dumps(dict(status, status="online", proto=1)).encode()
+        whales.append((f"{TOPIC_PREFIX}/{pair}/heartbeat", payload,
+                       random.randrange(HEARTBEAT_INTERVAL)))
+    by_second = [[] for _ in range(HEARTBEAT_INTERVAL)]
+    for topic, payload, phase in whales:
+        by_second[phase].append((topic, payload))
+    quitters = set(range(0, devices, 100))
+
+    seconds = minutes * 60
+    cpu = time.process_time()
+    worst = 0.0
+    for second in range(seconds):
+        now[0] = float(second)
+        start = time.process_time()
+        batch = by_second[second % HEARTBEAT_INTERVAL]
+        for index, (topic, payload) in enumerate(batch):
+            if second >= seconds // 2 and index % 100 == 0:
+                continue          # Roughly 1% of whales go silent halfway
+            router.route(topic, payload)
+        gateway.tick()
+        if second % STATUS_INTERVAL == 0:
+            gateway.flush()
+        worst = max(worst, time.process_time() - start)
+    cpu = time.process_time() - cpu
+
+    rate = gateway.heartbeats / seconds
+    print(f"🐋 {devices} whales, {seconds}s simulated, {gateway.heartbeats} heartbeats "
+          f"({rate:.0f}/s), {published[0]} status messages")
+    print(f"   CPU: {cpu:.2f}s total = {cpu * 100 / seconds:.1f}% of one core, "
+          f"{cpu * 1e6 / gateway.heartbeats:.1f} us/heartbeat, worst second {worst * 1000:.1f} ms")
+    print(f"   Online at end: {gateway.online}/{gateway.devices()} "
+          f"(~{len(quitters)} expected offline)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Track whale liveness for every pair")
+    parser.add_argument("--broker", "-b", default=MQTT_BROKER,
+                        help=f"MQTT broker address (default: {MQTT_BROKER})")
+    parser.add_argument("--port", type=int, default=MQTT_PORT,
+                        help="MQTT broker port (default: %(default)s)")
+    parser.add_argument("--offline-after", type=float, default=OFFLINE_AFTER,
+                        help="Seconds without a heartbeat before a whale is offline "
+                             "(default: %(default)s)")
+    parser.add_argument("--benchmark", type=int, metavar="DEVICES",
+                        help="Simulate DEVICES whales on a fake clock (no broker)")
+    parser.add_argument("--minutes", type=int, default=10,
+                        help="Simulated minutes for --benchmark (default: %(default)s)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.benchmark, args.minutes)
+        return
+    try:
+        asyncio.run(run_gateway(args.broker, args.port, args.offline_after))
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+🐋 Local MQTT Broker
+=====================
+A small pure-Python MQTT 3.1.1 broker for tests and load runs, so nothing
+has to go through test.mosquitto.org or broker.hivemq.com and timings are
+repeatable. Supports QoS 0 and 1, retained messages, + and # wildcards,
+persistent sessions (clean_session off, as the firmware uses), last will
+and keepalive.
+
+Instrumentation: per-topic message/byte counts and per-client queue depth
+(bytes waiting in the socket buffer plus unacknowledged QoS 1 messages)
+are kept in broker.stats, and extra hooks can be registered with
+broker.add_hook().
+
+Usage:
+    python mqtt_broker.py                  # Listen on 0.0.0.0:1883
+    python mqtt_broker.py --port 1884 --stats 10
+
+    # Embedded in asyncio code (port 0 picks a free port)
+    broker = Broker(port=0)
+    await broker.start()
+    ... connect to ("127.0.0.1", broker.port) ...
+    await broker.stop()
+
+    # Embedded in threaded code (e.g. paho-mqtt tests)
+    with BrokerThread() as broker:
+        client.connect("127.0.0.1", broker.port)
+
+Then point the whales at it with MQTT_BROKER = "<this PC's IP>" in
+src/config.py, and the tools with --broker localhost.
+"""
+
+import argparse
+import asyncio
+import struct
+import threading
+import time
+
+from mqtt_protocol import (
+    CONNECT, CONNACK, PUBLISH, PUBACK, SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK,
+    PINGREQ, DISCONNECT, PINGRESP_PACKET, MQTTError,
+    packet, publish_packet, ack_packet, read_packet, decode_string, parse_publish,
+)
+from topic_router import TopicTrie
+
+MAX_INFLIGHT = 1000             # Unacknowledged QoS 1 messages kept per client
+MAX_WRITE_BUFFER = 1 << 20      # QoS 0 messages to a client this far behind are dropped
+CONNECT_TIMEOUT = 10            # Seconds to wait for CONNECT
+
+# CONNACK return codes
+ACCEPTED = 0
+REFUSED_PROTOCOL = 1
+REFUSED_IDENTIFIER = 2
+
+
+class _Subscription:
+    """One filter of one session (the value stored in the topic trie)."""
+    __slots__ = ("session", "qos")
+
+    def __init__(self, session, qos: int):
+        self.session = session
+        self.qos = qos
+
+
+class Session:
+    """Subscriptions and in-flight messages of one client ID."""
+
+    def __init__(self, client_id: str, clean: bool):
+        self.client_id = client_id
+        self.clean = clean
+        self.subscriptions = {}         # filter -> _Subscription
+        self.inflight = {}              # packet id -> (topic, payload, retain), in send order
+        self.writer = None
+        self.dropped = 0
+        self._packet_id = 0
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    def queue_depth(self) -> tuple:
+        """(bytes waiting in the socket buffer, unacknowledged QoS 1 messages)."""
+        buffered = 0
+        if self.writer is not None:
+            buffered = self.writer.transport.get_write_buffer_size()
+        return buffered, len(self.inflight)
+
+    def send(self, topic: str, payload: bytes, qos: int, retain: bool = False):
+        """Deliver a message (QoS 1 is kept until acknowledged)."""
+        writer = self.writer
+        if qos == 0:
+            if writer is None or writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+                self.dropped += 1
+                return
+            writer.write(publish_packet(topic, payload, 0, retain))
+            return
+        if len(self.inflight) >= MAX_INFLIGHT:
+            del self.inflight[next(iter(self.inflight))]
+            self.dropped += 1
+        self._packet_id = self._packet_id % 0xFFFF + 1
+        while self._packet_id in self.inflight:
+            self._packet_id = self._packet_id % 0xFFFF + 1
+        self.inflight[self._packet_id] = (topic, payload, retain)
+        if writer is not None:
+            writer.write(publish_packet(topic, payload, 1, retain, self._packet_id))
+
+    def resend(self):
+        """Send unacknowledged messages again after a reconnect."""
+        for packet_id, (topic, payload, retain) in self.inflight.items():
+            self.writer.write(publish_packet(topic, payload, 1, retain, packet_id, dup=True))
+
+
+class BrokerStats:
+    """
+    Per-topic throughput and per-client queue depth.
+
+    topics maps each topic to [messages in, bytes in, deliveries out].
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.topics = {}
+        self.max_depth = {}             # client id -> (max bytes, max inflight)
+        self.connections = 0
+
+    def __call__(self, session, topic: str, payload: bytes, deliveries: int):
+        counts = self.topics.get(topic)
+        if counts is None:
+            counts = self.topics[topic] = [0, 0, 0]
+        counts[0] += 1
+        counts[1] += len(payload)
+        counts[2] += deliveries
+
+    def note_depth(self, session):
+        """Record a session's queue depth right after a delivery."""
+        buffered, inflight = session.queue_depth()
+        peak = self.max_depth.get(session.client_id, (0, 0))
+        if buffered > peak[0] or inflight > peak[1]:
+            self.max_depth[session.client_id] = (max(buffered, peak[0]),
+                                                 max(inflight, peak[1]))
+
+    def report(self, top: int = 10, reset: bool = True) -> str:
+        """Text summary of the busiest topics and deepest queues."""
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        lines = [f"{'topic':<50} {'msg/s':>9} {'KB/s':>8} {'out/s':>9}"]
+        busiest = sorted(self.topics.items(), key=lambda item: -item[1][0])[:top]
+        for topic, (count, size, out) in busiest:
+            lines.append(f"{topic[:50]:<50} {count / elapsed:9.1f} "
+                         f"{size / elapsed / 1024:8.1f} {out / elapsed:9.1f}")
+        deepest = sorted(self.max_depth.items(), key=lambda item: -item[1][0])[:top]
+        for client_id, (buffered, inflight) in deepest:
+            lines.append(f"  queue {client_id}: max {buffered} bytes, {inflight} unacked")
+        if reset:
+            self.started = time.monotonic()
+            self.topics = {}
+            self.max_depth = {}
+        return "\n".join(lines)
+
+
+class Broker:
+    """
+    Embeddable asyncio MQTT 3.1.1 broker.
+
+    Hooks are called as hook(session, topic, payload, deliveries) for every
+    PUBLISH received; broker.stats is always the first one.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 1883):
+        self.host = host
+        self.port = port
+        self.sessions = {}
+        self.retained = {}
+        self.trie = TopicTrie()
+        self.stats = BrokerStats()
+        self.hooks = [self.stats]
+        self._server = None
+        self._connections = {}          # writer -> handler task
+
+    def add_hook(self, hook):
+        """Call hook(session, topic, payload, deliveries) for every PUBLISH."""
+        self.hooks.append(hook)
+
+    async def start(self):
+        """Start listening; self.port is the real port afterwards."""
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Close the listener and every connection."""
+        if self._server:
+            self._server.close()
+        handlers = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        # Closed sockets end their handlers at the next read
+        await asyncio.gather(*handlers, return_exceptions=True)
+        if self._server:
+            await self._server.wait_closed()
+            self._server = None
+
+    async def serve_forever(self):
+        """Start and run until cancelled."""
+        await self.start()
+        await self._server.serve_forever()
+
+    # =========================================================================
+    # Routing
+    # =========================================================================
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False,
+                sender=None) -> int:
+        """Deliver a message to every matching subscriber; returns how many."""
+        if retain:
+            if payload:
+                self.retained[topic] = (payload, qos)
+            else:
+                self.retained.pop(topic, None)
+        # A session matching several filters gets one copy at the highest QoS
+        best = {}
+        for sub in self.trie.match(topic):
+            if sub.qos >= best.get(sub.session, -1):
+                best[sub.session] = sub.qos
+        stats = self.stats
+        for session, sub_qos in best.items():
+            session.send(topic, payload, min(qos, sub_qos))
+            stats.note_depth(session)
+        for hook in self.hooks:
+            hook(sender, topic, payload, len(best))
+        return len(best)
+
+    def _subscribe(self, session: Session, topic_filter: str, qos: int):
+        old = session.subscriptions.get(topic_filter)
+        if old is not None:
+            self.trie.remove(topic_filter, old)
+        sub = session.subscriptions[topic_filter] = _Subscription(session, qos)
+        self.trie.add(topic_filter, sub)
+        # Retained messages for the new filter
+        probe = TopicTrie()
+        probe.add(topic_filter, sub)
+        for topic, (payload, retained_qos) in list(self.retained.items()):
+            if probe.match(topic):
+                session.send(topic, payload, min(qos, retained_qos), retain=True)
+
+    def _unsubscribe(self, session: Session, topic_filter: str):
+        sub = session.subscriptions.pop(topic_filter, None)
+        if sub is not None:
+            self.trie.remove(topic_filter, sub)
+
+    def _discard(self, session: Session):
+        for topic_filter in list(session.subscriptions):
+            self._unsubscribe(session, topic_filter)
+        if self.sessions.get(session.client_id) is session:
+            del self.sessions[session.client_id]
+
+    # =========================================================================
+    # Connections
+    # =========================================================================
+
+    async def _handle(self, reader, writer):
+        self._connections[writer] = asyncio.current_task()
+        session = None
+        will = None
+        try:
+            packet_type, _, body = await asyncio.wait_for(read_packet(reader), CONNECT_TIMEOUT)
+            if packet_type != CONNECT:
+                return
+            client_id, clean, keepalive, will, code = self._parse_connect(body)
+            if code != ACCEPTED:
+                writer.write(packet(CONNACK, bytes((0, code))))
+                return
+
+            session = self.sessions.get(client_id)
+            if session is not None and session.connected:
+                # Same client ID again: the newer connection takes over
+                session.writer.close()
+                session.writer = None
+            present = session is not None and not clean
+            if session is None or clean:
+                if session is not None:
+                    self._discard(session)
+                session = self.sessions[client_id] = Session(client_id, clean)
+            session.clean = clean
+            session.writer = writer
+            self.stats.connections += 1
+            writer.write(packet(CONNACK, bytes((int(present), ACCEPTED))))
+            session.resend()
+
+            # The client must send something within 1.5 keepalive periods
+            timeout = keepalive * 1.5 if keepalive else None
+            while True:
+                packet_type, flags, body = await asyncio.wait_for(read_packet(reader), timeout)
+                if packet_type == PUBLISH:
+                    topic, payload, qos, retain, packet_id = parse_publish(flags, body)
+                    if "+" in topic or "#" in topic:
+                        raise MQTTError("wildcard in PUBLISH topic")
+                    self.publish(topic, payload, min(qos, 1), retain, session)
+                    if qos:
+                        writer.write(ack_packet(PUBACK, packet_id))
+                elif packet_type == PUBACK:
+                    (packet_id,) = struct.unpack_from("!H", body)
+                    session.inflight.pop(packet_id, None)
+                elif packet_type == SUBSCRIBE:
+                    packet_id, offset = struct.unpack_from("!H", body)[0], 2
+                    requests = []
+                    while offset < len(body):
+                        topic_filter, offset = decode_string(body, offset)
+                        requests.append((topic_filter, min(body[offset], 1)))
+                        offset += 1
+                    # Acknowledge first so retained messages follow the SUBACK
+                    writer.write(packet(SUBACK, struct.pack("!H", packet_id) +
+                                        bytes(qos for _, qos in requests)))
+                    for topic_filter, qos in requests:
+                        self._subscribe(session, topic_filter, qos)
+                elif packet_type == UNSUBSCRIBE:
+                    packet_id, offset = struct.unpack_from("!H", body)[0], 2
+                    while offset < len(body):
+                        topic_filter, offset = decode_string(body, offset)
+                        self._unsubscribe(session, topic_filter)
+                    writer.write(ack_packet(UNSUBACK, packet_id))
+                elif packet_type == PINGREQ:
+                    writer.write(PINGRESP_PACKET)
+                elif packet_type == DISCONNECT:
+                    will = None
+                    return
+                else:
+                    raise MQTTError(f"unexpected packet type {packet_type}")
+        except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError,
+                MQTTError, struct.error, UnicodeDecodeError, IndexError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            if session is not None and session.writer is writer:
+                session.writer = None
+                if session.clean:
+                    self._discard(session)
+                if will is not None:
+                    self.publish(*will, sender=session)
+            writer.close()
+
+    def _parse_connect(self, body: bytes) -> tuple:
+        """Returns (client_id, clean, keepalive, will, return code)."""
+        name, offset = decode_string(body)
+        level, flags, keepalive = struct.unpack_from("!BBH", body, offset)
+        offset += 4
+        if (name, level) not in (("MQTT", 4), ("MQIsdp", 3)):
+            return "", True, 0, None, REFUSED_PROTOCOL
+        clean = bool(flags & 0x02)
+        client_id, offset = decode_string(body, offset)
+        if not client_id:
+            if not clean:
+                return "", clean, keepalive, None, REFUSED_IDENTIFIER
+            client_id = f"auto_{id(body):x}_{time.monotonic_ns()}"
+        will = None
+        if flags & 0x04:
+            will_topic, offset = decode_string(body, offset)
+            (n,) = struct.unpack_from("!H", body, offset)
+            will_payload = body[offset + 2:offset + 2 + n]
+            will = (will_topic, will_payload, min((flags >> 3) & 0x03, 1), bool(flags & 0x20))
+        # Username and password are accepted and ignored
+        return client_id, clean, keepalive, will, ACCEPTED
+
+
+class BrokerThread:
+    """
+    Runs a Broker on its own event loop in a background thread.
+
+    Usage:
+        with BrokerThread() as broker:
+            ... connect to ("127.0.0.1", broker.port) ...
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.broker = Broker(host, port)
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> Broker:
+        """Start the thread and wait until the broker is listening."""
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self.broker.start(), self.loop).result()
+        return self.broker
+
+    def stop(self):
+        """Stop the broker and the thread."""
+        asyncio.run_coroutine_threadsafe(self.broker.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join()
+        self.loop.close()
+
+    def __enter__(self) -> Broker:
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+async def _run(host: str, port: int, stats_interval: float):
+    """Run a broker, printing stats every stats_interval seconds."""
+    broker = Broker(host, port)
+    await broker.start()
+    print(f"🐋 MQTT broker listening on {host}:{broker.port}")
+    try:
+        while True:
+            await asyncio.sleep(stats_interval or 3600)
+            if stats_interval and broker.stats.topics:
+                connected = sum(1 for s in broker.sessions.values() if s.connected)
+                print(f"\n📊 {connected} client(s), {len(broker.retained)} retained")
+                print(broker.stats.report())
+    finally:
+        await broker.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local MQTT 3.1.1 broker for testing")
+    parser.add_argument("--host", default="0.0.0.0",
+                        help="Address to listen on (default: %(default)s)")
+    parser.add_argument("--port", "-p", type=int, default=1883,
+                        help="Port to listen on (default: %(default)s)")
+    parser.add_argument("--stats", type=float, default=0, metavar="SECONDS",
+                        help="Print throughput and queue depth every SECONDS")
+    args = parser.parse_args()
+    try:
+        asyncio.run(_run(args.host, args.port, args.stats))
+    except KeyboardInterrupt:
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+🐋 Minimal asyncio MQTT 3.1.1
+==============================
+Just enough of MQTT 3.1.1 for the host-side services (the fleet gateway)
+to run on one asyncio event loop: packet encoding/decoding and a small
+client with QoS 0/1 publish, subscribe and keepalive. No third-party
+packages needed.
+
+Usage:
+    client = AsyncMQTTClient("gateway", on_message=handle)
+    await client.connect("broker.hivemq.com", 1883)
+    await client.subscribe(["pico_whale/+/heartbeat"])
+    client.publish("pico_whale/pair/status", b"...", retain=True)
+    await client.run()             # Until the connection drops
+"""
+
+import asyncio
+import struct
+
+# Packet types
+CONNECT = 1
+CONNACK = 2
+PUBLISH = 3
+PUBACK = 4
+SUBSCRIBE = 8
+SUBACK = 9
+UNSUBSCRIBE = 10
+UNSUBACK = 11
+PINGREQ = 12
+PINGRESP = 13
+DISCONNECT = 14
+
+MAX_REMAINING_LENGTH = 268435455
+
+
+class MQTTError(Exception):
+    """Protocol violation or refused connection."""
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def encode_length(n: int) -> bytes:
+    """Variable-length 'remaining length' field."""
+    if not 0 <= n <= MAX_REMAINING_LENGTH:
+        raise MQTTError(f"packet too large: {n}")
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | 0x80 if n else byte)
+        if not n:
+            return bytes(out)
+
+
+def encode_string(s) -> bytes:
+    """Length-prefixed UTF-8 string."""
+    data = s.encode() if isinstance(s, str) else s
+    return struct.pack("!H", len(data)) + data
+
+
+def packet(packet_type: int, body: bytes = b"", flags: int = 0) -> bytes:
+    """Fixed header + body."""
+    return bytes((packet_type << 4 | flags,)) + encode_length(len(body)) + body
+
+
+def connect_packet(client_id: str, keepalive: int = 60, clean_session: bool = True) -> bytes:
+    """CONNECT without will or credentials."""
+    flags = 0x02 if clean_session else 0
+    body = encode_string("MQTT") + struct.pack("!BBH", 4, flags, keepalive) + encode_string(client_id)
+    return packet(CONNECT, body)
+
+
+def publish_packet(topic: str, payload: bytes, qos: int = 0, retain: bool = False,
+                   packet_id: int = 0, dup: bool = False) -> bytes:
+    """PUBLISH; packet_id is only used for QoS 1 and up."""
+    flags = (dup << 3) | (qos << 1) | retain
+    body = encode_string(topic)
+    if qos:
+        body += struct.pack("!H", packet_id)
+    return packet(PUBLISH, body + payload, flags)
+
+
+def subscribe_packet(packet_id: int, topics: list) -> bytes:
+    """SUBSCRIBE for [(filter, qos), ...]."""
+    body = struct.pack("!H", packet_id)
+    for topic, qos in topics:
+        body += encode_string(topic) + bytes((qos,))
+    return packet(SUBSCRIBE, body, 0x02)
+
+
+def ack_packet(packet_type: int, packet_id: int) -> bytes:
+    """PUBACK / UNSUBACK (and the like): just a packet ID."""
+    return packet(packet_type, struct.pack("!H", packet_id))
+
+
+PINGREQ_PACKET = packet(PINGREQ)
+PINGRESP_PACKET = packet(PINGRESP)
+DISCONNECT_PACKET = packet(DISCONNECT)
+
+
+# =============================================================================
+# Decoding
+# =============================================================================
+
+async def read_packet(reader: asyncio.StreamReader) -> tuple:
+    """Read one packet.
+
+    Returns:
+        (packet_type, flags, body)
+
+    Raises:
+        asyncio.IncompleteReadError: If the connection closed
+        MQTTError: If the length field is malformed
+    """
+    first = (await reader.readexactly(1))[0]
+    length = 0
+    for shift in (0, 7, 14, 21):
+        byte = (await reader.readexactly(1))[0]
+        length |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            break
+    else:
+        raise MQTTError("malformed remaining length")
+    body = await reader.readexactly(length) if length else b""
+    return first >> 4, first & 0x0F, body
+
+
+def decode_string(data: bytes, offset: int = 0) -> tuple:
+    """Read a length-prefixed string; returns (str, next offset)."""
+    if offset + 2 > len(data):
+        raise MQTTError("truncated string")
+    (n,) = struct.unpack_from("!H", data, offset)
+    end = offset + 2 + n
+    if end > len(data):
+        raise MQTTError("truncated string")
+    try:
+        return data[offset + 2:end].decode(), end
+    except UnicodeDecodeError:
+        raise MQTTError("string is not UTF-8") from None
+
+
+def parse_publish(flags: int, body: bytes) -> tuple:
+    """Returns (topic, payload, qos, retain, packet_id)."""
+    qos = (flags >> 1) & 0x03
+    topic, offset = decode_string(body)
+    packet_id = 0
+    if qos:
+        (packet_id,) = struct.unpack_from("!H", body, offset)
+        offset += 2
+    return topic, body[offset:], qos, bool(flags & 0x01), packet_id
+
+
+# =============================================================================
+# Client
+# =============================================================================
+
+class AsyncMQTTClient:
+    """
+    Single-connection asyncio MQTT client.
+
+    Incoming packets are handled by a reader task started by connect();
+    on_message(topic, payload) is called from it for every PUBLISH, and
+    incoming QoS 1 messages are acknowledged after it returns. Exceptions
+    raised by on_message are printed and do not close the connection. publish()
+    only queues bytes on the transport, so it can be called from plain
+    (non-async) code.
+    """
+
+    def __init__(self, client_id: str, on_message=None, keepalive: int = 60,
+                 clean_session: bool = True):
+        self.client_id = client_id
+        self.on_message = on_message
+        self.keepalive = keepalive
+        self.clean_session = clean_session
+        self.reader = None
+        self.writer = None
+        self._packet_id = 0
+        self._acks = {}
+        self._pinger = None
+        self._reader_task = None
+
+    def _next_id(self) -> int:
+        self._packet_id = self._packet_id % 0xFFFF + 1
+        return self._packet_id
+
+    async def connect(self, host: str, port: int = 1883, timeout: float = 10) -> bool:
+        """Open the connection and wait for CONNACK.
+
+        Returns:
+            The broker's session-present flag
+        """
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port), timeout)
+        self.writer.write(connect_packet(self.client_id, self.keepalive, self.clean_session))
+        packet_type, _, body = await asyncio.wait_for(read_packet(self.reader), timeout)
+        if packet_type != CONNACK or len(body) != 2:
+            raise MQTTError("expected CONNACK")
+        if body[1]:
+            raise MQTTError(f"connection refused (code {body[1]})")
+        self._reader_task = asyncio.ensure_future(self._read_loop())
+        if self.keepalive:
+            self._pinger = asyncio.ensure_future(self._ping_loop())
+        return bool(body[0] & 0x01)
+
+    async def subscribe(self, topics: list, qos: int = 0):
+        """Subscribe to topic filters and wait for the SUBACK."""
+        packet_id = self._next_id()
+        ack = self._acks[packet_id] = asyncio.get_running_loop().create_future()
+        self.writer.write(subscribe_packet(packet_id, [(t, qos) for t in topics]))
+        await ack
+
+    def publish(self, topic: str, payload: bytes, qos: int = 0, retain: bool = False):
+        """Queue a PUBLISH.
+
+        Returns:
+            For QoS 1, a future that completes on PUBACK; otherwise None
+        """
+        if qos:
+            packet_id = self._next_id()
+            ack = self._acks[packet_id] = asyncio.get_running_loop().create_future()
+            self.writer.write(publish_packet(topic, payload, 1, retain, packet_id))
+            return ack
+        self.writer.write(publish_packet(topic, payload, 0, retain))
+        return None
+
+    async def drain(self):
+        """Wait until queued packets are handed to the OS."""
+        await self.writer.drain()
+
+    async def run(self):
+        """Wait until the connection closes (raising what closed it, if anything)."""
+        await self._reader_task
+
+    async def _read_loop(self):
+        """Handle incoming packets until the connection closes."""
+        try:
+            while True:
+                packet_type, flags, body = await read_packet(self.reader)
+                if packet_type == PUBLISH:
+                    topic, payload, qos, _, packet_id = parse_publish(flags, body)
+                    if self.on_message:
+                        try:
+                            self.on_message(topic, payload)
+                        except Exception as e:
+                            # A bad message must not take the connection down
+                            print(f"⚠️  Error handling message on {topic}: {e!r}")
+                    if qos:
+                        self.writer.write(ack_packet(PUBACK, packet_id))
+                elif packet_type in (PUBACK, SUBACK, UNSUBACK):
+                    (packet_id,) = struct.unpack_from("!H", body)
+                    ack = self._acks.pop(packet_id, None)
+                    if ack and not ack.done():
+                        ack.set_result(body[2:])
+                elif packet_type == PINGRESP:
+                    pass
+                else:
+                    raise MQTTError(f"unexpected packet type {packet_type}")
+        except asyncio.IncompleteReadError:
+            pass
+        finally:
+            self._close()
+
+    async def _ping_loop(self):
+        """Keep the connection alive while nothing else is sent."""
+        while True:
+            await asyncio.sleep(self.keepalive / 2)
+            self.writer.write(PINGREQ_PACKET)
+
+    def _close(self):
+        """Stop pinging, fail pending acks and close the socket."""
+        if self._pinger:
+            self._pinger.cancel()
+            self._pinger = None
+        for ack in self._acks.values():
+            if not ack.done():
+                ack.set_exception(ConnectionError("connection closed"))
+        self._acks = {}
+        if self.writer:
+            self.writer.close()
+
+    async def disconnect(self):
+        """Send DISCONNECT and close."""
+        if self.writer and not self.writer.is_closing():
+            self.writer.write(DISCONNECT_PACKET)
+            await self.writer.drain()
+        self._close()
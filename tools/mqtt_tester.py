@@ -5,27 +5,38 @@
 Command-line tool for testing MQTT communication with Pico Whale devices.
 
 Requirements:
-    pip install paho-mqtt
+    pip install paho-mqtt      # Not needed for --load
 
 Usage:
     python mqtt_tester.py --subscribe       # Listen for messages
     python mqtt_tester.py --touch whale_1   # Simulate touch from whale_1
     python mqtt_tester.py --color 255,100,200  # Send color change
     python mqtt_tester.py --pattern rainbow # Send pattern change
+    python mqtt_tester.py --brightness 0.4  # Send brightness (or JSON with gamma)
+    python mqtt_tester.py --binary --touch whale_1  # Use the binary wire encoding
+    python mqtt_tester.py --broker localhost -s     # Local broker (tools/mqtt_broker.py)
+    python mqtt_tester.py --broker localhost --load 2000 --rate 6  # Load test
+
+Binary payloads (see src/wire.py) are decoded when listening.
 """
 
 import argparse
+import asyncio
+import os
+import random
 import time
 import sys
 import json
 from datetime import datetime
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import wire
+from mqtt_protocol import AsyncMQTTClient, MQTTError
+
 try:
     import paho.mqtt.client as mqtt
 except ImportError:
-    print("❌ paho-mqtt not installed!")
-    print("   Run: pip install paho-mqtt")
-    sys.exit(1)
+    mqtt = None
 
 
 # Configuration
@@ -38,15 +49,21 @@ TOPIC_TOUCH = f"pico_whale/{WHALE_PAIR_ID}/touch"
 TOPIC_HEARTBEAT = f"pico_whale/{WHALE_PAIR_ID}/heartbeat"
 TOPIC_COLOR = f"pico_whale/{WHALE_PAIR_ID}/color"
 TOPIC_PATTERN = f"pico_whale/{WHALE_PAIR_ID}/pattern"
+TOPIC_BRIGHTNESS = f"pico_whale/{WHALE_PAIR_ID}/brightness"
 TOPIC_STATUS = f"pico_whale/{WHALE_PAIR_ID}/status"
 
 
 class MQTTTester:
     """MQTT testing utility."""
     
-    def __init__(self):
+    def __init__(self, binary: bool = False, broker: str = MQTT_BROKER, port: int = MQTT_PORT):
         self.client = mqtt.Client(client_id=f"tester_{int(time.time())}")
         self.connected = False
+        self.binary = binary
+        self.broker = broker
+        self.port = port
+        self.touch_seq = 0
+        self.whale_keyframes = {}    # device -> last heartbeat keyframe
         
         self.client.on_connect = self._on_connect
         self.client.on_message = self._on_message
@@ -77,10 +94,37 @@ class MQTTTester:
     
     def _on_message(self, client, userdata, msg):
         topic = msg.topic
-        payload = msg.payload.decode()
         topic_name = topic.split("/")[-1]
+        if topic_name == "heartbeat":
+            payload = self._describe_heartbeat(msg.payload)
+        elif wire.is_binary(msg.payload):
+            try:
+                kind, value = wire.decode(msg.payload)
+                payload = f"(binary {kind}, {len(msg.payload)} bytes) {value}"
+            except ValueError as e:
+                payload = f"(undecodable binary: {e}) {msg.payload.hex()}"
+        else:
+            payload = msg.payload.decode(errors="replace")
         self._log(f"[{topic_name}] {payload}", "RECEIVE")
     
+    def _describe_heartbeat(self, payload: bytes) -> str:
+        """Describe a heartbeat, rebuilding its sender's full state from deltas."""
+        encoding = "binary" if wire.is_binary(payload) else "JSON"
+        try:
+            heartbeat = wire.decode_heartbeat(payload)
+        except ValueError as e:
+            return f"(undecodable {encoding}: {e}) {payload[:80]!r}"
+        device = heartbeat.get("device")
+        full = wire.apply_heartbeat(self.whale_keyframes.get(device), heartbeat)
+        size = f"{len(payload)} bytes"
+        if full is None:
+            return (f"({encoding} delta, {size}; missed keyframe #{heartbeat['base']}, "
+                    f"waiting for the next) {heartbeat}")
+        if "base" in heartbeat:
+            return f"({encoding} delta on #{heartbeat['base']}, {size}) {heartbeat}"
+        self.whale_keyframes[device] = heartbeat
+        return f"({encoding} full, {size}) {full}"
+    
     def _on_disconnect(self, client, userdata, rc):
         self.connected = False
         if rc != 0:
@@ -88,9 +132,9 @@ class MQTTTester:
     
     def connect(self):
         """Connect to the MQTT broker."""
-        self._log(f"Connecting to {MQTT_BROKER}:{MQTT_PORT}...")
+        self._log(f"Connecting to {self.broker}:{self.port}...")
         try:
-            self.client.connect(MQTT_BROKER, MQTT_PORT, 60)
+            self.client.connect(self.broker, self.port, 60)
             self.client.loop_start()
             
             # Wait for connection
@@ -115,26 +159,37 @@ class MQTTTester:
     
     def send_touch(self, whale_id: str):
         """Send a touch signal."""
-        message = f"{whale_id}:touch:{int(time.time())}"
+        self.touch_seq += 1
+        message = wire.encode_touch(whale_id, time.time_ns() // 1000000, self.touch_seq,
+                                    wire.WIRE_VERSION if self.binary else 0)
         self.client.publish(TOPIC_TOUCH, message)
         self._log(f"Sent touch from {whale_id}", "SEND")
     
     def send_color(self, color_str: str):
         """Send a color change command."""
-        self.client.publish(TOPIC_COLOR, color_str)
+        message = color_str
+        if self.binary:
+            message = wire.encode_color(*wire.decode_color(color_str.encode()), binary=True)
+        self.client.publish(TOPIC_COLOR, message)
         self._log(f"Sent color: {color_str}", "SEND")
     
     def send_pattern(self, pattern: str):
         """Send a pattern change command."""
-        self.client.publish(TOPIC_PATTERN, pattern)
+        self.client.publish(TOPIC_PATTERN, wire.encode_pattern(pattern, self.binary))
         self._log(f"Sent pattern: {pattern}", "SEND")
     
+    def send_brightness(self, settings: str):
+        """Send a brightness/gamma/white balance change."""
+        self.client.publish(TOPIC_BRIGHTNESS, settings)
+        self._log(f"Sent brightness: {settings}", "SEND")
+    
     def send_heartbeat(self, whale_id: str):
         """Send a heartbeat signal."""
         message = json.dumps({
             "device": whale_id,
             "status": "online",
-            "timestamp": int(time.time())
+            "timestamp": int(time.time()),
+            "proto": wire.WIRE_VERSION if self.binary else 0
         })
         self.client.publish(TOPIC_HEARTBEAT, message)
         self._log(f"Sent heartbeat from {whale_id}", "SEND")
@@ -160,6 +215,7 @@ class MQTTTester:
         print("  2 - Touch whale_2")
         print("  c - Set color (prompts for RGB)")
         print("  p - Set pattern (prompts for name)")
+        print("  b - Set brightness (prompts for value)")
         print("  h - Send heartbeat")
         print("  q - Quit")
         print("=" * 50 + "\n")
@@ -179,6 +235,9 @@ class MQTTTester:
                     print("Patterns: idle, solid, pulse, rainbow, wave, sparkle, breathing")
                     pattern = input("Enter pattern name: ").strip()
                     self.send_pattern(pattern)
+                elif cmd == "b":
+                    settings = input("Enter brightness 0.0-1.0 or JSON: ").strip()
+                    self.send_brightness(settings)
                 elif cmd == "h":
                     whale = input("Heartbeat from (whale_1/whale_2): ").strip()
                     self.send_heartbeat(whale)
@@ -193,6 +252,218 @@ class MQTTTester:
             pass
 
 
+# =============================================================================
+# Load Testing
+# =============================================================================
+
+HEARTBEAT_INTERVAL = 30          # Seconds, as in src/config.py
+TOUCH_QOS = 1                    # As in src/config.py
+
+
+class LoadTest:
+    """
+    Many virtual whales, each with its own MQTT connection, on one asyncio loop.
+    
+    Whales come in pairs (load_<run>_<n>) and behave like the firmware:
+    they subscribe to their pair's touch (QoS 1), color, pattern,
+    brightness and heartbeat topics, publish touches at QoS 1 at random
+    (Poisson) times, and heartbeat every HEARTBEAT_INTERVAL seconds. Every
+    touch is expected at the partner whale; delivery latency is measured
+    from publish to arrival, and touches that never arrive count as lost.
+    """
+    
+    def __init__(self, whales: int, broker: str, port: int, touch_rate: float,
+                 duration: float, ramp: float, heartbeat: float = HEARTBEAT_INTERVAL):
+        """Initialize the run.
+        
+        Args:
+            whales: Number of virtual whales (rounded up to whole pairs)
+            broker: Broker address
+            port: Broker port
+            touch_rate: Touches per whale per minute (Poisson)
+            duration: Seconds of load after all whales have connected
+            ramp: Seconds over which connections are spread
+            heartbeat: Seconds between heartbeats per whale
+        """
+        self.pairs = (whales + 1) // 2
+        self.broker = broker
+        self.port = port
+        self.touch_interval = 60 / touch_rate if touch_rate > 0 else None
+        self.duration = duration
+        self.ramp = ramp
+        self.heartbeat = heartbeat
+        self.run_id = f"{int(time.time()) % 100000:05d}"
+        self.sending = False
+        self.pending = {}            # (topic, payload) -> publish time
+        self.latencies = []
+        self.connected = 0
+        self.connect_failures = 0
+        self.touches = 0
+        self.heartbeats = 0
+        self.publish_errors = 0
+        self.duplicates = 0
+    
+    async def run(self) -> dict:
+        """Connect everyone, apply load, drain, and return the results."""
+        _raise_file_limit(self.pairs * 2 + 100)
+        self._stop = asyncio.Event()
+        whales = [(f"load_{self.run_id}_{n}", device)
+                  for n in range(self.pairs) for device in ("whale_1", "whale_2")]
+        start = time.monotonic()
+        tasks = [asyncio.ensure_future(self._whale(pair, device, start + self.ramp * i / len(whales)))
+                 for i, (pair, device) in enumerate(whales)]
+        
+        await asyncio.sleep(self.ramp + 1)
+        print(f"  {self.connected} whales connected ({self.connect_failures} failed), "
+              f"running for {self.duration:.0f}s...")
+        self.sending = True
+        load_start = time.monotonic()
+        await asyncio.sleep(self.duration)
+        self.sending = False
+        elapsed = time.monotonic() - load_start
+        
+        # Give in-flight touches a moment to arrive
+        sent = self.touches
+        for _ in range(50):
+            if not self.pending:
+                break
+            await asyncio.sleep(0.1)
+        self._stop.set()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        return self._results(sent, elapsed)
+    
+    async def _whale(self, pair: str, device: str, start_at: float):
+        """One virtual whale: connect, subscribe, publish until stopped."""
+        await asyncio.sleep(max(0, start_at - time.monotonic()))
+        prefix = f"pico_whale/{pair}"
+        touch_topic = f"{prefix}/touch"
+        
+        def on_message(topic, payload):
+            if topic != touch_topic:
+                return
+            sender, _, _ = wire.decode_touch(payload)
+            if sender == device:
+                return  # Own touch echoed back, ignored like the firmware does
+            sent_at = self.pending.pop((topic, payload), None)
+            if sent_at is None:
+                self.duplicates += 1
+            else:
+                self.latencies.append(time.monotonic() - sent_at)
+        
+        client = AsyncMQTTClient(f"{pair}_{device}", on_message=on_message,
+                                 keepalive=60)
+        try:
+            await client.connect(self.broker, self.port)
+            await client.subscribe([touch_topic], qos=TOUCH_QOS)
+            await client.subscribe([f"{prefix}/color", f"{prefix}/pattern",
+                                    f"{prefix}/brightness", f"{prefix}/heartbeat"])
+        except (OSError, MQTTError, asyncio.TimeoutError, ConnectionError):
+            self.connect_failures += 1
+            return
+        self.connected += 1
+        
+        seq = 0
+        next_touch = None
+        next_heartbeat = time.monotonic() + random.uniform(0, self.heartbeat)
+        try:
+            while not self._stop.is_set():
+                now = time.monotonic()
+                if self.sending and next_touch is None:
+                    next_touch = self._next_touch()
+                if self.sending and now >= next_touch:
+                    seq += 1
+                    # The firmware format, plus a sequence number it ignores
+                    payload = f"{device}:touch:{int(time.time())}:{seq}".encode()
+                    self.pending[(touch_topic, payload)] = now
+                    self.touches += 1
+                    client.publish(touch_topic, payload, qos=TOUCH_QOS).add_done_callback(self._acked)
+                    next_touch = self._next_touch()
+                if now >= next_heartbeat:
+                    client.publish(f"{prefix}/heartbeat", json.dumps({
+                        "device": device, "status": "online", "proto": 0}).encode())
+                    if self.sending:
+                        self.heartbeats += 1
+                    next_heartbeat += self.heartbeat
+                # Before and after the load phase only heartbeats are due
+                deadline = min(next_touch, next_heartbeat) if self.sending \
+                    else min(now + 0.5, next_heartbeat)
+                wait = deadline - time.monotonic()
+                try:
+                    await asyncio.wait_for(self._stop.wait(), max(wait, 0.001))
+                except asyncio.TimeoutError:
+                    pass
+            await client.disconnect()
+        except (OSError, ConnectionError):
+            self.publish_errors += 1
+    
+    def _next_touch(self) -> float:
+        if self.touch_interval is None:
+            return float("inf")
+        return time.monotonic() + random.expovariate(1 / self.touch_interval)
+    
+    def _acked(self, future):
+        if future.cancelled() or future.exception() is not None:
+            self.publish_errors += 1
+    
+    def _results(self, sent: int, elapsed: float) -> dict:
+        latencies = sorted(self.latencies)
+        
+        def percentile(p):
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 1)
+        
+        return {
+            "whales": self.connected,
+            "connect_failures": self.connect_failures,
+            "seconds": round(elapsed, 1),
+            "touches_sent": sent,
+            "touch_rate": round(sent / elapsed, 1),
+            "heartbeat_rate": round(self.heartbeats / elapsed, 1),
+            "delivered": len(latencies),
+            "lost": len(self.pending),
+            "loss_pct": round(100 * len(self.pending) / sent, 3) if sent else 0,
+            "duplicates": self.duplicates,
+            "publish_errors": self.publish_errors,
+            "latency_ms": {"p50": percentile(50), "p95": percentile(95),
+                           "p99": percentile(99), "max": percentile(100)},
+        }
+
+
+def _raise_file_limit(needed: int):
+    """Every whale holds a socket; lift the open-file limit if we can."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < needed:
+            limit = needed if hard == resource.RLIM_INFINITY else min(needed, hard)
+            resource.setrlimit(resource.RLIMIT_NOFILE, (limit, hard))
+            if limit < needed:
+                print(f"⚠️  Open-file limit is {limit}; expect connect failures above that")
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def run_load(args):
+    """--load: run a LoadTest and print the results."""
+    print(f"  Load: {args.load} whales, {args.rate} touches/whale/min, "
+          f"{args.duration:.0f}s after a {args.ramp:.0f}s ramp")
+    test = LoadTest(args.load, args.broker, args.port, args.rate, args.duration, args.ramp)
+    results = asyncio.run(test.run())
+    latency = results["latency_ms"]
+    print("\n📊 Results")
+    print(f"  Whales connected: {results['whales']} ({results['connect_failures']} failed)")
+    print(f"  Publish rate:     {results['touch_rate']} touches/s + "
+          f"{results['heartbeat_rate']} heartbeats/s")
+    print(f"  Delivered:        {results['delivered']}/{results['touches_sent']} touches "
+          f"({results['loss_pct']}% lost, {results['duplicates']} duplicates, "
+          f"{results['publish_errors']} publish errors)")
+    print(f"  Latency (ms):     p50 {latency['p50']}  p95 {latency['p95']}  "
+          f"p99 {latency['p99']}  max {latency['max']}")
+    if args.json:
+        print(json.dumps(results))
+
+
 def main():
     parser = argparse.ArgumentParser(description="Pico Whale MQTT Tester")
     parser.add_argument("--subscribe", "-s", action="store_true",
@@ -203,10 +474,26 @@ def main():
                        help="Send color change (format: R,G,B)")
     parser.add_argument("--pattern", "-p", type=str,
                        help="Send pattern change (idle, pulse, rainbow, wave, sparkle, breathing)")
+    parser.add_argument("--brightness", type=str,
+                       help='Send brightness 0.0-1.0, or JSON like \'{"gamma": 2.2}\'')
     parser.add_argument("--interactive", "-i", action="store_true",
                        help="Run in interactive mode")
+    parser.add_argument("--binary", action="store_true",
+                       help="Send touch/color/pattern in the binary wire encoding")
     parser.add_argument("--broker", "-b", type=str, default=MQTT_BROKER,
                        help=f"MQTT broker address (default: {MQTT_BROKER})")
+    parser.add_argument("--port", type=int, default=MQTT_PORT,
+                       help=f"MQTT broker port (default: {MQTT_PORT})")
+    parser.add_argument("--load", type=int, metavar="WHALES",
+                       help="Load test with this many virtual whales (in pairs)")
+    parser.add_argument("--rate", type=float, default=1.0,
+                       help="--load: touches per whale per minute (default: 1)")
+    parser.add_argument("--duration", type=float, default=60,
+                       help="--load: seconds of load (default: 60)")
+    parser.add_argument("--ramp", type=float, default=10,
+                       help="--load: seconds to spread connections over (default: 10)")
+    parser.add_argument("--json", action="store_true",
+                       help="--load: also print the results as JSON")
     
     args = parser.parse_args()
     
@@ -217,7 +504,16 @@ def main():
     print(f"  Pair ID: {WHALE_PAIR_ID}")
     print("=" * 50 + "\n")
     
-    tester = MQTTTester()
+    if args.load:
+        run_load(args)
+        return
+    
+    if mqtt is None:
+        print("❌ paho-mqtt not installed!")
+        print("   Run: pip install paho-mqtt")
+        sys.exit(1)
+    
+    tester = MQTTTester(binary=args.binary, broker=args.broker, port=args.port)
     
     if not tester.connect():
         sys.exit(1)
@@ -235,11 +531,15 @@ def main():
             tester.send_pattern(args.pattern)
             time.sleep(1)
         
+        if args.brightness:
+            tester.send_brightness(args.brightness)
+            time.sleep(1)
+        
         if args.interactive:
             tester.interactive_mode()
         elif args.subscribe:
             tester.subscribe_loop()
-        elif not (args.touch or args.color or args.pattern):
+        elif not (args.touch or args.color or args.pattern or args.brightness):
             # Default to interactive if no specific action
             tester.interactive_mode()
             
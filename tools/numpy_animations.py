@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+🐋 NumPy Animation Backend
+===========================
+Vectorized version of the firmware's AnimationLibrary for bulk preview and
+export rendering on the host. Every pattern renders a whole
+(frames, leds, 3) uint8 array in one call instead of looping per LED.
+
+Deterministic patterns reproduce the reference AnimationLibrary output
+frame for frame (the same float expressions, evaluated in the same order).
+The random patterns (sparkle, fire, celebration) follow the same
+distributions from a seedable NumPy generator.
+
+Requirements:
+    pip install numpy
+
+Usage:
+    from numpy_animations import NumpyAnimationLibrary
+
+    anim = NumpyAnimationLibrary(led_count=144)
+    anim.set_color(255, 100, 200)
+    frames = anim.render("wave", 2000, speed=3.0)   # shape (2000, 144, 3)
+
+    python numpy_animations.py      # check against the reference and time it
+"""
+
+import math
+import os
+import sys
+
+import numpy as np
+
+# The reference implementation lives in the firmware source
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+from animations import get_pattern_names
+
+
+class NumpyAnimationLibrary:
+    """
+    Batch renderer with the same patterns and parameters as AnimationLibrary.
+
+    Frame k of a render covers tick ``start + k``. The default start of 1
+    matches a fresh AnimationLibrary, whose first pattern call renders
+    tick 1, so render("wave", n) equals n successive anim.wave() calls.
+    """
+
+    def __init__(self, led_count: int = 12, seed: int = None):
+        """Initialize the batch renderer.
+
+        Args:
+            led_count: Number of LEDs in the strip/ring
+            seed: Seed for the random patterns (sparkle, fire, celebration)
+        """
+        self.led_count = led_count
+        self.red = 255
+        self.green = 100
+        self.blue = 200
+        self.rng = np.random.default_rng(seed)
+        self._index = np.arange(led_count)
+
+    def set_color(self, r: int, g: int, b: int):
+        """Set the base color for animations.
+
+        Args:
+            r: Red component (0-255)
+            g: Green component (0-255)
+            b: Blue component (0-255)
+        """
+        self.red = max(0, min(255, r))
+        self.green = max(0, min(255, g))
+        self.blue = max(0, min(255, b))
+
+    def render(self, pattern_name: str, frames: int, start: int = 1, **params) -> np.ndarray:
+        """Render a pattern by name.
+
+        Args:
+            pattern_name: Name of the pattern (unknown names render idle)
+            frames: Number of frames to render
+            start: Tick of the first frame
+            **params: Pattern parameters, as for the AnimationLibrary method
+
+        Returns:
+            uint8 array of shape (frames, led_count, 3) in RGB order
+        """
+        if pattern_name not in get_pattern_names():
+            pattern_name = "idle"
+        return getattr(self, pattern_name)(frames, start=start, **params)
+
+    # =========================================================================
+    # Helpers
+    # =========================================================================
+
+    def _ticks(self, frames: int, start: int) -> np.ndarray:
+        """Tick numbers as a (frames, 1) column for broadcasting across LEDs."""
+        return np.arange(start, start + frames, dtype=np.int64)[:, None]
+
+    @staticmethod
+    def _clamp(values) -> np.ndarray:
+        """Truncate and clamp like AnimationLibrary._clamp."""
+        return np.clip(np.trunc(values), 0, 255).astype(np.uint8)
+
+    def _scaled(self, brightness) -> np.ndarray:
+        """Base color times a brightness array of shape (frames, leds)."""
+        return np.stack([self._clamp(self.red * brightness),
+                         self._clamp(self.green * brightness),
+                         self._clamp(self.blue * brightness)], axis=-1)
+
+    def _constant(self, frames: int, color) -> np.ndarray:
+        out = np.empty((frames, self.led_count, 3), dtype=np.uint8)
+        out[...] = color
+        return out
+
+    def _led_angle(self) -> np.ndarray:
+        """i / led_count * 2 * pi, evaluated like the reference."""
+        return self._index / self.led_count * 2 * math.pi
+
+    @staticmethod
+    def _hsv_to_rgb(h: np.ndarray) -> tuple:
+        """Vectorized AnimationLibrary._hsv_to_rgb for s = v = 1.0."""
+        s = v = 1.0
+        i = np.trunc(h * 6.0)
+        f = (h * 6.0) - i
+        p = np.full_like(h, v * (1.0 - s))
+        q = v * (1.0 - s * f)
+        t = v * (1.0 - s * (1.0 - f))
+        vv = np.full_like(h, v)
+        sector = i.astype(np.int64) % 6
+        r = np.choose(sector, [vv, q, p, p, t, vv])
+        g = np.choose(sector, [t, vv, vv, q, p, p])
+        b = np.choose(sector, [p, p, t, vv, vv, q])
+        return r, g, b
+
+    # =========================================================================
+    # Animation Patterns
+    # =========================================================================
+
+    def off(self, frames: int, start: int = 1) -> np.ndarray:
+        """All LEDs off."""
+        return np.zeros((frames, self.led_count, 3), dtype=np.uint8)
+
+    def solid(self, frames: int, brightness: float = 1.0, start: int = 1) -> np.ndarray:
+        """Solid color at specified brightness."""
+        color = self._scaled(np.array(brightness, dtype=np.float64))
+        return self._constant(frames, color)
+
+    def idle(self, frames: int, start: int = 1) -> np.ndarray:
+        """Dim blue idle state."""
+        return self._constant(frames, (10, 30, 60))
+
+    def pulse(self, frames: int, speed: float = 3.0, start: int = 1) -> np.ndarray:
+        """Pulsing brightness animation."""
+        t = self._ticks(frames, start) * 0.05 * speed
+        brightness = 0.3 + 0.7 * np.abs(np.sin(t))
+        return np.broadcast_to(self._scaled(brightness),
+                               (frames, self.led_count, 3)).copy()
+
+    def breathing(self, frames: int, speed: float = 0.5, start: int = 1) -> np.ndarray:
+        """Slow breathing glow effect."""
+        t = self._ticks(frames, start) * 0.05 * speed
+        brightness = (np.exp(np.sin(t)) - 0.36787944) / 2.35040238
+        return np.broadcast_to(self._scaled(brightness),
+                               (frames, self.led_count, 3)).copy()
+
+    def rainbow(self, frames: int, speed: float = 1.0, start: int = 1) -> np.ndarray:
+        """Rainbow cycle around the LED ring."""
+        offset = (self._ticks(frames, start) * 0.01 * speed) % 1.0
+        hue = (self._index / self.led_count + offset) % 1.0
+        r, g, b = self._hsv_to_rgb(hue)
+        return np.stack([self._clamp(r * 255), self._clamp(g * 255),
+                         self._clamp(b * 255)], axis=-1)
+
+    def wave(self, frames: int, speed: float = 3.0, start: int = 1) -> np.ndarray:
+        """Wave pattern traveling around the ring."""
+        t = self._ticks(frames, start) * 0.05 * speed
+        offset = self._led_angle() + t
+        brightness = 0.2 + 0.8 * (np.sin(offset) + 1) / 2
+        return self._scaled(brightness)
+
+    def sparkle(self, frames: int, density: float = 0.15, start: int = 1) -> np.ndarray:
+        """Random sparkle effect with white flashes."""
+        dim = (self._clamp(self.red * 0.3), self._clamp(self.green * 0.3),
+               self._clamp(self.blue * 0.3))
+        out = self._constant(frames, dim)
+        out[self.rng.random((frames, self.led_count)) < density] = 255
+        return out
+
+    def comet(self, frames: int, tail_length: int = 4, speed: float = 1.0,
+              start: int = 1) -> np.ndarray:
+        """Comet/shooting star effect traveling around ring."""
+        out = np.zeros((frames, self.led_count, 3), dtype=np.uint8)
+        ticks = self._ticks(frames, start)[:, 0]
+        position = np.trunc((ticks * 0.2 * speed) % self.led_count).astype(np.int64)
+        rows = np.arange(frames)
+        # Tail segments in the same order as the reference so overlaps match
+        for i in range(tail_length):
+            brightness = 1.0 - (i / tail_length)
+            color = (self._clamp(self.red * brightness), self._clamp(self.green * brightness),
+                     self._clamp(self.blue * brightness))
+            out[rows, (position - i) % self.led_count] = color
+        return out
+
+    def alternate(self, frames: int, speed: float = 2.0, start: int = 1) -> np.ndarray:
+        """Alternating LEDs blink pattern."""
+        phase = np.trunc(self._ticks(frames, start) * 0.1 * speed).astype(np.int64) % 2
+        lit = (self._index % 2) == phase
+        dim = (self._clamp(self.red * 0.1), self._clamp(self.green * 0.1),
+               self._clamp(self.blue * 0.1))
+        out = self._constant(frames, dim)
+        out[lit] = (self.red, self.green, self.blue)
+        return out
+
+    def fire(self, frames: int, start: int = 1) -> np.ndarray:
+        """Flickering fire/candle effect."""
+        shape = (frames, self.led_count)
+        flicker = 0.7 + self.rng.random(shape) * 0.3
+        g = (50 + self.rng.integers(0, 101, shape)) * flicker
+        return np.stack([self._clamp(255 * flicker), self._clamp(g),
+                         np.zeros(shape, dtype=np.uint8)], axis=-1)
+
+    def ocean(self, frames: int, speed: float = 1.0, start: int = 1) -> np.ndarray:
+        """Gentle ocean wave in blues and teals."""
+        t = self._ticks(frames, start) * 0.03 * speed
+        offset = self._led_angle() + t
+        wave1 = (np.sin(offset) + 1) / 2
+        wave2 = (np.sin(offset * 1.5 + 1.2) + 1) / 2
+        brightness = 0.3 + 0.7 * (wave1 * 0.6 + wave2 * 0.4)
+        return np.stack([self._clamp(20 * brightness),
+                         self._clamp((100 + 50 * wave2) * brightness),
+                         self._clamp((180 + 75 * wave1) * brightness)], axis=-1)
+
+    def flash(self, frames: int, on_frames: int = 5, off_frames: int = 5,
+              start: int = 1) -> np.ndarray:
+        """Simple on/off flash pattern."""
+        ticks = self._ticks(frames, start)[:, 0]
+        out = self.solid(frames)
+        out[(ticks % (on_frames + off_frames)) >= on_frames] = 0
+        return out
+
+    def celebration(self, frames: int, start: int = 1) -> np.ndarray:
+        """Colorful celebration pattern - random colors and sparkles."""
+        shape = (frames, self.led_count)
+        r, g, b = self._hsv_to_rgb(self.rng.random(shape))
+        out = np.stack([self._clamp(r * 255), self._clamp(g * 255),
+                        self._clamp(b * 255)], axis=-1)
+        out[self.rng.random(shape) >= 0.3] = 0
+        return out
+
+
+# =============================================================================
+# Self-check: compare with the reference and time both
+# =============================================================================
+def _reference_frames(pattern: str, led_count: int, frames: int, color) -> np.ndarray:
+    from animations import AnimationLibrary, run_pattern
+    anim = AnimationLibrary(led_count)
+    anim.set_color(*color)
+    return np.array([run_pattern(anim, pattern) for _ in range(frames)], dtype=np.uint8)
+
+
+def main():
+    import time
+
+    led_count, frames, color = 144, 500, (255, 100, 200)
+    random_patterns = ("sparkle", "fire", "celebration")
+
+    print("=" * 64)
+    print(f"  🐋 NUMPY BACKEND CHECK ({led_count} LEDs x {frames} frames)")
+    print("=" * 64)
+    anim = NumpyAnimationLibrary(led_count, seed=1)
+    anim.set_color(*color)
+
+    for pattern in get_pattern_names():
+        start = time.perf_counter()
+        reference = _reference_frames(pattern, led_count, frames, color)
+        ref_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = anim.render(pattern, frames)
+        np_time = time.perf_counter() - start
+
+        if pattern in random_patterns:
+            status = "random (not compared)"
+        else:
+            diff = int(np.abs(reference.astype(int) - batch.astype(int)).max())
+            status = "match" if diff == 0 else f"max diff {diff}"
+        print(f"  {pattern:<12} {ref_time / np_time:>7.1f}x faster   {status}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+🐋 Whale Pair Topic Router
+===========================
+Lets one host process watch (or bridge) any number of whale pairs over a
+single MQTT connection. It subscribes with wildcards
+(pico_whale/+/touch, ...) and hands each message to the handler
+registered for its pair through an MQTT topic trie. Routing costs one dict
+lookup per topic level, however many pairs are registered, and pairs can
+be added and removed while messages are flowing.
+
+Requirements:
+    pip install paho-mqtt      # Not needed for --benchmark
+
+Usage:
+    python topic_router.py --all                     # Every pair on the broker
+    python topic_router.py --pair whale_pair_jeff_friend --pair other_pair
+    python topic_router.py --benchmark 10000         # Routing cost vs pair count
+
+    # In your own bridge
+    router = PairRouter()
+    router.add_pair("whale_pair_a", lambda pair, kind, payload: ...)
+    client.on_message = lambda c, u, msg: router.route(msg.topic, msg.payload)
+    for topic in router.subscriptions():
+        client.subscribe(topic)
+"""
+
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+import wire
+
+MQTT_BROKER = "broker.hivemq.com"
+MQTT_PORT = 1883
+TOPIC_PREFIX = "pico_whale"
+MESSAGE_KINDS = ("touch", "heartbeat", "color", "pattern", "brightness", "status")
+
+
+# =============================================================================
+# Topic Trie
+# =============================================================================
+
+class _Node:
+    __slots__ = ("children", "handlers")
+
+    def __init__(self):
+        self.children = {}
+        self.handlers = ()
+
+
+class TopicTrie:
+    """
+    MQTT topic filters (with + and # wildcards) mapped to handlers.
+
+    match() walks one level per topic segment, following the exact child
+    and any + / # children, so its cost depends on the topic depth and the
+    number of wildcard filters, not on how many exact filters exist.
+
+    Handler lists are replaced rather than modified, so match() can run on
+    the MQTT network thread while filters are added or removed elsewhere.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, topic_filter: str, handler):
+        """Register a handler for a topic filter."""
+        levels = topic_filter.split("/")
+        if "#" in levels[:-1]:
+            raise ValueError(f"'#' must be the last level: {topic_filter}")
+        with self._lock:
+            node = self._root
+            for level in levels:
+                child = node.children.get(level)
+                if child is None:
+                    child = node.children[level] = _Node()
+                node = child
+            node.handlers = node.handlers + (handler,)
+            self.count += 1
+
+    def remove(self, topic_filter: str, handler) -> bool:
+        """Unregister a handler; returns False if it was not registered."""
+        levels = topic_filter.split("/")
+        with self._lock:
+            path = [self._root]
+            for level in levels:
+                node = path[-1].children.get(level)
+                if node is None:
+                    return False
+                path.append(node)
+            node = path[-1]
+            if handler not in node.handlers:
+                return False
+            node.handlers = tuple(h for h in node.handlers if h is not handler)
+            self.count -= 1
+            # Prune branches that no longer lead to any handler
+            for level, parent in zip(reversed(levels), reversed(path[:-1])):
+                child = parent.children[level]
+                if child.handlers or child.children:
+                    break
+                del parent.children[level]
+            return True
+
+    def match(self, topic: str) -> list:
+        """Handlers of every filter that matches a topic."""
+        return self._match(topic.split("/"))
+
+    def _match(self, levels: list) -> list:
+        found = []
+        nodes = [self._root]
+        # Wildcards do not match topics starting with $ (e.g. $SYS)
+        wild = not levels[0].startswith("$")
+        for level in levels:
+            next_nodes = []
+            for node in nodes:
+                children = node.children
+                if not children:
+                    continue
+                child = children.get(level)
+                if child is not None:
+                    next_nodes.append(child)
+                if wild:
+                    child = children.get("+")
+                    if child is not None:
+                        next_nodes.append(child)
+                    child = children.get("#")
+                    if child is not None:
+                        found.extend(child.handlers)
+            if not next_nodes:
+                return found
+            nodes = next_nodes
+            wild = True
+        for node in nodes:
+            found.extend(node.handlers)
+            # "a/#" also matches "a"
+            child = node.children.get("#")
+            if child is not None:
+                found.extend(child.handlers)
+        return found
+
+
+# =============================================================================
+# Pair Router
+# =============================================================================
+
+class PairRouter:
+    """
+    Routes pico_whale/<pair>/<kind> messages to per-pair handlers.
+
+    Handlers are called as handler(pair_id, kind, payload). Messages for
+    pairs without a handler go to the default handler, if one is set.
+    """
+
+    def __init__(self, prefix: str = TOPIC_PREFIX, kinds=MESSAGE_KINDS):
+        self.prefix = prefix
+        self.kinds = tuple(kinds)
+        self.trie = TopicTrie()
+        self.default = None
+        self._pairs = {}
+
+    def subscriptions(self) -> list:
+        """Wildcard topics to subscribe to, covering every pair."""
+        return [f"{self.prefix}/+/{kind}" for kind in self.kinds]
+
+    def add_pair(self, pair_id: str, handler, kinds=None):
+        """Route a pair's messages (all kinds, or only those given) to handler."""
+        if pair_id in self._pairs:
+            self.remove_pair(pair_id)
+        filters = [f"{self.prefix}/{pair_id}/{kind}" for kind in kinds] if kinds \
+            else [f"{self.prefix}/{pair_id}/+"]
+        for topic_filter in filters:
+            self.trie.add(topic_filter, handler)
+        self._pairs[pair_id] = (filters, handler)
+
+    def remove_pair(self, pair_id: str) -> bool:
+        """Stop routing a pair; returns False if it was not registered."""
+        entry = self._pairs.pop(pair_id, None)
+        if entry is None:
+            return False
+        filters, handler = entry
+        for topic_filter in filters:
+            self.trie.remove(topic_filter, handler)
+        return True
+
+    def pairs(self) -> list:
+        """Registered pair IDs."""
+        return list(self._pairs)
+
+    def route(self, topic: str, payload: bytes) -> int:
+        """Dispatch one message; returns how many handlers ran."""
+        levels = topic.split("/")
+        if len(levels) != 3:
+            return 0
+        handlers = self.trie._match(levels)
+        if not handlers:
+            if self.default is None:
+                return 0
+            handlers = (self.default,)
+        pair_id, kind = levels[1], levels[2]
+        for handler in handlers:
+            handler(pair_id, kind, payload)
+        return len(handlers)
+
+
+# =============================================================================
+# Monitor
+# =============================================================================
+
+def describe(payload: bytes) -> str:
+    """Printable form of a payload in either wire encoding."""
+    if wire.is_binary(payload):
+        try:
+            kind, value = wire.decode(payload)
+            return f"(binary {kind}) {value}"
+        except ValueError as e:
+            return f"(undecodable binary: {e}) {payload.hex()}"
+    return payload.decode(errors="replace")
+
+
+class Monitor:
+    """Prints and counts messages per pair."""
+
+    def __init__(self):
+        self.counts = {}
+
+    def __call__(self, pair_id: str, kind: str, payload: bytes):
+        self.counts[pair_id] = self.counts.get(pair_id, 0) + 1
+        timestamp = datetime.now().strftime("%H:%M:%S.%f")[:-3]
+        print(f"[{timestamp}] {pair_id} [{kind}] {describe(payload)}")
+
+
+def run_monitor(router: PairRouter, broker: str, port: int):
+    """Connect, subscribe with wildcards and route until Ctrl+C."""
+    try:
+        import paho.mqtt.client as mqtt
+    except ImportError:
+        print("❌ paho-mqtt not installed!")
+        print("   Run: pip install paho-mqtt")
+        sys.exit(1)
+
+    def on_connect(client, userdata, flags, rc):
+        if rc != 0:
+            print(f"❌ Connection failed with code: {rc}")
+            return
+        for topic in router.subscriptions():
+            client.subscribe(topic)
+        print(f"✅ Connected; subscribed to {', '.join(router.subscriptions())}")
+
+    client = mqtt.Client(client_id=f"router_{int(time.time())}")
+    client.on_connect = on_connect
+    client.on_message = lambda c, u, msg: router.route(msg.topic, msg.payload)
+    client.connect(broker, port, 60)
+    client.loop_start()
+    try:
+        while True:
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        client.loop_stop()
+        client.disconnect()
+
+
+def run_benchmark(max_pairs: int, messages: int = 100000):
+    """Show that routing cost does not grow with the number of pairs."""
+    print(f"Routing {messages} messages per run:")
+    counts = [n for n in (1, 10, 100, 1000, 10000, 100000) if n < max_pairs] + [max_pairs]
+    for n in counts:
+        router = PairRouter()
+        hits = [0]
+
+        def handler(pair_id, kind, payload):
+            hits[0] += 1
+
+        for i in range(n):
+            router.add_pair(f"pair_{i}", handler)
+        topics = [f"{TOPIC_PREFIX}/pair_{random.randrange(n)}/{random.choice(MESSAGE_KINDS)}"
+                  for _ in range(1000)]
+        start = time.perf_counter()
+        for i in range(messages):
+            router.route(topics[i % 1000], b"")
+        elapsed = time.perf_counter() - start
+        assert hits[0] == messages
+        print(f"  {n:>7} pairs: {elapsed * 1e9 / messages:7.0f} ns/message")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Route and monitor many whale pairs")
+    parser.add_argument("--pair", action="append", default=[],
+                        help="Pair ID to monitor (repeatable)")
+    parser.add_argument("--all", action="store_true",
+                        help="Also show pairs that were not named with --pair")
+    parser.add_argument("--broker", "-b", default=MQTT_BROKER,
+                        help=f"MQTT broker address (default: {MQTT_BROKER})")
+    parser.add_argument("--port", type=int, default=MQTT_PORT,
+                        help="MQTT broker port (default: %(default)s)")
+    parser.add_argument("--benchmark", type=int, metavar="PAIRS",
+                        help="Measure routing cost with up to PAIRS pairs (no broker)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.benchmark)
+        return
+    if not args.pair and not args.all:
+        parser.error("give --pair and/or --all")
+
+    router = PairRouter()
+    monitor = Monitor()
+    for pair_id in args.pair:
+        router.add_pair(pair_id, monitor)
+    if args.all:
+        router.default = monitor
+
+    print(f"🐋 Routing {len(args.pair) or 'all'} pair(s) via {args.broker}:{args.port}")
+    run_monitor(router, args.broker, args.port)
+    for pair_id, count in sorted(monitor.counts.items()):
+        print(f"  {pair_id}: {count} messages")
+
+
+if __name__ == "__main__":
+    main()